@@ -0,0 +1,102 @@
+# JSON codec benchmark on a synthetic 500k-event day
+#
+# Builds a synthetic /events response shaped like the Protect API payload and measures,
+# for every available codec, how long it takes to decode the response (what
+# get_detection_list does) and to stream it back out as indented JSON (what
+# _save_detections does).
+#
+# Usage:
+#   python benchmarks/bench_json.py [--events 500000] [--cameras 40]
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from typing import Any
+from typing import Dict
+from typing import List
+
+from protect_archiver import json_codec
+
+
+DAY_START_MS = 1700000000000
+SMART_TYPES = [[], ["person"], ["vehicle"], ["person", "vehicle"], ["animal"]]
+
+
+def synthetic_events(count: int, cameras: int, seed: int = 1) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    camera_ids = [f"{rng.getrandbits(96):024x}" for _ in range(cameras)]
+    events = []
+    for i in range(count):
+        start = DAY_START_MS + rng.randrange(86_400_000)
+        events.append(
+            {
+                "id": f"{rng.getrandbits(96):024x}",
+                "modelKey": "event",
+                "type": rng.choice(["motion", "smartDetectZone", "ring"]),
+                "start": start,
+                "end": start + rng.randrange(1_000, 120_000),
+                "score": rng.randrange(100),
+                "camera": camera_ids[i % cameras],
+                "partition": None,
+                "user": None,
+                "metadata": {"detectedThumbnails": []},
+                "smartDetectTypes": rng.choice(SMART_TYPES),
+                "smartDetectEvents": [],
+                "thumbnail": f"e-{i:024x}",
+                "heatmap": f"e-{i:024x}",
+                "isFavorite": False,
+            }
+        )
+    return events
+
+
+def timed(fn: Any, *args: Any) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def bench_codec(name: str, events: List[Dict[str, Any]], body: bytes, workdir: str) -> None:
+    json_codec.use_codec(name)
+    path = os.path.join(workdir, f"{name}.json")
+
+    decode = timed(json_codec.loads, body)
+
+    def stream_encode() -> None:
+        with open(path, "wb") as fp:
+            json_codec.dump_array(events, fp, indent=True, default=str)
+
+    encode = timed(stream_encode)
+    size = os.path.getsize(path)
+
+    mb = len(body) / 2**20
+    print(
+        f"{name:<8} decode {decode:6.2f}s ({mb / decode:7.1f} MB/s)"
+        f"   stream encode {encode:6.2f}s ({size / 2**20 / encode:7.1f} MB/s,"
+        f" {size / 2**20:.0f} MB)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the JSON codecs")
+    parser.add_argument("--events", type=int, default=500_000, help="events in the synthetic day")
+    parser.add_argument("--cameras", type=int, default=40, help="number of distinct cameras")
+    options = parser.parse_args()
+
+    events = synthetic_events(options.events, options.cameras)
+    # the API response is compact JSON; encode it once with the stdlib as the reference body
+    body = json_codec.StdlibJSONCodec().dumps(events)
+    print(f"{len(events)} events, {len(body) / 2**20:.0f} MB response body")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in json_codec.CODECS:
+            if name == json_codec.OrjsonCodec.name and not json_codec.HAS_ORJSON:
+                print(f"{name:<8} not installed - skipped")
+                continue
+            bench_codec(name, events, body, workdir)
+
+
+if __name__ == "__main__":
+    main()
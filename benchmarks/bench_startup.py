@@ -0,0 +1,161 @@
+# Startup benchmark for the protect-archiver CLI
+#
+# Runs `protect-archiver --help` and `<subcommand> --help` in fresh interpreters with
+# `python -X importtime` and reports the cumulative import cost, the wall-clock time and
+# which of the heavy, optional-at-startup dependencies got imported along the way.
+# For every subcommand it also measures the modules its body imports before talking to
+# the controller, so regressions in the per-run cost (not just '--help') show up too.
+#
+# Usage:
+#   python benchmarks/bench_startup.py [--repeat 5] [--json] [--fail-on-heavy]
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+
+COMMANDS: List[List[str]] = [
+    ["--help"],
+    ["download", "--help"],
+    ["events", "--help"],
+    ["sync", "--help"],
+]
+
+# modules imported by each subcommand body before the first request is made
+COMMAND_BODIES: Dict[str, List[str]] = {
+    "download": ["protect_archiver.client", "protect_archiver.downloader"],
+    "events": ["protect_archiver.client", "protect_archiver.downloader"],
+    "sync": ["protect_archiver.client", "protect_archiver.sync"],
+}
+
+# top-level packages that should only be imported once a command actually needs them
+HEAVY_MODULES = ["boto3", "botocore", "PIL", "dateutil", "requests", "urllib3"]
+
+# packages that a command body may only import on first use (S3 upload, thumbnails, ...)
+LAZY_MODULES = ["boto3", "botocore", "PIL"]
+
+ENTRYPOINT = (
+    "import sys; from protect_archiver.cli import main; sys.argv[0] = 'protect-archiver'; main()"
+)
+
+
+def parse_importtime(stderr: str) -> Tuple[int, Dict[str, int]]:
+    """Return the total cumulative import time (us) and the self time (us) per module."""
+    total_us = 0
+    self_us: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_part, cumulative_part, name_part = line[len("import time:") :].split("|")
+        name = name_part.rstrip()
+        # only top-level entries (no indentation) contribute to the total, nested ones are
+        # already contained in their parent's cumulative time
+        if not name.startswith("  "):
+            total_us += int(cumulative_part)
+        self_us[name.strip()] = int(self_part)
+    return total_us, self_us
+
+
+def run_once(code: str, args: List[str]) -> Tuple[float, int, Dict[str, int]]:
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code, *args],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"'{' '.join(args)}' exited with {proc.returncode}:\n{proc.stderr}")
+    total_us, self_us = parse_importtime(proc.stderr)
+    return wall, total_us, self_us
+
+
+def bench_command(
+    label: str, code: str, args: List[str], repeat: int, top: int, watched: List[str]
+) -> Dict[str, Any]:
+    walls: List[float] = []
+    totals: List[int] = []
+    self_us: Dict[str, int] = {}
+    for _ in range(repeat):
+        wall, total_us, self_us = run_once(code, args)
+        walls.append(wall)
+        totals.append(total_us)
+
+    heavy = sorted({name.split(".")[0] for name in self_us} & set(watched))
+    slowest = sorted(self_us.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "command": label,
+        "wall_ms": round(statistics.median(walls) * 1e3, 1),
+        "import_ms": round(statistics.median(totals) / 1e3, 1),
+        "heavy_modules": heavy,
+        "slowest_modules": [
+            {"module": name, "self_ms": round(us / 1e3, 2)} for name, us in slowest
+        ],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark protect-archiver startup cost")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per command (median)")
+    parser.add_argument("--top", type=int, default=5, help="slowest modules to list")
+    parser.add_argument("--json", action="store_true", help="emit JSON instead of a table")
+    parser.add_argument(
+        "--fail-on-heavy",
+        action="store_true",
+        help=(
+            "exit non-zero if a heavy dependency is imported just to print help, or if a "
+            "command body imports a lazily loaded dependency up front"
+        ),
+    )
+    options = parser.parse_args()
+
+    results = [
+        bench_command(
+            " ".join(["protect-archiver", *args]),
+            ENTRYPOINT,
+            args,
+            options.repeat,
+            options.top,
+            HEAVY_MODULES,
+        )
+        for args in COMMANDS
+    ]
+    results += [
+        bench_command(
+            f"{command} (command body)",
+            "; ".join(f"import {module}" for module in modules),
+            [],
+            options.repeat,
+            options.top,
+            LAZY_MODULES,
+        )
+        for command, modules in COMMAND_BODIES.items()
+    ]
+
+    if options.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            print(
+                f"{result['command']:<36} wall {result['wall_ms']:>7.1f} ms"
+                f"   imports {result['import_ms']:>7.1f} ms"
+                f"   heavy: {', '.join(result['heavy_modules']) or '-'}"
+            )
+            for module in result["slowest_modules"]:
+                print(f"    {module['self_ms']:>7.2f} ms  {module['module']}")
+
+    if options.fail_on_heavy and any(result["heavy_modules"] for result in results):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
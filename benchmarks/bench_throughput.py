@@ -0,0 +1,164 @@
+# End-to-end throughput benchmark against the local fake controller
+#
+# Starts benchmarks/fake_controller.py in-process and runs each scenario as a separate
+# protect-archiver process against it, reporting wall-clock time, files/s, MB/s (of the
+# files written to the destination) and the peak RSS of the archiver process.
+#
+# Scenarios: download (hourly footage), events (one clip per motion event, with heatmaps),
+# sync (from the cameras' recordingStart), detections-json, detection-thumbnails.
+#
+# Usage:
+#   python benchmarks/bench_throughput.py [--scenarios download,events] [--hours 6]
+#       [--cameras 4] [--latency 0.02] [--bandwidth 50] [--error-rate 0.01] [--json] [--verbose]
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from datetime import datetime
+from datetime import timedelta
+from typing import Any
+from typing import Dict
+from typing import List
+
+from fake_controller import FakeController
+from fake_controller import add_settings_arguments
+from fake_controller import settings_from_args
+
+from protect_archiver.manifest import MANIFEST_SUFFIX
+
+
+ENTRYPOINT = "from protect_archiver.cli import main; main()"
+
+SCENARIOS: Dict[str, List[str]] = {
+    "download": ["download"],
+    "events": ["events", "--download-motion-heatmaps"],
+    "sync": ["sync"],
+    "detections-json": ["download", "--detections-json"],
+    "detection-thumbnails": ["download", "--detection-thumbnails"],
+}
+
+
+def command_line(scenario: str, dest: str, port: int, start: datetime, end: datetime) -> List[str]:
+    args = SCENARIOS[scenario] + [
+        dest,
+        "--address=127.0.0.1",
+        f"--port={port}",
+        "--username=benchmark",
+        "--password=benchmark",
+        "--ignore-failed-downloads",
+    ]
+    if scenario != "sync":
+        args += [f"--start={start:%Y-%m-%d %H:%M:%S}", f"--end={end:%Y-%m-%d %H:%M:%S}"]
+    return [sys.executable, "-c", ENTRYPOINT] + args
+
+
+# run a command and return (exit code, seconds, peak RSS in bytes) of that process alone
+def run_measured(argv: List[str], verbose: bool = False) -> Any:
+    output = None if verbose else subprocess.DEVNULL
+    started = time.perf_counter()
+    process = subprocess.Popen(argv, stdout=output, stderr=output)
+    _pid, status, rusage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - started
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak_rss = rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+    return process.returncode, elapsed, peak_rss
+
+
+# number and total size of the files written to dest: footage, event clips, heatmaps,
+# detection JSON and thumbnails, not the archiver's bookkeeping (sync state, manifests)
+def written_files(dest: str) -> Any:
+    files = 0
+    size = 0
+    for root, _dirs, names in os.walk(dest):
+        for name in names:
+            if root == dest and name == "sync.state":
+                continue
+            if name.endswith(MANIFEST_SUFFIX):
+                continue
+            files += 1
+            size += os.path.getsize(os.path.join(root, name))
+    return files, size
+
+
+def run_scenario(
+    controller: FakeController, scenario: str, hours: int, verbose: bool = False
+) -> Dict[str, Any]:
+    end = datetime.now().replace(minute=0, second=0, microsecond=0)
+    start = end - timedelta(hours=hours)
+    dest = tempfile.mkdtemp(prefix=f"bench-{scenario}-")
+    requests_before = sum(controller.stats.requests.values())
+    try:
+        exit_code, elapsed, peak_rss = run_measured(
+            command_line(scenario, dest, controller.port, start, end), verbose
+        )
+        files, size = written_files(dest)
+    finally:
+        shutil.rmtree(dest, ignore_errors=True)
+
+    return {
+        "scenario": scenario,
+        "exit_code": exit_code,
+        "seconds": elapsed,
+        "files": files,
+        "bytes": size,
+        "files_per_second": files / elapsed,
+        "mb_per_second": size / 2**20 / elapsed,
+        "peak_rss_mb": peak_rss / 2**20,
+        "requests": sum(controller.stats.requests.values()) - requests_before,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End-to-end throughput benchmark")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--hours", type=int, default=6, help="length of the downloaded range")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="show the archiver's output")
+    add_settings_arguments(parser)
+    parser.set_defaults(recording_hours=None)
+    args = parser.parse_args()
+
+    scenarios = [scenario.strip() for scenario in args.scenarios.split(",") if scenario.strip()]
+    unknown = [scenario for scenario in scenarios if scenario not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    # 'sync' downloads everything since recordingStart, keep that the same range
+    if args.recording_hours is None:
+        args.recording_hours = args.hours
+
+    results = []
+    with FakeController(settings_from_args(args)) as controller:
+        for scenario in scenarios:
+            results.append(run_scenario(controller, scenario, args.hours, args.verbose))
+        stats = controller.stats
+
+    if args.json:
+        print(json.dumps({"results": results, "controller": vars(stats)}, indent=2))
+        return
+
+    print(
+        f"{'scenario':<22}{'exit':>5}{'seconds':>10}{'files':>8}{'files/s':>10}"
+        f"{'MB':>10}{'MB/s':>9}{'peak RSS MB':>13}{'requests':>10}"
+    )
+    for result in results:
+        print(
+            f"{result['scenario']:<22}{result['exit_code']:>5}{result['seconds']:>10.2f}"
+            f"{result['files']:>8}{result['files_per_second']:>10.1f}"
+            f"{result['bytes'] / 2**20:>10.1f}{result['mb_per_second']:>9.1f}"
+            f"{result['peak_rss_mb']:>13.1f}{result['requests']:>10}"
+        )
+    print(
+        f"\ncontroller: {stats.logins} login(s), {stats.errors_injected} injected error(s),"
+        f" {stats.connections_dropped} dropped connection(s),"
+        f" {stats.bytes_sent / 2**20:.1f} MB sent"
+    )
+
+
+if __name__ == "__main__":
+    main()
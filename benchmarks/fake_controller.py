@@ -0,0 +1,425 @@
+# Local stand-in for a UniFi Protect controller (UniFi OS flavour)
+#
+# Serves the endpoints protect-archiver talks to with synthetic, deterministic data:
+#   POST /api/auth/login                        session cookie (TOKEN)
+#   GET  /proxy/protect/api/cameras             camera list
+#   GET  /proxy/protect/api/events              detections between start and end
+#   GET  /proxy/protect/api/video/export        footage sized by the requested duration
+#   GET  /proxy/protect/api/thumbnails/{id}     detection thumbnail (JPEG)
+#   GET  /proxy/protect/api/heatmaps/{id}       motion heatmap (PGM)
+#   GET  /proxy/protect/api/cameras/{id}/snapshot
+#
+# Latency (before the response headers), per-response bandwidth, error injection (HTTP 500
+# or a connection dropped mid-body), token expiry and all payload sizes are configurable,
+# so download throughput can be measured end-to-end without a real controller.
+#
+# Usage:
+#   python benchmarks/fake_controller.py [--port 7443] [--latency 0.05] [--bandwidth 20]
+#   protect-archiver download --address 127.0.0.1 --port 7443 --password x ...
+import argparse
+import os
+import random
+import shutil
+import ssl
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from dataclasses import dataclass
+from dataclasses import field
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from urllib.parse import parse_qs
+from urllib.parse import urlsplit
+
+from protect_archiver import json_codec
+
+
+API_PATH = "/proxy/protect/api"
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class ControllerSettings:
+    cameras: int = 4
+    # hours of recordings before now (the cameras' recordingStart, used by 'sync')
+    recording_hours: int = 24
+    events_per_hour: int = 6
+    # footage is sized as duration * bytes_per_second, capped at max_clip_bytes
+    bytes_per_second: int = 250_000
+    max_clip_bytes: int = 256 * 2**20
+    thumbnail_bytes: int = 30_000
+    heatmap_bytes: int = 4_000
+    snapshot_bytes: int = 120_000
+    # seconds to wait before sending the response headers (export preparation, RTT)
+    latency: float = 0.0
+    # per-response transfer rate in bytes/s, 0 for unlimited
+    bandwidth: float = 0.0
+    # probability of answering a download request with HTTP 500
+    error_rate: float = 0.0
+    # probability of dropping the connection halfway through a download
+    drop_rate: float = 0.0
+    # number of requests a session token is valid for (then 401), 0 for unlimited
+    token_ttl: int = 0
+    seed: int = 1
+
+
+@dataclass
+class ControllerStats:
+    requests: Dict[str, int] = field(default_factory=dict)
+    bytes_sent: int = 0
+    errors_injected: int = 0
+    connections_dropped: int = 0
+    logins: int = 0
+
+
+# synthetic MP4: ftyp box, mdat box filled up to the requested size, small moov box at the end
+FTYP_BOX = struct.pack(">I4s4sI8s", 24, b"ftyp", b"isom", 512, b"isomiso2")
+MOOV_BOX = struct.pack(">I4s", 16, b"moov") + struct.pack(">I4s", 8, b"free")
+
+
+def mp4_layout(size: int) -> Tuple[bytes, int, bytes]:
+    size = max(size, len(FTYP_BOX) + 8 + len(MOOV_BOX))
+    mdat_size = size - len(FTYP_BOX) - len(MOOV_BOX)
+    return FTYP_BOX + struct.pack(">I4s", mdat_size, b"mdat"), mdat_size - 8, MOOV_BOX
+
+
+def make_thumbnail(size: int) -> bytes:
+    try:
+        import io
+
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new("RGB", (640, 360), (90, 120, 150)).save(buffer, "JPEG")
+        return buffer.getvalue()
+    except ImportError:
+        return b"\xff\xd8\xff\xe0" + bytes(max(size - 6, 0)) + b"\xff\xd9"
+
+
+class FakeController:
+    """In-process fake controller, usable as a context manager:
+
+    with FakeController(ControllerSettings(latency=0.05)) as controller:
+        ... connect to 127.0.0.1:controller.port ...
+    """
+
+    def __init__(
+        self, settings: ControllerSettings, host: str = "127.0.0.1", port: int = 0
+    ) -> None:
+        self.settings = settings
+        self.stats = ControllerStats()
+        self.lock = threading.Lock()
+        self.rng = random.Random(settings.seed)
+        self.now_ms = int(time.time() // 3600 * 3600 * 1000)
+        self.tokens: Dict[str, int] = {}
+        self.camera_ids = [f"{index + 1:024x}" for index in range(settings.cameras)]
+        self.filler = bytes(CHUNK_SIZE)
+        self.thumbnail = make_thumbnail(settings.thumbnail_bytes)
+        self.heatmap = b"P5\n64 64\n255\n" + bytes(max(settings.heatmap_bytes - 13, 0))
+
+        self._tempdir = tempfile.mkdtemp(prefix="fake-protect-")
+        self.server = _Server((host, port), _Handler)
+        self.server.controller = self  # type: ignore[attr-defined]
+        self.server.socket = self._ssl_context().wrap_socket(self.server.socket, server_side=True)
+        self.host, self.port = self.server.server_address[:2]
+        self._thread: Optional[threading.Thread] = None
+
+    # protect-archiver always talks HTTPS, so serve a throwaway self-signed certificate
+    def _ssl_context(self) -> ssl.SSLContext:
+        cert = os.path.join(self._tempdir, "cert.pem")
+        key = os.path.join(self._tempdir, "key.pem")
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1"]
+            + ["-subj", "/CN=localhost", "-keyout", key, "-out", cert],
+            check=True,
+            capture_output=True,
+        )
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        return context
+
+    def start(self) -> "FakeController":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self._tempdir, ignore_errors=True)
+
+    def __enter__(self) -> "FakeController":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def count(self, endpoint: str) -> None:
+        with self.lock:
+            self.stats.requests[endpoint] = self.stats.requests.get(endpoint, 0) + 1
+
+    def login(self) -> str:
+        with self.lock:
+            self.stats.logins += 1
+            token = f"token-{self.stats.logins}"
+            self.tokens[token] = self.settings.token_ttl
+            return token
+
+    # return False if the token is unknown or used up
+    def use_token(self, token: Optional[str]) -> bool:
+        with self.lock:
+            if token not in self.tokens:
+                return False
+            if self.settings.token_ttl:
+                if self.tokens[token] <= 0:
+                    return False
+                self.tokens[token] -= 1
+            return True
+
+    def roll(self, probability: float) -> bool:
+        with self.lock:
+            return probability > 0 and self.rng.random() < probability
+
+    def cameras(self) -> List[Dict[str, Any]]:
+        recording_start = self.now_ms - self.settings.recording_hours * 3_600_000
+        return [
+            {
+                "id": camera_id,
+                "name": f"Camera {index + 1}",
+                "state": "CONNECTED",
+                "channels": [
+                    {"id": 0, "enabled": True, "bitrate": self.settings.bytes_per_second * 8}
+                ],
+                "recordingSettings": {"mode": "always", "prePaddingSecs": 2, "postPaddingSecs": 2},
+                "stats": {
+                    "video": {"recordingStart": recording_start, "recordingEnd": self.now_ms}
+                },
+            }
+            for index, camera_id in enumerate(self.camera_ids)
+        ]
+
+    # detections are derived from the hour they fall into, so overlapping queries agree
+    def events(self, start_ms: int, end_ms: int) -> List[Dict[str, Any]]:
+        per_hour = self.settings.events_per_hour
+        if per_hour <= 0:
+            return []
+
+        events = []
+        spacing = 3_600_000 // per_hour
+        for hour in range(start_ms // 3_600_000, end_ms // 3_600_000 + 1):
+            for camera_index, camera_id in enumerate(self.camera_ids):
+                hour_rng = random.Random(hour * 1000 + camera_index)
+                for slot in range(per_hour):
+                    event_start = (
+                        hour * 3_600_000 + slot * spacing + hour_rng.randrange(spacing // 2)
+                    )
+                    if not start_ms <= event_start < end_ms:
+                        continue
+                    event_id = f"{camera_index:04x}{event_start:020x}"
+                    events.append(
+                        {
+                            "id": event_id,
+                            "modelKey": "event",
+                            "type": "motion",
+                            "start": event_start,
+                            "end": event_start + hour_rng.randrange(5_000, 60_000),
+                            "score": hour_rng.randrange(100),
+                            "camera": camera_id,
+                            "smartDetectTypes": [],
+                            "thumbnail": f"e-{event_id}",
+                            "heatmap": f"e-{event_id}",
+                        }
+                    )
+        return sorted(events, key=lambda event: event["start"])
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    # clients hanging up (timeouts, aborted transfers) are expected, don't print tracebacks
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        if not isinstance(sys.exc_info()[1], (ConnectionError, ssl.SSLError)):
+            super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: Any
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    @property
+    def controller(self) -> FakeController:
+        return self.server.controller
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if urlsplit(self.path).path != "/api/auth/login":
+            return self.send_json(404, {"error": "not found"})
+
+        self.controller.count("login")
+        token = self.controller.login()
+        self.send_json(200, {"username": "benchmark"}, {"Set-Cookie": f"TOKEN={token}; Path=/"})
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if not url.path.startswith(API_PATH):
+            return self.send_json(404, {"error": "not found"})
+        path = url.path[len(API_PATH) :]
+
+        if not self.controller.use_token(self.cookie_token()):
+            self.controller.count("unauthorized")
+            return self.send_json(401, {"error": "unauthorized"})
+
+        settings = self.controller.settings
+        if path == "/cameras":
+            self.controller.count("cameras")
+            self.send_json(200, self.controller.cameras())
+        elif path == "/events":
+            self.controller.count("events")
+            self.send_json(200, self.controller.events(int(query["start"]), int(query["end"])))
+        elif path == "/video/export":
+            self.controller.count("export")
+            duration = (int(query["end"]) - int(query["start"])) / 1000
+            size = min(int(duration * settings.bytes_per_second), settings.max_clip_bytes)
+            self.send_download("video/mp4", *mp4_layout(size))
+        elif path.startswith("/thumbnails/"):
+            self.controller.count("thumbnails")
+            self.send_download("image/jpeg", self.controller.thumbnail, 0, b"")
+        elif path.startswith("/heatmaps/"):
+            self.controller.count("heatmaps")
+            self.send_download("image/x-portable-graymap", self.controller.heatmap, 0, b"")
+        elif path.startswith("/cameras/") and path.endswith("/snapshot"):
+            self.controller.count("snapshot")
+            self.send_download("image/jpeg", b"\xff\xd8", settings.snapshot_bytes, b"\xff\xd9")
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def cookie_token(self) -> Optional[str]:
+        for cookie in (self.headers.get("Cookie") or "").split(";"):
+            name, _, value = cookie.strip().partition("=")
+            if name == "TOKEN":
+                return value
+        return None
+
+    def send_json(
+        self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        body = json_codec.dumps(payload)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    # send head + `filler_bytes` zero bytes + tail, honouring latency, bandwidth and faults
+    def send_download(self, content_type: str, head: bytes, filler_bytes: int, tail: bytes) -> None:
+        controller = self.controller
+        settings = controller.settings
+        if settings.latency:
+            time.sleep(settings.latency)
+
+        if controller.roll(settings.error_rate):
+            with controller.lock:
+                controller.stats.errors_injected += 1
+            return self.send_json(500, {"error": "injected failure"})
+
+        total = len(head) + filler_bytes + len(tail)
+        drop_at = total // 2 if controller.roll(settings.drop_rate) else None
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(total))
+        self.end_headers()
+
+        sent = 0
+        started = time.monotonic()
+        for chunk in self.chunks(head, filler_bytes, tail):
+            if drop_at is not None and sent + len(chunk) > drop_at:
+                with controller.lock:
+                    controller.stats.connections_dropped += 1
+                self.close_connection = True
+                break
+            self.wfile.write(chunk)
+            sent += len(chunk)
+            if settings.bandwidth:
+                ahead = sent / settings.bandwidth - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+        with controller.lock:
+            controller.stats.bytes_sent += sent
+
+    def chunks(self, head: bytes, filler_bytes: int, tail: bytes) -> Any:
+        if head:
+            yield head
+        filler = self.controller.filler
+        while filler_bytes > 0:
+            chunk = filler[: min(filler_bytes, len(filler))]
+            filler_bytes -= len(chunk)
+            yield chunk
+        if tail:
+            yield tail
+
+
+def settings_from_args(args: argparse.Namespace) -> ControllerSettings:
+    return ControllerSettings(
+        cameras=args.cameras,
+        recording_hours=args.recording_hours,
+        events_per_hour=args.events_per_hour,
+        bytes_per_second=args.bytes_per_second,
+        max_clip_bytes=args.max_clip_mb * 2**20,
+        latency=args.latency,
+        bandwidth=args.bandwidth * 2**20,
+        error_rate=args.error_rate,
+        drop_rate=args.drop_rate,
+        token_ttl=args.token_ttl,
+    )
+
+
+def add_settings_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = ControllerSettings()
+    parser.add_argument("--cameras", type=int, default=defaults.cameras)
+    parser.add_argument("--recording-hours", type=int, default=defaults.recording_hours)
+    parser.add_argument("--events-per-hour", type=int, default=defaults.events_per_hour)
+    parser.add_argument("--bytes-per-second", type=int, default=defaults.bytes_per_second)
+    parser.add_argument("--max-clip-mb", type=int, default=defaults.max_clip_bytes // 2**20)
+    parser.add_argument("--latency", type=float, default=defaults.latency, help="seconds")
+    parser.add_argument("--bandwidth", type=float, default=0.0, help="MB/s per response")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--drop-rate", type=float, default=defaults.drop_rate)
+    parser.add_argument("--token-ttl", type=int, default=defaults.token_ttl, help="requests")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local fake UniFi Protect controller")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7443)
+    add_settings_arguments(parser)
+    args = parser.parse_args()
+
+    controller = FakeController(settings_from_args(args), args.host, args.port)
+    print(f"Fake Protect controller listening on https://{args.host}:{controller.port}")
+    try:
+        controller.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
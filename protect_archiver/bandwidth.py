@@ -0,0 +1,114 @@
+# shared bandwidth budget for downloads and S3 uploads ('--max-bandwidth')
+#
+# A TokenBucket is shared by every worker of a process. Each worker reports the bytes it
+# has just transferred with consume(); once the workers together get ahead of the rate,
+# consume() makes the caller sleep until the budget has caught up again. Unused budget is
+# kept for up to one second (the burst), so short pauses between requests do not waste it.
+# The rate can follow a BandwidthSchedule, e.g. a lower cap during business hours.
+import threading
+import time
+
+from datetime import datetime
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+
+# the time-of-day rate of a schedule is looked up at most this often (seconds)
+SCHEDULE_CHECK_INTERVAL = 10.0
+
+
+class BandwidthSchedule:
+    """Bandwidth caps by time of day, parsed from a '--max-bandwidth' value.
+
+    The value is either a single cap in MB/s ("20") or comma-separated "HH:MM-HH:MM=MB/s"
+    windows plus an optional plain cap for the rest of the day ("08:00-18:00=5,50").
+    Outside of all windows and without a plain cap, the bandwidth is unlimited. Windows
+    may wrap around midnight ("22:00-06:00=100").
+    """
+
+    def __init__(self, value: str) -> None:
+        self.value = value
+        self.default: Optional[float] = None
+        # (start minute of day, end minute of day, bytes per second)
+        self.windows: List[Tuple[int, int, float]] = []
+
+        for entry in value.split(","):
+            window, _, rate = entry.strip().rpartition("=")
+            if not window:
+                self.default = parse_rate(rate)
+                continue
+            start, separator, end = window.partition("-")
+            if not separator:
+                raise ValueError(f"'{window}' is not a time window of the form HH:MM-HH:MM")
+            self.windows.append((parse_time(start), parse_time(end), parse_rate(rate)))
+
+    def rate_at(self, moment: datetime) -> Optional[float]:
+        """Return the cap in bytes per second at the given (local) time, None if unlimited."""
+        minute = moment.hour * 60 + moment.minute
+        for start, end, rate in self.windows:
+            if start <= minute < end or (end <= start and (minute >= start or minute < end)):
+                return rate
+        return self.default
+
+
+def parse_rate(value: str) -> float:
+    try:
+        rate = float(value)
+    except ValueError:
+        raise ValueError(f"'{value}' is not a bandwidth in MB/s")
+    if rate <= 0:
+        raise ValueError(f"bandwidth must be greater than 0 MB/s, got {value}")
+    return rate * 2**20
+
+
+def parse_time(value: str) -> int:
+    try:
+        parsed = datetime.strptime(value.strip(), "%H:%M")
+    except ValueError:
+        raise ValueError(f"'{value}' is not a time of the form HH:MM")
+    return parsed.hour * 60 + parsed.minute
+
+
+class TokenBucket:
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        schedule: Optional[BandwidthSchedule] = None,
+    ) -> None:
+        # bytes per second; None means unlimited. Replaced by the schedule's current rate.
+        self.rate = rate
+        self.burst = burst
+        self.schedule = schedule
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self._schedule_checked: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int) -> None:
+        """Take `amount` bytes from the budget, waiting until they are covered by it."""
+        if self.schedule is None and not self.rate:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            if self.schedule is not None and (
+                self._schedule_checked is None
+                or now - self._schedule_checked >= SCHEDULE_CHECK_INTERVAL
+            ):
+                self.rate = self.schedule.rate_at(datetime.now())
+                self._schedule_checked = now
+            if not self.rate:
+                self._updated = now
+                return
+
+            burst = self.burst if self.burst is not None else self.rate
+            self._tokens = min(burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # the bucket may go negative: later callers wait for this reservation as well
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
@@ -1,20 +1,23 @@
 from .download import *  # NOQA
 from .events import *  # NOQA
+from .merge_shards import *  # NOQA
+from .sites import *  # NOQA
 from .sync import *  # NOQA
+from .verify import *  # NOQA
 
 
 def main() -> None:
     import logging
     import os
-
-    import urllib3
+    import warnings
 
     logging.basicConfig(format="%(message)s", level=logging.INFO)
 
     os.environ.setdefault("PYTHONUNBUFFERED", "true")
 
     # disable InsecureRequestWarning for unverified HTTPS requests
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    # (matched by message so that urllib3 is only imported once a command actually runs)
+    warnings.filterwarnings("ignore", message="Unverified HTTPS request")
 
     from .base import cli
 
@@ -1,6 +1,78 @@
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
 import click
 
 
 @click.group()
 def cli() -> None:
     pass
+
+
+# click callback for '--max-bandwidth'
+def validate_bandwidth(ctx: Any, param: Any, value: Optional[str]) -> Any:
+    if value is None:
+        return None
+
+    from protect_archiver.bandwidth import BandwidthSchedule
+
+    try:
+        return BandwidthSchedule(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+# click callback for '--shard i/N'
+def validate_shard(ctx: Any, param: Any, value: Optional[str]) -> Optional[Tuple[int, int]]:
+    if value is None:
+        return None
+
+    from protect_archiver.utils import parse_shard
+
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+# click callback for '--sink [MODE=]KIND' (multiple); returns mode -> kind, a KIND without
+# a mode applies to all modes and later values win
+def validate_sinks(ctx: Any, param: Any, value: Tuple[str, ...]) -> Optional[Dict[str, str]]:
+    if not value:
+        return None
+
+    from protect_archiver.sinks import SINK_KINDS
+    from protect_archiver.sinks import SINK_MODES
+
+    sinks: Dict[str, str] = {}
+    for item in value:
+        mode, _, kind = item.rpartition("=")
+        if kind not in SINK_KINDS:
+            raise click.BadParameter(f"unknown sink '{kind}', expected one of {SINK_KINDS}")
+        if mode and mode not in SINK_MODES:
+            raise click.BadParameter(f"unknown mode '{mode}', expected one of {SINK_MODES}")
+        for sink_mode in [mode] if mode else SINK_MODES:
+            sinks[sink_mode] = kind
+    return sinks
+
+
+# click callback for '--copy-to s3://bucket/prefix' (multiple)
+def validate_copy_to(ctx: Any, param: Any, value: Tuple[str, ...]) -> Optional[List[str]]:
+    if not value:
+        return None
+
+    from protect_archiver.sinks import parse_s3_url
+
+    destinations = []
+    for url in value:
+        try:
+            bucket, prefix = parse_s3_url(url)
+        except ValueError as e:
+            raise click.BadParameter(str(e))
+        destination = f"s3://{bucket}/{prefix}" if prefix else f"s3://{bucket}"
+        if destination not in destinations:
+            destinations.append(destination)
+    return destinations
@@ -1,13 +1,21 @@
 from datetime import datetime
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
 
 import click
 
 from protect_archiver.cli.base import cli
-from protect_archiver.client import ProtectClient
+from protect_archiver.cli.base import validate_bandwidth
+from protect_archiver.cli.base import validate_copy_to
+from protect_archiver.cli.base import validate_shard
+from protect_archiver.cli.base import validate_sinks
 from protect_archiver.config import Config
-from protect_archiver.downloader import Downloader
-from protect_archiver.errors import ProtectError
-from protect_archiver.utils import print_download_stats
+from protect_archiver.profiling import PROFILE_MODES
+from protect_archiver.profiling import start_profiling
+from protect_archiver.profiling import stop_profiling
 
 
 @cli.command("download", help="Download footage from a local UniFi Protect system")
@@ -99,7 +107,10 @@ from protect_archiver.utils import print_download_stats
     is_flag=True,
     default=False,
     show_default=True,
-    help="Skip downloading files which already exist on disk",
+    help=(
+        "Skip downloading files which already exist on disk (with --s3-bucket: footage files"
+        " which already exist in the bucket, found by listing each camera-day prefix once)"
+    ),
     envvar="PROTECT_SKIP_EXISTING",
     show_envvar=True,
 )
@@ -197,6 +208,70 @@ from protect_archiver.utils import print_download_stats
     envvar="PROTECT_DISABLE_SPLITTING",
     show_envvar=True,
 )
+@click.option(
+    "--skip-unrecorded-intervals",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help=(
+        "Plan downloads from the camera's recording timeline: start at the camera's first "
+        "recording and, for cameras that only record on detections, skip 1-hour segments "
+        "without any detection event instead of requesting them from the controller"
+    ),
+    envvar="PROTECT_SKIP_UNRECORDED_INTERVALS",
+    show_envvar=True,
+)
+@click.option(
+    "--plan",
+    "show_plan",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help=(
+        "Dry run: print how many export requests and bytes the footage download would take "
+        "per camera and per day, the projected wall-clock time and the free space in DEST, "
+        "then exit without downloading. Requires --start and --end."
+    ),
+    envvar="PROTECT_PLAN",
+    show_envvar=True,
+)
+@click.option(
+    "--plan-format",
+    type=click.Choice(["text", "json"]),
+    default="text",
+    show_default=True,
+    help="Output format of --plan",
+    envvar="PROTECT_PLAN_FORMAT",
+    show_envvar=True,
+)
+@click.option(
+    "--plan-concurrency",
+    default=Config.PLAN_CONCURRENCY,
+    show_default=True,
+    help="Number of parallel downloads to assume for the wall-clock projection of --plan",
+    envvar="PROTECT_PLAN_CONCURRENCY",
+    show_envvar=True,
+)
+@click.option(
+    "--plan-throughput",
+    default=Config.PLAN_THROUGHPUT,
+    show_default=True,
+    help="Export throughput of the controller in MB/s to assume for the projection of --plan",
+    envvar="PROTECT_PLAN_THROUGHPUT",
+    show_envvar=True,
+)
+@click.option(
+    "--check-free-space",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help=(
+        "Estimate the size of the footage download before starting and abort if DEST does "
+        "not have enough free space"
+    ),
+    envvar="PROTECT_CHECK_FREE_SPACE",
+    show_envvar=True,
+)
 @click.option(
     "--snapshot",
     "create_snapshot",
@@ -303,6 +378,19 @@ from protect_archiver.utils import print_download_stats
     envvar="AWS_SECRET_ACCESS_KEY",
     show_envvar=True,
 )
+@click.option(
+    "--local-cache-size",
+    type=click.FloatRange(min=0),
+    default=Config.LOCAL_CACHE_SIZE,
+    required=False,
+    help=(
+        "Keep up to this many GB of files uploaded to S3 in the destination directory instead"
+        " of deleting them right away; the least recently used (uploaded, or found in S3 by"
+        " --skip-existing-files) files are deleted first"
+    ),
+    envvar="PROTECT_LOCAL_CACHE_SIZE",
+    show_envvar=True,
+)
 @click.option(
     "--status-csv-dir",
     default=None,
@@ -312,6 +400,166 @@ from protect_archiver.utils import print_download_stats
     envvar="PROTECT_STATUS_CSV_DIR",
     show_envvar=True,
 )
+@click.option(
+    "--status-summary",
+    is_flag=True,
+    default=Config.STATUS_SUMMARY,
+    show_default=True,
+    help=(
+        "Also write p50/p95/p99 of the download timings per camera and per hour of day to"
+        " summary_<timestamp>.csv in the status CSV directory"
+    ),
+    envvar="PROTECT_STATUS_SUMMARY",
+    show_envvar=True,
+)
+@click.option(
+    "--retry-failed",
+    "retry_failed",
+    default=None,
+    required=False,
+    type=click.Path(exists=True, file_okay=False, resolve_path=True),
+    help=(
+        "Instead of downloading a time range, retry every footage download or S3 upload"
+        " recorded as 'failed' in the status CSVs of this directory and update the CSVs in"
+        " place. --use-subfolders and --use-utc-filenames must match the original run."
+        " Cannot be combined with --status-csv-dir, --snapshot, --detections-json,"
+        " --detection-thumbnails or --plan."
+    ),
+    envvar="PROTECT_RETRY_FAILED",
+    show_envvar=True,
+)
+@click.option(
+    "--copy-to",
+    "copy_to",
+    multiple=True,
+    callback=validate_copy_to,
+    help=(
+        "Also stream every downloaded file to this S3 bucket and prefix"
+        " ('s3://bucket/prefix', can be given multiple times) while it is written to the"
+        " destination, so each export is read from the controller once however many copies"
+        " are kept. Uses the --s3-region and credential options. The status CSVs get an"
+        " 'upload_status:<url>' column per destination. Cannot be combined with --s3-bucket"
+    ),
+    envvar="PROTECT_COPY_TO",
+    show_envvar=True,
+)
+@click.option(
+    "--sink",
+    "sinks",
+    multiple=True,
+    callback=validate_sinks,
+    help=(
+        "Where the downloaded files are written, per mode: 'MODE=KIND' with MODE one of"
+        " footage, snapshots, detections, thumbnails and KIND one of local (default), s3"
+        " (streamed to --s3-bucket with a multipart upload, nothing is written locally),"
+        " tar (one '<YYYY-MM-DD>.tar' per day in the destination) or null (discarded, to"
+        " measure network throughput). A KIND without MODE applies to all modes. Can be"
+        " given multiple times, e.g. '--sink footage=s3 --sink thumbnails=tar'"
+    ),
+    envvar="PROTECT_SINK",
+    show_envvar=True,
+)
+@click.option(
+    "--daily-concat",
+    is_flag=True,
+    default=Config.DAILY_CONCAT,
+    show_default=True,
+    help=(
+        "Once the last hour of a camera-day is downloaded, stream-copy the day's chunks into"
+        " one fragmented '<camera> - <day>.daily.mp4' with ffmpeg (no re-encoding) in the"
+        " background, with the chunks' offsets in '<camera> - <day>.daily.json'. The hourly"
+        " chunks are kept. Requires ffmpeg and ffprobe, not available with --shard."
+    ),
+    envvar="PROTECT_DAILY_CONCAT",
+    show_envvar=True,
+)
+@click.option(
+    "--shard",
+    default=None,
+    required=False,
+    callback=validate_shard,
+    help=(
+        "Only process this node's share 'i/N' (1 <= i <= N) of the camera x interval units,"
+        " assigned by a hash of camera ID and interval start, so N nodes running the same"
+        " command split the work without overlap. All nodes must use the same time zone and"
+        " interval options. Status CSVs are written as YYYY_MM_DD.shard-<i>-of-<N>.csv,"
+        " combine them with 'merge-shards'."
+    ),
+    envvar="PROTECT_SHARD",
+    show_envvar=True,
+)
+@click.option(
+    "--shutdown-grace",
+    type=float,
+    default=Config.SHUTDOWN_GRACE,
+    show_default=True,
+    help=(
+        "On SIGTERM, start no new downloads and give the one in flight this many seconds to"
+        " finish before it is aborted (a second SIGTERM aborts it right away). Status CSVs"
+        " are flushed and the command exits with code 8"
+    ),
+    envvar="PROTECT_SHUTDOWN_GRACE",
+    show_envvar=True,
+)
+@click.option(
+    "--max-bandwidth",
+    default=None,
+    required=False,
+    callback=validate_bandwidth,
+    help=(
+        "Cap the combined download and S3 upload bandwidth, in MB/s. Either a single cap"
+        " ('20') or comma-separated time-of-day windows with an optional cap for the rest of"
+        " the day ('08:00-18:00=5,50'); outside all windows without such a cap, bandwidth is"
+        " unlimited"
+    ),
+    envvar="PROTECT_MAX_BANDWIDTH",
+    show_envvar=True,
+)
+@click.option(
+    "--min-throughput",
+    type=float,
+    default=Config.MIN_THROUGHPUT,
+    required=False,
+    help=(
+        "Abort and retry a download whose throughput stays below this many MB/s for"
+        " --stall-window seconds, or that takes longer than --stall-window plus the time its"
+        " size needs at this throughput. Cameras that keep stalling are downloaded last"
+        " (scores are kept in stalls.json in the destination directory)."
+    ),
+    envvar="PROTECT_MIN_THROUGHPUT",
+    show_envvar=True,
+)
+@click.option(
+    "--stall-window",
+    type=float,
+    default=Config.STALL_WINDOW,
+    show_default=True,
+    help="Window in seconds over which --min-throughput is measured",
+    envvar="PROTECT_STALL_WINDOW",
+    show_envvar=True,
+)
+@click.option(
+    "--metrics-port",
+    type=int,
+    default=Config.METRICS_PORT,
+    required=False,
+    help="Serve Prometheus metrics at http://<host>:<port>/metrics while the command runs",
+    envvar="PROTECT_METRICS_PORT",
+    show_envvar=True,
+)
+@click.option(
+    "--profile",
+    type=click.Choice(PROFILE_MODES),
+    default=Config.PROFILE,
+    required=False,
+    help=(
+        "Profile the command and write a report with timing spans (auth, camera list, events"
+        " fetch, export request, disk write, resize, upload) into the destination directory:"
+        " a pstats file for 'cprofile', the top allocation sites for 'tracemalloc'"
+    ),
+    envvar="PROTECT_PROFILE",
+    show_envvar=True,
+)
 def download(
     dest: str,
     address: str,
@@ -331,6 +579,12 @@ def download(
     end: datetime,
     disable_alignment: bool,
     disable_splitting: bool,
+    skip_unrecorded_intervals: bool,
+    show_plan: bool,
+    plan_format: str,
+    plan_concurrency: int,
+    plan_throughput: float,
+    check_free_space: bool,
     create_snapshot: bool,
     use_utc_filenames: bool,
     detections_json: bool,
@@ -341,27 +595,52 @@ def download(
     s3_region: str,
     s3_aws_access_key_id: str,
     s3_aws_secret_access_key: str,
+    local_cache_size: Optional[float],
     status_csv_dir: str,
+    status_summary: bool,
+    retry_failed: Optional[str],
+    sinks: Optional[Dict[str, str]],
+    copy_to: Optional[List[str]],
+    daily_concat: bool,
+    shard: Optional[Tuple[int, int]],
+    shutdown_grace: float,
+    max_bandwidth: Any,
+    min_throughput: Optional[float],
+    stall_window: float,
+    metrics_port: Optional[int],
+    profile: Optional[str],
 ) -> None:
-    # check the provided command line arguments
-    # TODO(danielfernau): remove exit codes 1 (path invalid) and 6 (start/end/snapshot) from docs: no longer valid
-
-    if detections_json and detection_thumbnails:
-        raise click.UsageError(
-            "--detections-json and --detection-thumbnails cannot be used together"
-        )
-
-    if detections_json:
-        if create_snapshot:
-            raise click.UsageError("--detections-json cannot be combined with --snapshot")
-        if not start or not end:
-            raise click.UsageError("--detections-json requires --start and --end")
+    # deferred so that '--help' and argument errors don't pay for requests/boto3 imports
+    from protect_archiver import shutdown
+    from protect_archiver.client import ProtectClient
+    from protect_archiver.downloader import Downloader
+    from protect_archiver.errors import ProtectError
+    from protect_archiver.utils import print_download_stats
 
-    if detection_thumbnails:
-        if create_snapshot:
-            raise click.UsageError("--detection-thumbnails cannot be combined with --snapshot")
-        if not start or not end:
-            raise click.UsageError("--detection-thumbnails requires --start and --end")
+    # check the provided command line arguments
+    # TODO(danielfernau): remove exit codes 1 (path invalid) and 6 (start/end/snapshot) from
+    #  docs: no longer valid
+    check_mode_options(
+        start,
+        end,
+        create_snapshot,
+        detections_json,
+        detection_thumbnails,
+        show_plan or check_free_space,
+        retry_failed,
+        status_csv_dir,
+        shard,
+    )
+    check_sink_options(
+        sinks,
+        copy_to,
+        s3_bucket,
+        local_cache_size,
+        daily_concat,
+        shard,
+        create_snapshot or detections_json or detection_thumbnails,
+        status_summary and not status_csv_dir,
+    )
 
     if create_snapshot:
         if start or end:
@@ -385,28 +664,59 @@ def download(
         touch_files=touch_files,
         download_timeout=download_timeout,
         use_utc_filenames=use_utc_filenames,
+        skip_unrecorded_intervals=skip_unrecorded_intervals,
         s3_bucket=s3_bucket,
         s3_prefix=s3_prefix,
         s3_region=s3_region,
         s3_aws_access_key_id=s3_aws_access_key_id,
         s3_aws_secret_access_key=s3_aws_secret_access_key,
+        local_cache_size=local_cache_size,
         status_csv_dir=status_csv_dir,
+        status_summary=status_summary,
+        shard=shard,
+        daily_concat=daily_concat,
+        sinks=sinks,
+        copy_to=copy_to,
+        max_bandwidth=max_bandwidth,
+        min_throughput=min_throughput,
+        stall_window=stall_window,
     )
 
+    if metrics_port is not None:
+        from protect_archiver.metrics import start_metrics_server
+
+        start_metrics_server(metrics_port)
+
+    profiler = start_profiling(profile, dest, "download")
+    shutdown.install(shutdown_grace)
     try:
-        # get camera list
-        click.echo("Getting camera list")
-        camera_list = client.get_camera_list()
+        camera_list = get_cameras(client, cameras)
         session = client.get_session()
 
-        if cameras != "all":
-            camera_s = set(cameras.split(","))
-            camera_list = [c for c in camera_list if c["id"] in camera_s]
+        if show_plan or check_free_space:
+            fits = plan_download(
+                client,
+                camera_list,
+                start,
+                end,
+                disable_alignment,
+                disable_splitting,
+                plan_concurrency,
+                plan_throughput,
+                plan_format if show_plan else None,
+            )
+            if show_plan:
+                return
+            if not fits:
+                raise ProtectError(7)
 
-        if s3_bucket:
-            click.echo(f"S3 upload enabled: s3://{s3_bucket}/{s3_prefix}")
+        echo_sinks(client)
 
-        if detections_json:
+        if retry_failed:
+            click.echo(f"Retrying failed downloads recorded in {retry_failed}")
+            retried, still_failed = Downloader.retry_failed(client, retry_failed, camera_list)
+            click.echo(f"Retried {retried} failed row(s), {still_failed} failed again")
+        elif detections_json:
             click.echo(
                 f"Downloading detection metadata between {start} and {end} from"
                 f" '{session.authority}{session.base_path}/events' for"
@@ -423,33 +733,246 @@ def download(
                 client, start, end, camera_list, thumbnail_max_height
             )
         elif not create_snapshot:
-            for camera in camera_list:
-                # noinspection PyUnboundLocalVariable
-                click.echo(
-                    f"Downloading video files between {start} and {end} from"
-                    f" '{session.authority}{session.base_path}/video/export' for camera"
-                    f" {camera.name}"
-                )
-
-                Downloader.download_footage(
-                    client, start, end, camera, disable_alignment, disable_splitting
-                )
-        else:
-            click.echo(
-                f"Downloading snapshot files for {start.ctime()}"
-                f" from '{session.authority}{session.base_path}/cameras/[camera_id]/snapshot'"
+            download_all_footage(
+                client, camera_list, start, end, disable_alignment, disable_splitting
             )
-            for camera in camera_list:
-                Downloader.download_snapshot(client, start, camera)
+        else:
+            download_all_snapshots(client, camera_list, start)
 
         # flush any remaining status records
-        if client.status_tracker is not None:
-            client.status_tracker.flush_all()
+        finish_status(client, status_summary)
 
         print_download_stats(client)
+        if client.daily_concat is not None:
+            client.daily_concat.close()
 
     except ProtectError as e:
         # flush status records even on error
         if client.status_tracker is not None:
             client.status_tracker.flush_all()
         exit(e.code)
+    except shutdown.ShutdownRequested as e:
+        shutdown.disarm()
+        click.echo(f"Shutting down: {e}")
+        if client.daily_concat is not None:
+            client.daily_concat.cancel()
+        if client.status_tracker is not None:
+            client.status_tracker.flush_all()
+        print_download_stats(client)
+        exit(shutdown.EXIT_CODE)
+    finally:
+        shutdown.uninstall()
+        client.close_sinks()
+        stop_profiling(profiler)
+
+
+# reject combinations of --snapshot, --detections-json, --detection-thumbnails, --plan (or
+# --check-free-space), --retry-failed and --shard that don't work together
+def check_mode_options(
+    start: Optional[datetime],
+    end: Optional[datetime],
+    create_snapshot: bool,
+    detections_json: bool,
+    detection_thumbnails: bool,
+    plan: bool,
+    retry_failed: Optional[str],
+    status_csv_dir: Optional[str],
+    shard: Optional[Tuple[int, int]],
+) -> None:
+    if detections_json and detection_thumbnails:
+        raise click.UsageError(
+            "--detections-json and --detection-thumbnails cannot be used together"
+        )
+
+    if detections_json:
+        if create_snapshot:
+            raise click.UsageError("--detections-json cannot be combined with --snapshot")
+        if not start or not end:
+            raise click.UsageError("--detections-json requires --start and --end")
+
+    if detection_thumbnails:
+        if create_snapshot:
+            raise click.UsageError("--detection-thumbnails cannot be combined with --snapshot")
+        if not start or not end:
+            raise click.UsageError("--detection-thumbnails requires --start and --end")
+
+    if plan:
+        if create_snapshot or detections_json or detection_thumbnails:
+            raise click.UsageError("--plan and --check-free-space only apply to footage downloads")
+        if not start or not end:
+            raise click.UsageError("--plan and --check-free-space require --start and --end")
+
+    if retry_failed:
+        if status_csv_dir or create_snapshot or detections_json or detection_thumbnails:
+            raise click.UsageError(
+                "--retry-failed cannot be combined with --status-csv-dir, --snapshot,"
+                " --detections-json or --detection-thumbnails"
+            )
+        if plan:
+            raise click.UsageError("--plan and --check-free-space only apply to footage downloads")
+
+    if shard and (create_snapshot or detections_json or detection_thumbnails):
+        raise click.UsageError("--shard only applies to footage downloads")
+
+
+# reject combinations of --sink, --copy-to, --s3-bucket, --local-cache-size, --daily-concat
+# (with --shard) and --status-summary that don't work together; `not_footage` is set for
+# snapshot and detection downloads
+def check_sink_options(
+    sinks: Optional[Dict[str, str]],
+    copy_to: Optional[List[str]],
+    s3_bucket: Optional[str],
+    local_cache_size: Optional[float],
+    daily_concat: bool,
+    shard: Optional[Tuple[int, int]],
+    not_footage: bool,
+    summary_without_csv: bool,
+) -> None:
+    if copy_to and s3_bucket:
+        raise click.UsageError(
+            "--copy-to cannot be combined with --s3-bucket, add the bucket as another --copy-to"
+        )
+
+    if sinks and "s3" in sinks.values() and not s3_bucket:
+        raise click.UsageError("--sink s3 requires --s3-bucket")
+
+    if daily_concat:
+        if sinks and sinks.get("footage", "local") != "local":
+            raise click.UsageError("--daily-concat requires the local sink for footage")
+        if s3_bucket:
+            raise click.UsageError(
+                "--daily-concat cannot be combined with --s3-bucket: uploaded chunks are"
+                " deleted locally"
+            )
+        if not_footage:
+            raise click.UsageError("--daily-concat only applies to footage downloads")
+        if shard:
+            raise click.UsageError(
+                "--daily-concat cannot be combined with --shard: each shard only has its own"
+                " hours of a day"
+            )
+        from protect_archiver.concat import ffmpeg_available
+
+        if not ffmpeg_available():
+            raise click.UsageError(
+                f"--daily-concat requires {Config.FFMPEG} and {Config.FFPROBE} on the PATH"
+            )
+
+    if local_cache_size is not None and not s3_bucket:
+        raise click.UsageError("--local-cache-size requires --s3-bucket")
+
+    if summary_without_csv:
+        raise click.UsageError("--status-summary requires --status-csv-dir")
+
+
+# report where the files go besides the destination directory
+def echo_sinks(client: Any) -> None:
+    if client.s3_bucket:
+        click.echo(f"S3 upload enabled: s3://{client.s3_bucket}/{client.s3_prefix}")
+    for destination in client.copy_to:
+        click.echo(f"Copying every file to {destination}")
+
+
+# return the cameras selected with '--cameras', a comma-separated list of IDs or "all"
+def get_cameras(client: Any, cameras: str) -> List[Any]:
+    click.echo("Getting camera list")
+    camera_list = client.get_camera_list()
+
+    if cameras != "all":
+        camera_s = set(cameras.split(","))
+        camera_list = [c for c in camera_list if c["id"] in camera_s]
+    return camera_list
+
+
+# flush the remaining status records and write the '--status-summary' report
+def finish_status(client: Any, status_summary: bool) -> None:
+    if client.status_tracker is None:
+        return
+    client.status_tracker.flush_all()
+    if status_summary:
+        summary_path = client.status_tracker.write_summary()
+        if summary_path is not None:
+            click.echo(f"Download timing summary written to {summary_path}")
+
+
+# download the footage of all cameras, the ones that keep stalling last
+def download_all_footage(
+    client: Any,
+    camera_list: List[Any],
+    start: datetime,
+    end: datetime,
+    disable_alignment: bool,
+    disable_splitting: bool,
+) -> None:
+    from protect_archiver.downloader import Downloader
+
+    session = client.get_session()
+    if client.stall_tracker is not None:
+        camera_list = client.stall_tracker.prioritize(camera_list)
+    for camera in camera_list:
+        click.echo(
+            f"Downloading video files between {start} and {end} from"
+            f" '{session.authority}{session.base_path}/video/export' for camera"
+            f" {camera.name}"
+        )
+
+        Downloader.download_footage(
+            client, start, end, camera, disable_alignment, disable_splitting
+        )
+
+
+# download a snapshot of every camera at `start`
+def download_all_snapshots(client: Any, camera_list: List[Any], start: datetime) -> None:
+    from protect_archiver.downloader import Downloader
+
+    session = client.get_session()
+    click.echo(
+        f"Downloading snapshot files for {start.ctime()}"
+        f" from '{session.authority}{session.base_path}/cameras/[camera_id]/snapshot'"
+    )
+    for camera in camera_list:
+        Downloader.download_snapshot(client, start, camera)
+
+
+# estimate the footage download and either print the plan (output_format set, '--plan') or
+# report whether the destination has enough free space for it ('--check-free-space')
+def plan_download(
+    client: Any,
+    camera_list: List[Any],
+    start: datetime,
+    end: datetime,
+    disable_alignment: bool,
+    disable_splitting: bool,
+    concurrency: int,
+    throughput: float,
+    output_format: Optional[str],
+) -> bool:
+    from protect_archiver import json_codec
+    from protect_archiver.downloader import Downloader
+    from protect_archiver.downloader.plan_footage import format_download_plan
+    from protect_archiver.utils import format_bytes
+
+    download_plan = Downloader.estimate_download_plan(
+        client,
+        camera_list,
+        start,
+        end,
+        disable_alignment,
+        disable_splitting,
+        concurrency,
+        throughput,
+    )
+
+    if output_format == "json":
+        click.echo(json_codec.dumps(download_plan, indent=True).decode("utf-8"))
+    elif output_format == "text":
+        click.echo(format_download_plan(download_plan))
+
+    destination = download_plan["destination"]
+    if not destination["fits"]:
+        click.echo(
+            f"Not enough free space in {destination['path']}:"
+            f" {format_bytes(destination['required_bytes'])} required,"
+            f" {format_bytes(destination['free_bytes'])} available"
+        )
+    return bool(destination["fits"])
@@ -1,13 +1,17 @@
 from datetime import datetime
+from typing import Any
+from typing import Dict
+from typing import Optional
 
 import click
 
 from protect_archiver.cli.base import cli
-from protect_archiver.client import ProtectClient
+from protect_archiver.cli.base import validate_bandwidth
+from protect_archiver.cli.base import validate_sinks
 from protect_archiver.config import Config
-from protect_archiver.downloader import Downloader
-from protect_archiver.errors import ProtectError
-from protect_archiver.utils import print_download_stats
+from protect_archiver.profiling import PROFILE_MODES
+from protect_archiver.profiling import start_profiling
+from protect_archiver.profiling import stop_profiling
 
 
 @cli.command("events", help="Download event recordings from UniFi Protect to a local destination")
@@ -188,6 +192,91 @@ from protect_archiver.utils import print_download_stats
     envvar="PROTECT_USE_UTC",
     show_envvar=True,
 )
+@click.option(
+    "--sink",
+    "sinks",
+    multiple=True,
+    callback=validate_sinks,
+    help=(
+        "Where the event videos and heat maps are written: local (default), tar (one"
+        " '<YYYY-MM-DD>.tar' per day in the destination) or null (discarded, to measure"
+        " network throughput)"
+    ),
+    envvar="PROTECT_SINK",
+    show_envvar=True,
+)
+@click.option(
+    "--shutdown-grace",
+    type=float,
+    default=Config.SHUTDOWN_GRACE,
+    show_default=True,
+    help=(
+        "On SIGTERM, start no new downloads and give the one in flight this many seconds to"
+        " finish before it is aborted (a second SIGTERM aborts it right away), then exit with"
+        " code 8"
+    ),
+    envvar="PROTECT_SHUTDOWN_GRACE",
+    show_envvar=True,
+)
+@click.option(
+    "--max-bandwidth",
+    default=None,
+    required=False,
+    callback=validate_bandwidth,
+    help=(
+        "Cap the combined download and S3 upload bandwidth, in MB/s. Either a single cap"
+        " ('20') or comma-separated time-of-day windows with an optional cap for the rest of"
+        " the day ('08:00-18:00=5,50'); outside all windows without such a cap, bandwidth is"
+        " unlimited"
+    ),
+    envvar="PROTECT_MAX_BANDWIDTH",
+    show_envvar=True,
+)
+@click.option(
+    "--min-throughput",
+    type=float,
+    default=Config.MIN_THROUGHPUT,
+    required=False,
+    help=(
+        "Abort and retry a download whose throughput stays below this many MB/s for"
+        " --stall-window seconds, or that takes longer than --stall-window plus the time its"
+        " size needs at this throughput. Cameras that keep stalling are downloaded last"
+        " (scores are kept in stalls.json in the destination directory)."
+    ),
+    envvar="PROTECT_MIN_THROUGHPUT",
+    show_envvar=True,
+)
+@click.option(
+    "--stall-window",
+    type=float,
+    default=Config.STALL_WINDOW,
+    show_default=True,
+    help="Window in seconds over which --min-throughput is measured",
+    envvar="PROTECT_STALL_WINDOW",
+    show_envvar=True,
+)
+@click.option(
+    "--metrics-port",
+    type=int,
+    default=Config.METRICS_PORT,
+    required=False,
+    help="Serve Prometheus metrics at http://<host>:<port>/metrics while the command runs",
+    envvar="PROTECT_METRICS_PORT",
+    show_envvar=True,
+)
+@click.option(
+    "--profile",
+    type=click.Choice(PROFILE_MODES),
+    default=Config.PROFILE,
+    required=False,
+    help=(
+        "Profile the command and write a report with timing spans (auth, camera list, events"
+        " fetch, export request, disk write, resize, upload) into the destination directory:"
+        " a pstats file for 'cprofile', the top allocation sites for 'tracemalloc'"
+    ),
+    envvar="PROTECT_PROFILE",
+    show_envvar=True,
+)
 def events(
     dest: str,
     address: str,
@@ -207,7 +296,25 @@ def events(
     end: datetime,
     download_motion_heatmaps: bool,
     use_utc_filenames: bool,
+    sinks: Optional[Dict[str, str]],
+    shutdown_grace: float,
+    max_bandwidth: Any,
+    min_throughput: Optional[float],
+    stall_window: float,
+    metrics_port: Optional[int],
+    profile: Optional[str],
 ) -> None:
+    # deferred so that '--help' and argument errors don't pay for requests/boto3 imports
+    from protect_archiver import metrics
+    from protect_archiver import shutdown
+    from protect_archiver.client import ProtectClient
+    from protect_archiver.downloader import Downloader
+    from protect_archiver.errors import ProtectError
+    from protect_archiver.utils import print_download_stats
+
+    if sinks and sinks.get("events", "local") == "s3":
+        raise click.UsageError("--sink s3 is only available for the download command")
+
     client = ProtectClient(
         address=address,
         port=port,
@@ -223,8 +330,19 @@ def events(
         touch_files=touch_files,
         download_timeout=download_timeout,
         use_utc_filenames=use_utc_filenames,
+        sinks=sinks,
+        max_bandwidth=max_bandwidth,
+        min_throughput=min_throughput,
+        stall_window=stall_window,
     )
 
+    if metrics_port is not None:
+        from protect_archiver.metrics import start_metrics_server
+
+        start_metrics_server(metrics_port)
+
+    profiler = start_profiling(profile, dest, "events")
+    shutdown.install(shutdown_grace)
     try:
         # get camera list
         click.echo("Getting camera list")
@@ -232,37 +350,46 @@ def events(
 
         # get motion event list
         click.echo("Getting motion event list")
-        motion_event_list = client.get_motion_event_list(start, end, camera_list)
+        motion_events = client.get_event_batch(start, end, camera_list)
 
         if cameras != "all":
             camera_s = set(cameras.split(","))
             # keep only selected cameras in list
             camera_list = [camera for camera in camera_list if camera["id"] in camera_s]
             # keep only events for selected cameras
-            motion_event_list = [event for event in motion_event_list if event.camera_id in cameras]
+            motion_events = motion_events.filter_cameras(camera_s)
 
         click.echo(
             f"Downloading motion event video files between {start} and {end}"
             f" from '{client.session.authority}{client.session.base_path}/video/export'"
         )
 
-        for motion_event in motion_event_list:
-            # client.download_event(MotionEvent, Camera, bool)
-            if not ([camera for camera in camera_list if camera["id"] == motion_event.camera_id]):
+        cameras_by_id = {camera.id: camera for camera in camera_list}
+
+        # events are materialized one at a time while iterating the (columnar) batch
+        for index, motion_event in enumerate(motion_events.sorted_by_start()):
+            metrics.QUEUE_DEPTH.set(len(motion_events) - index, queue="events")
+            camera = cameras_by_id.get(motion_event.camera_id)
+            if camera is None:
                 click.echo(
                     f"Unable to download event {motion_event.id[-4:]} at {motion_event.start}:"
                     " camera is not available"
                 )
                 continue
 
-            Downloader.download_motion_event(
-                client,
-                motion_event,
-                [camera for camera in camera_list if camera["id"] == motion_event.camera_id][0],
-                download_motion_heatmaps,
-            )
+            Downloader.download_motion_event(client, motion_event, camera, download_motion_heatmaps)
 
+        metrics.QUEUE_DEPTH.set(0, queue="events")
         print_download_stats(client)
 
     except ProtectError as e:
         exit(e.code)
+    except shutdown.ShutdownRequested as e:
+        shutdown.disarm()
+        click.echo(f"Shutting down: {e}")
+        print_download_stats(client)
+        exit(shutdown.EXIT_CODE)
+    finally:
+        shutdown.uninstall()
+        client.close_sinks()
+        stop_profiling(profiler)
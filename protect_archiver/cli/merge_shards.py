@@ -0,0 +1,42 @@
+from typing import Optional
+
+import click
+
+from protect_archiver.cli.base import cli
+
+
+@cli.command(
+    "merge-shards",
+    help=(
+        "Combine the per-shard sync state files and status CSVs written by"
+        " 'sync --shard' / 'download --shard' runs into the regular unsharded files"
+    ),
+)
+@click.argument("dest", type=click.Path(exists=True, writable=True, resolve_path=True))
+@click.option(
+    "--statefile",
+    default="sync.state",
+    show_default=True,
+    help="Sync state file in DEST that the shard state files are merged into",
+    envvar="PROTECT_SYNC_STATEFILE",
+    show_envvar=True,
+)
+@click.option(
+    "--status-csv-dir",
+    default=None,
+    required=False,
+    type=click.Path(exists=True, file_okay=False, resolve_path=True),
+    help="Directory with per-shard status CSV files (YYYY_MM_DD.shard-<i>-of-<N>.csv)",
+    envvar="PROTECT_STATUS_CSV_DIR",
+    show_envvar=True,
+)
+def merge_shards(dest: str, statefile: str, status_csv_dir: Optional[str]) -> None:
+    from protect_archiver.status import merge_shard_csvs
+    from protect_archiver.sync import merge_shard_states
+
+    merged_states = merge_shard_states(dest, statefile)
+    click.echo(f"Merged {merged_states} shard state file(s) into {statefile}")
+
+    if status_csv_dir:
+        merged_csvs = merge_shard_csvs(status_csv_dir)
+        click.echo(f"Merged {merged_csvs} shard status CSV file(s) in {status_csv_dir}")
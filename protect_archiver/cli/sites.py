@@ -0,0 +1,134 @@
+import os
+
+from datetime import datetime
+from typing import Optional
+
+import click
+
+from protect_archiver.cli.base import cli
+from protect_archiver.config import Config
+from protect_archiver.profiling import PROFILE_MODES
+from protect_archiver.profiling import start_profiling
+from protect_archiver.profiling import stop_profiling
+
+
+@cli.command(
+    "sites",
+    help=(
+        "Archive footage of several UniFi Protect systems from one process. CONFIG is a JSON"
+        " file listing the controllers with their credentials, cameras, destination prefix"
+        " and number of parallel downloads, plus the shared destination, bandwidth budget,"
+        " S3 bucket and status CSV directory (see protect_archiver/sites.py). Without --start"
+        " and --end every site is synced from the sync.state file in its destination."
+    ),
+)
+@click.argument("config_file", type=click.Path(exists=True, dir_okay=False, resolve_path=True))
+@click.option(
+    "--start",
+    type=click.DateTime(
+        formats=[
+            "%Y-%m-%d",
+            "%Y-%m-%dT%H:%M:%S",
+            "%Y-%m-%d %H:%M:%S",
+            "%Y-%m-%d %H:%M:%S%z",
+        ]
+    ),
+    required=False,
+    help="Download range start time",
+    envvar="PROTECT_START_TIME",
+    show_envvar=True,
+)
+@click.option(
+    "--end",
+    type=click.DateTime(
+        formats=[
+            "%Y-%m-%d",
+            "%Y-%m-%dT%H:%M:%S",
+            "%Y-%m-%d %H:%M:%S",
+            "%Y-%m-%d %H:%M:%S%z",
+        ]
+    ),
+    required=False,
+    help="Download range end time",
+    envvar="PROTECT_END_TIME",
+    show_envvar=True,
+)
+@click.option(
+    "--ignore-failed-downloads",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help="Ignore failed downloads and continue with next download",
+    envvar="PROTECT_IGNORE_FAILED_DOWNLOADS",
+    show_envvar=True,
+)
+@click.option(
+    "--skip-existing-files",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help="Skip downloading files which already exist on disk",
+    envvar="PROTECT_SKIP_EXISTING",
+    show_envvar=True,
+)
+@click.option(
+    "--metrics-port",
+    type=int,
+    default=Config.METRICS_PORT,
+    required=False,
+    help="Serve Prometheus metrics at http://<host>:<port>/metrics while the command runs",
+    envvar="PROTECT_METRICS_PORT",
+    show_envvar=True,
+)
+@click.option(
+    "--profile",
+    type=click.Choice(PROFILE_MODES),
+    default=Config.PROFILE,
+    required=False,
+    help=(
+        "Profile the command and write a report with timing spans (auth, camera list, events"
+        " fetch, export request, disk write, resize, upload) into the destination directory:"
+        " a pstats file for 'cprofile', the top allocation sites for 'tracemalloc'"
+    ),
+    envvar="PROTECT_PROFILE",
+    show_envvar=True,
+)
+def sites(
+    config_file: str,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    ignore_failed_downloads: bool,
+    skip_existing_files: bool,
+    metrics_port: Optional[int],
+    profile: Optional[str],
+) -> None:
+    # deferred so that '--help' and argument errors don't pay for requests/boto3 imports
+    from protect_archiver.sites import archive_sites
+    from protect_archiver.sites import load_sites_config
+
+    if bool(start) != bool(end):
+        raise click.UsageError("--start and --end must be used together")
+
+    try:
+        config, site_list = load_sites_config(config_file)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="CONFIG_FILE")
+
+    if metrics_port is not None:
+        from protect_archiver.metrics import start_metrics_server
+
+        start_metrics_server(metrics_port)
+
+    os.makedirs(config["destination"], exist_ok=True)
+    profiler = start_profiling(profile, config["destination"], "sites")
+    try:
+        click.echo(f"Archiving {len(site_list)} site(s) to {config['destination']}")
+        failed = archive_sites(
+            config, site_list, start, end, ignore_failed_downloads, skip_existing_files
+        )
+    finally:
+        stop_profiling(profiler)
+
+    if failed:
+        click.echo(f"Archiving failed for site(s): {', '.join(failed)}")
+        exit(1)
@@ -1,12 +1,21 @@
 from os import path
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
 
 import click
 
 from protect_archiver.cli.base import cli
-from protect_archiver.client import ProtectClient
+from protect_archiver.cli.base import validate_bandwidth
+from protect_archiver.cli.base import validate_copy_to
+from protect_archiver.cli.base import validate_shard
+from protect_archiver.cli.base import validate_sinks
 from protect_archiver.config import Config
-from protect_archiver.sync import ProtectSync
-from protect_archiver.utils import print_download_stats
+from protect_archiver.profiling import PROFILE_MODES
+from protect_archiver.profiling import start_profiling
+from protect_archiver.profiling import stop_profiling
 
 
 @cli.command("sync", help="Synchronize your UniFi Protect footage to a local destination")
@@ -93,6 +102,19 @@ from protect_archiver.utils import print_download_stats
     envvar="PROTECT_USE_UTC",
     show_envvar=True,
 )
+@click.option(
+    "--skip-unrecorded-intervals",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help=(
+        "Plan downloads from the camera's recording timeline: start at the camera's first "
+        "recording and, for cameras that only record on detections, skip 1-hour segments "
+        "without any detection event instead of requesting them from the controller"
+    ),
+    envvar="PROTECT_SKIP_UNRECORDED_INTERVALS",
+    show_envvar=True,
+)
 @click.option(
     "--statefile",
     default="sync.state",
@@ -108,6 +130,150 @@ from protect_archiver.utils import print_download_stats
     envvar="PROTECT_SYNC_IGNORE_STATE",
     show_envvar=True,
 )
+@click.option(
+    "--schedule",
+    type=click.Choice(["camera", "expiry", "newest"]),
+    default=Config.SYNC_SCHEDULE,
+    show_default=True,
+    help=(
+        "Order of the downloads: 'camera' syncs one camera after the other, oldest hour first;"
+        " 'expiry' interleaves all cameras, starting with the hours closest to the NVR's"
+        " retention limit (the least time after the camera's first recording); 'newest'"
+        " starts with the most recent hours of all cameras, e.g. for incident response."
+        " Hours the NVR deleted before they were synced are skipped and reported."
+    ),
+    envvar="PROTECT_SYNC_SCHEDULE",
+    show_envvar=True,
+)
+@click.option(
+    "--copy-to",
+    "copy_to",
+    multiple=True,
+    callback=validate_copy_to,
+    help=(
+        "Also stream every downloaded file to this S3 bucket and prefix"
+        " ('s3://bucket/prefix', can be given multiple times) while it is written to the"
+        " destination, so each export is read from the controller once however many copies"
+        " are kept. AWS credentials and region are taken from the environment"
+    ),
+    envvar="PROTECT_COPY_TO",
+    show_envvar=True,
+)
+@click.option(
+    "--sink",
+    "sinks",
+    multiple=True,
+    callback=validate_sinks,
+    help=(
+        "Where the footage is written: local (default), tar (one '<YYYY-MM-DD>.tar' per day"
+        " in the destination) or null (discarded, to measure network throughput; the sync"
+        " state is not updated)"
+    ),
+    envvar="PROTECT_SINK",
+    show_envvar=True,
+)
+@click.option(
+    "--daily-concat",
+    is_flag=True,
+    default=Config.DAILY_CONCAT,
+    show_default=True,
+    help=(
+        "Once the last hour of a camera-day is downloaded, stream-copy the day's chunks into"
+        " one fragmented '<camera> - <day>.daily.mp4' with ffmpeg (no re-encoding) in the"
+        " background, with the chunks' offsets in '<camera> - <day>.daily.json'. The hourly"
+        " chunks are kept. Requires ffmpeg and ffprobe, not available with --shard."
+    ),
+    envvar="PROTECT_DAILY_CONCAT",
+    show_envvar=True,
+)
+@click.option(
+    "--shard",
+    default=None,
+    required=False,
+    callback=validate_shard,
+    help=(
+        "Only process this node's share 'i/N' (1 <= i <= N) of the camera x interval units,"
+        " assigned by a hash of camera ID and interval start, so N nodes running the same"
+        " command split the work without overlap. All nodes must use the same time zone and"
+        " interval options. The sync state is kept in a per-shard state file (e.g."
+        " sync.shard-1-of-4.state), combine them with 'merge-shards'."
+    ),
+    envvar="PROTECT_SHARD",
+    show_envvar=True,
+)
+@click.option(
+    "--shutdown-grace",
+    type=float,
+    default=Config.SHUTDOWN_GRACE,
+    show_default=True,
+    help=(
+        "On SIGTERM, start no new downloads and give the one in flight this many seconds to"
+        " finish before it is aborted (a second SIGTERM aborts it right away). The sync state"
+        " keeps the last finished interval, so the next run resumes from there, and the"
+        " command exits with code 8"
+    ),
+    envvar="PROTECT_SHUTDOWN_GRACE",
+    show_envvar=True,
+)
+@click.option(
+    "--max-bandwidth",
+    default=None,
+    required=False,
+    callback=validate_bandwidth,
+    help=(
+        "Cap the combined download and S3 upload bandwidth, in MB/s. Either a single cap"
+        " ('20') or comma-separated time-of-day windows with an optional cap for the rest of"
+        " the day ('08:00-18:00=5,50'); outside all windows without such a cap, bandwidth is"
+        " unlimited"
+    ),
+    envvar="PROTECT_MAX_BANDWIDTH",
+    show_envvar=True,
+)
+@click.option(
+    "--min-throughput",
+    type=float,
+    default=Config.MIN_THROUGHPUT,
+    required=False,
+    help=(
+        "Abort and retry a download whose throughput stays below this many MB/s for"
+        " --stall-window seconds, or that takes longer than --stall-window plus the time its"
+        " size needs at this throughput. Cameras that keep stalling are downloaded last"
+        " (scores are kept in stalls.json in the destination directory)."
+    ),
+    envvar="PROTECT_MIN_THROUGHPUT",
+    show_envvar=True,
+)
+@click.option(
+    "--stall-window",
+    type=float,
+    default=Config.STALL_WINDOW,
+    show_default=True,
+    help="Window in seconds over which --min-throughput is measured",
+    envvar="PROTECT_STALL_WINDOW",
+    show_envvar=True,
+)
+@click.option(
+    "--metrics-port",
+    type=int,
+    default=Config.METRICS_PORT,
+    required=False,
+    help="Serve Prometheus metrics at http://<host>:<port>/metrics while the command runs",
+    envvar="PROTECT_METRICS_PORT",
+    show_envvar=True,
+)
+@click.option(
+    "--profile",
+    type=click.Choice(PROFILE_MODES),
+    default=Config.PROFILE,
+    required=False,
+    help=(
+        "Profile the command and write a report with timing spans (auth, camera list, events"
+        " fetch, export request, disk write, resize, upload) into the destination directory:"
+        " a pstats file for 'cprofile', the top allocation sites for 'tracemalloc'"
+    ),
+    envvar="PROTECT_PROFILE",
+    show_envvar=True,
+)
 def sync(
     dest: str,
     address: str,
@@ -121,13 +287,50 @@ def sync(
     ignore_failed_downloads: bool,
     cameras: str,
     use_utc_filenames: bool,
+    skip_unrecorded_intervals: bool,
+    schedule: str,
+    sinks: Optional[Dict[str, str]],
+    copy_to: Optional[List[str]],
+    daily_concat: bool,
+    shard: Optional[Tuple[int, int]],
+    shutdown_grace: float,
+    max_bandwidth: Any,
+    min_throughput: Optional[float],
+    stall_window: float,
+    metrics_port: Optional[int],
+    profile: Optional[str],
 ) -> None:
+    # deferred so that '--help' and argument errors don't pay for requests/boto3 imports
+    from protect_archiver import shutdown
+    from protect_archiver.client import ProtectClient
+    from protect_archiver.sync import ProtectSync
+    from protect_archiver.sync import shard_statefile
+    from protect_archiver.utils import print_download_stats
+
     # normalize path to destination directory and check if it exists
     dest = path.abspath(dest)
     if not path.isdir(dest):
         click.echo(f"Video file destination directory '{dest} is invalid or does not exist!")
         exit(1)
 
+    if sinks and sinks.get("footage", "local") == "s3":
+        raise click.UsageError("--sink s3 is only available for the download command")
+
+    if daily_concat:
+        if sinks and sinks.get("footage", "local") != "local":
+            raise click.UsageError("--daily-concat requires the local sink")
+        if shard:
+            raise click.UsageError(
+                "--daily-concat cannot be combined with --shard: each shard only has its own"
+                " hours of a day"
+            )
+        from protect_archiver.concat import ffmpeg_available
+
+        if not ffmpeg_available():
+            raise click.UsageError(
+                f"--daily-concat requires {Config.FFMPEG} and {Config.FFPROBE} on the PATH"
+            )
+
     client = ProtectClient(
         address=address,
         port=port,
@@ -139,17 +342,54 @@ def sync(
         ignore_failed_downloads=ignore_failed_downloads,
         use_subfolders=True,
         use_utc_filenames=use_utc_filenames,
+        skip_unrecorded_intervals=skip_unrecorded_intervals,
+        shard=shard,
+        daily_concat=daily_concat,
+        sinks=sinks,
+        copy_to=copy_to,
+        max_bandwidth=max_bandwidth,
+        min_throughput=min_throughput,
+        stall_window=stall_window,
     )
 
-    # get camera list
-    print("Getting camera list")
-    camera_list = client.get_camera_list()
+    if metrics_port is not None:
+        from protect_archiver.metrics import start_metrics_server
+
+        start_metrics_server(metrics_port)
+
+    profiler = start_profiling(profile, dest, "sync")
+    shutdown.install(shutdown_grace)
+    try:
+        # get camera list
+        print("Getting camera list")
+        camera_list = client.get_camera_list()
 
-    if cameras != "all":
-        camera_ids = set(cameras.split(","))
-        camera_list = [c for c in camera_list if c.id in camera_ids]
+        if cameras != "all":
+            camera_ids = set(cameras.split(","))
+            camera_list = [c for c in camera_list if c.id in camera_ids]
 
-    process = ProtectSync(client=client, destination_path=dest, statefile=statefile)
-    process.run(camera_list, ignore_state=ignore_state)
+        if shard:
+            statefile = shard_statefile(statefile, shard)
+        process = ProtectSync(client=client, destination_path=dest, statefile=statefile)
+        process.run(camera_list, ignore_state=ignore_state, schedule=schedule)
 
-    print_download_stats(client)
+        print_download_stats(client)
+        if client.daily_concat is not None:
+            client.daily_concat.close()
+        if process.expired:
+            print(
+                f"{sum(process.expired.values())} interval(s) expired on the NVR before they"
+                " could be archived"
+            )
+    except shutdown.ShutdownRequested as e:
+        # the state was written after the last finished interval
+        shutdown.disarm()
+        print(f"Shutting down: {e}")
+        if client.daily_concat is not None:
+            client.daily_concat.cancel()
+        print_download_stats(client)
+        exit(shutdown.EXIT_CODE)
+    finally:
+        shutdown.uninstall()
+        client.close_sinks()
+        stop_profiling(profiler)
@@ -0,0 +1,61 @@
+from typing import Optional
+
+import click
+
+from protect_archiver.cli.base import cli
+from protect_archiver.config import Config
+
+
+@cli.command(
+    "verify",
+    help=(
+        "Check an archive written by 'download' or 'sync' for zero-byte, truncated or"
+        " malformed footage files, files that do not match (or are missing from) their"
+        " manifest and hours missing between each camera's first and last file"
+    ),
+)
+@click.argument("dest", type=click.Path(exists=True, file_okay=False, resolve_path=True))
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=Config.VERIFY_WORKERS,
+    required=False,
+    help="Number of processes checking directories in parallel (default: one per CPU)",
+    envvar="PROTECT_VERIFY_WORKERS",
+    show_envvar=True,
+)
+@click.option(
+    "--checksums",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help=(
+        "Also compare the SHA-256 of every file with its manifest (reads all footage instead"
+        " of only the mp4 box headers)"
+    ),
+    envvar="PROTECT_VERIFY_CHECKSUMS",
+    show_envvar=True,
+)
+def verify(dest: str, workers: Optional[int], checksums: bool) -> None:
+    from protect_archiver.utils import format_bytes
+    from protect_archiver.verify import NOTICE_KINDS
+    from protect_archiver.verify import verify_archive
+
+    report = verify_archive(dest, workers, checksums)
+
+    for problem in report.problems:
+        click.echo(
+            f"{problem.kind}: {problem.path}{f' ({problem.detail})' if problem.detail else ''}"
+        )
+
+    counts: dict = {}
+    for problem in report.problems:
+        counts[problem.kind] = counts.get(problem.kind, 0) + 1
+    click.echo(
+        f"Verified {report.files} files ({format_bytes(report.bytes)}) of"
+        f" {len(report.hours)} camera-day(s): "
+        + (", ".join(f"{count} {kind}" for kind, count in sorted(counts.items())) or "no problems")
+    )
+
+    if any(problem.kind not in NOTICE_KINDS for problem in report.problems):
+        exit(1)
@@ -1,13 +1,21 @@
+import threading
+
 from datetime import datetime
 from os import path
 from typing import Any
+from typing import Dict
 from typing import List
 from typing import Optional
+from typing import Tuple
 
+from protect_archiver.bandwidth import BandwidthSchedule
+from protect_archiver.bandwidth import TokenBucket
 from protect_archiver.client.legacy import LegacyClient
 from protect_archiver.client.unifi_os import UniFiOSClient
 from protect_archiver.config import Config
 from protect_archiver.downloader import Downloader
+from protect_archiver.profiling import span
+from protect_archiver.utils import shard_suffix
 
 
 class ProtectClient:
@@ -30,14 +38,32 @@ class ProtectClient:
         # aka read_timeout - time to wait until a socket read response happens
         download_timeout: float = Config.DOWNLOAD_TIMEOUT,
         use_utc_filenames: bool = Config.USE_UTC_FILENAMES,
+        skip_unrecorded_intervals: bool = Config.SKIP_UNRECORDED_INTERVALS,
+        # this node's (i, N) share of the camera x interval units ('--shard i/N')
+        shard: Optional[Tuple[int, int]] = Config.SHARD,
+        max_bandwidth: Optional[BandwidthSchedule] = Config.MAX_BANDWIDTH,
+        # stall watchdog: minimum throughput in MB/s over stall_window seconds
+        min_throughput: Optional[float] = Config.MIN_THROUGHPUT,
+        stall_window: float = Config.STALL_WINDOW,
         # S3 upload settings
         s3_bucket: Optional[str] = Config.S3_BUCKET,
         s3_prefix: str = Config.S3_PREFIX,
         s3_region: str = Config.S3_REGION,
         s3_aws_access_key_id: Optional[str] = Config.S3_AWS_ACCESS_KEY_ID,
         s3_aws_secret_access_key: Optional[str] = Config.S3_AWS_SECRET_ACCESS_KEY,
+        # an existing boto3 client to upload with, e.g. one shared by several ProtectClients
+        s3_client: Any = None,
+        # GB of uploaded files to keep locally, see LocalCache
+        local_cache_size: Optional[float] = Config.LOCAL_CACHE_SIZE,
         # status CSV settings
         status_csv_dir: Optional[str] = Config.STATUS_CSV_DIR,
+        status_summary: bool = Config.STATUS_SUMMARY,
+        # concatenate the chunks of each finished camera-day ('--daily-concat')
+        daily_concat: bool = Config.DAILY_CONCAT,
+        # storage sink per download mode ('--sink'), see protect_archiver.sinks
+        sinks: Optional[Dict[str, str]] = Config.SINKS,
+        # S3 URLs every file is also streamed to ('--copy-to'), see sinks.TeeSink
+        copy_to: Optional[List[str]] = Config.COPY_TO,
     ) -> None:
         self.protocol = protocol
         self.address = address
@@ -55,8 +81,28 @@ class ProtectClient:
         self.touch_files = touch_files
         self.use_utc_filenames = use_utc_filenames
 
+        # timeline-aware planning: per-range recording coverage fetched from the controller
+        self.skip_unrecorded_intervals = skip_unrecorded_intervals
+        self.recording_coverage_cache: Dict[Any, Any] = {}
+
+        self.shard = shard
+
         self.destination_path = path.abspath(destination_path)
 
+        # '--max-bandwidth', may be shared with other clients of the process
+        self.bandwidth_limiter = TokenBucket(schedule=max_bandwidth)
+
+        # stall watchdog, in bytes per second
+        self.min_throughput = min_throughput * 2**20 if min_throughput else None
+        self.stall_window = stall_window
+        self.stall_tracker: Any = None
+        if self.min_throughput is not None:
+            from protect_archiver.watchdog import StallTracker
+
+            self.stall_tracker = StallTracker(path.join(self.destination_path, Config.STALL_FILE))
+
+        # download counters, updated with count() as downloads may run on several threads
+        self._counters_lock = threading.Lock()
         self.files_downloaded = 0
         self.bytes_downloaded = 0
         self.files_skipped = 0
@@ -69,16 +115,44 @@ class ProtectClient:
         self.s3_region = s3_region
         self._s3_aws_access_key_id = s3_aws_access_key_id
         self._s3_aws_secret_access_key = s3_aws_secret_access_key
-        self._s3_client: Any = None
+        self._s3_client: Any = s3_client
         self.files_uploaded = 0
         self.files_upload_failed = 0
+        # '--skip-existing-files' looks for uploaded files in the bucket
+        self.s3_objects: Any = None
+        if s3_bucket is not None and skip_existing_files:
+            from protect_archiver.s3_index import S3ObjectIndex
+
+            self.s3_objects = S3ObjectIndex()
+        self.local_cache: Any = None
+        if local_cache_size is not None:
+            from protect_archiver.local_cache import LocalCache
+
+            self.local_cache = LocalCache(self.destination_path, int(local_cache_size * 2**30))
+
+        self.copy_to = list(copy_to or [])
 
         # status CSV
         self.status_tracker: Any = None
         if status_csv_dir is not None:
             from protect_archiver.status import StatusTracker
 
-            self.status_tracker = StatusTracker(status_csv_dir)
+            self.status_tracker = StatusTracker(
+                status_csv_dir,
+                file_suffix=f".{shard_suffix(shard)}" if shard else "",
+                destinations=self.copy_to,
+                summary=status_summary,
+            )
+
+        self.daily_concat: Any = None
+        if daily_concat:
+            from protect_archiver.concat import DailyConcatenator
+
+            self.daily_concat = DailyConcatenator()
+
+        self.sink_kinds = dict(sinks or {})
+        self._sinks: Dict[str, Any] = {}
+        self._sinks_lock = threading.Lock()
 
         self._access_key = None
         self._api_token = None
@@ -97,7 +171,6 @@ class ProtectClient:
                 self.verify_ssl,
             )
         else:
-            self.port = 443
             assert self.password
             self.session = UniFiOSClient(
                 self.protocol,
@@ -109,13 +182,39 @@ class ProtectClient:
             )
 
     def get_camera_list(self) -> List[Any]:
-        return Downloader.get_camera_list(self.session)
+        with span("camera_list"):
+            return Downloader.get_camera_list(self.session)
 
     def get_motion_event_list(
         self, start: datetime, end: datetime, camera_list: List[Any]
     ) -> List[Any]:
         return Downloader.get_motion_event_list(self.session, start, end, camera_list)
 
+    def get_event_batch(self, start: datetime, end: datetime, camera_list: List[Any]) -> Any:
+        return Downloader.get_event_batch(self.session, start, end, camera_list)
+
+    def sink(self, mode: str) -> Any:
+        """Return the storage sink of a download mode, one instance per kind of sink."""
+        kind = self.sink_kinds.get(mode, "local")
+        with self._sinks_lock:
+            if kind not in self._sinks:
+                from protect_archiver.sinks import create_sink
+
+                self._sinks[kind] = create_sink(self, kind)
+            return self._sinks[kind]
+
+    def close_sinks(self) -> None:
+        with self._sinks_lock:
+            sinks, self._sinks = self._sinks, {}
+        for sink in sinks.values():
+            sink.close()
+
+    def count(self, **counters: int) -> None:
+        """Add to the download counters, e.g. count(files_skipped=1)."""
+        with self._counters_lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+
     def get_session(self) -> Any:
         return self.session
 
@@ -4,7 +4,9 @@ from typing import Optional
 
 import requests
 
+from protect_archiver import metrics
 from protect_archiver.errors import ProtectError
+from protect_archiver.profiling import span
 
 
 class LegacyClient:
@@ -66,7 +68,9 @@ class LegacyClient:
             self._api_token = None
 
         if self._api_token is None:
+            metrics.AUTH_REFRESHES.inc(reason="expired" if force else "login")
             # get new API auth bearer token and access key
-            self._api_token = self.fetch_api_token()
+            with span("auth"):
+                self._api_token = self.fetch_api_token()
 
         return self._api_token
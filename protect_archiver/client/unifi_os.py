@@ -4,7 +4,9 @@ from typing import Optional
 
 import requests
 
+from protect_archiver import metrics
 from protect_archiver.errors import ProtectError
+from protect_archiver.profiling import span
 
 
 class UniFiOSClient:
@@ -58,6 +60,8 @@ class UniFiOSClient:
             self._api_token = None
 
         if self._api_token is None:
-            self._api_token = self.fetch_session_cookie_token()
+            metrics.AUTH_REFRESHES.inc(reason="expired" if force else "login")
+            with span("auth"):
+                self._api_token = self.fetch_session_cookie_token()
 
         return self._api_token
@@ -0,0 +1,257 @@
+# daily concatenation of footage chunks ('--daily-concat')
+#
+# Once the last chunk of a camera-day has been handled (whatever its download status), or the
+# camera's download moved on to the next day, the day's chunks are stream-copied
+# (no re-encoding) into one fragmented mp4 with ffmpeg's concat demuxer:
+#
+#   Front Door - 2024-01-02.daily.mp4
+#   Front Door - 2024-01-02.daily.json  (sidecar index of the original chunks)
+#
+# The sidecar lists every chunk with its offset and duration in seconds inside the daily
+# file, so review tools can map a position back to the hourly chunk and the other way
+# around. Both files are written to a temporary name first and then renamed into place,
+# and the hourly chunks are kept.
+#
+# The concatenation runs in a background thread, so downloads continue while ffmpeg works.
+import atexit
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import threading
+
+from datetime import datetime
+from datetime import timedelta
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from protect_archiver import json_codec
+from protect_archiver.config import Config
+from protect_archiver.utils import FOOTAGE_FILENAME_PATTERN
+
+
+DAILY_SUFFIX = ".daily.mp4"
+INDEX_SUFFIX = ".daily.json"
+
+
+def ffmpeg_available() -> bool:
+    return bool(shutil.which(Config.FFMPEG)) and bool(shutil.which(Config.FFPROBE))
+
+
+# return whether an interval is the last of its day (it ends at midnight), in the time zone
+# of the file names
+def ends_day(interval_end: datetime) -> bool:
+    return (interval_end + timedelta(milliseconds=1)).time() == datetime.min.time()
+
+
+# "<camera> - <day> - <time>.mp4" -> "<camera> - <day>" in the same directory
+def day_prefix(filename: str) -> str:
+    return filename.rsplit(" - ", 1)[0]
+
+
+# return the footage chunks of the camera-day `prefix`, in chronological order
+def day_chunks(prefix: str) -> List[str]:
+    directory, base = os.path.split(prefix)
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.startswith(f"{base} - ") and FOOTAGE_FILENAME_PATTERN.match(name)
+        # zero-byte files are placeholders of '--touch-files' or failed downloads
+        and os.path.getsize(os.path.join(directory, name)) > 0
+    )
+
+
+def probe_duration(filename: str) -> float:
+    result = subprocess.run(
+        [
+            Config.FFPROBE,
+            "-v",
+            "error",
+            "-show_entries",
+            "format=duration",
+            "-of",
+            "default=noprint_wrappers=1:nokey=1",
+            filename,
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return float(result.stdout.strip())
+
+
+# concatenate the chunks of the camera-day `prefix`; returns the daily file, None if the day
+# has no chunks. `started` is called with the ffmpeg process once it runs.
+def concatenate_day(
+    prefix: str, started: Optional[Callable[["subprocess.Popen[str]"], None]] = None
+) -> Optional[str]:
+    chunks = day_chunks(prefix)
+    if not chunks:
+        return None
+
+    daily_filename = f"{prefix}{DAILY_SUFFIX}"
+    list_filename = f"{prefix}.concat.txt"
+    tmp_filename = f"{daily_filename}.tmp"
+    try:
+        index: Dict[str, Any] = {"file": os.path.basename(daily_filename), "chunks": []}
+        offset = 0.0
+        with open(list_filename, "w") as fp:
+            for chunk in chunks:
+                # single quotes are escaped as '\'' in the concat demuxer's list
+                escaped = os.path.basename(chunk).replace("'", "'\\''")
+                fp.write(f"file '{escaped}'\n")
+                duration = probe_duration(chunk)
+                index["chunks"].append(
+                    {
+                        "filename": os.path.basename(chunk),
+                        "offset": round(offset, 3),
+                        "duration": round(duration, 3),
+                    }
+                )
+                offset += duration
+
+        with subprocess.Popen(
+            [
+                Config.FFMPEG,
+                "-hide_banner",
+                "-loglevel",
+                "error",
+                "-y",
+                "-f",
+                "concat",
+                "-safe",
+                "0",
+                "-i",
+                list_filename,
+                "-c",
+                "copy",
+                "-movflags",
+                "+frag_keyframe+empty_moov+default_base_moof",
+                "-f",
+                "mp4",
+                tmp_filename,
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        ) as process:
+            if started is not None:
+                started(process)
+            _, stderr = process.communicate()
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, process.args, stderr=stderr)
+        os.replace(tmp_filename, daily_filename)
+
+        with open(f"{prefix}{INDEX_SUFFIX}.tmp", "wb") as index_fp:
+            json_codec.dump(index, index_fp, indent=True)
+        os.replace(f"{prefix}{INDEX_SUFFIX}.tmp", f"{prefix}{INDEX_SUFFIX}")
+    finally:
+        for filename in (list_filename, tmp_filename):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    return daily_filename
+
+
+class DailyConcatenator:
+    """Background worker concatenating the chunks of finished camera-days.
+
+    download_footage_interval() reports every chunk with chunk_done(); the day is queued
+    for concatenation when its last chunk was handled (downloaded or not), or when the next
+    chunk of the camera belongs to another day because the day's last intervals were not
+    planned ('--skip-unrecorded-intervals'). download_footage() reports the end of its range
+    with range_done(). close() waits for the queued days.
+    """
+
+    def __init__(self) -> None:
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # camera -> prefix of the day its last chunk belongs to, until the day is queued
+        self._open_days: Dict[str, str] = {}
+        self._process: Optional["subprocess.Popen[str]"] = None
+        self._cancelled = False
+        atexit.register(self.close)
+
+    def chunk_done(self, filename: str, interval_end: datetime) -> None:
+        prefix = day_prefix(filename)
+        camera = day_prefix(os.path.basename(prefix))
+        with self._lock:
+            previous = self._open_days.pop(camera, None)
+            if not ends_day(interval_end):
+                self._open_days[camera] = prefix
+        if previous is not None and previous != prefix:
+            self.submit(previous)
+        if ends_day(interval_end):
+            self.submit(prefix)
+
+    # the camera's intervals up to `end` (in the time zone of the file names) are done: its
+    # open day is complete if the range reaches the day's midnight
+    def range_done(self, camera: str, end: datetime) -> None:
+        with self._lock:
+            prefix = self._open_days.get(camera)
+            # "<camera> - YYYY-MM-DD"
+            if prefix is None or f"{end:%Y-%m-%d}" <= prefix.rsplit(" - ", 1)[1]:
+                return
+            del self._open_days[camera]
+        self.submit(prefix)
+
+    def submit(self, prefix: str) -> None:
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="daily-concat", daemon=True)
+                self._worker.start()
+        self._queue.put(prefix)
+
+    # drop the days waiting for concatenation and stop a running ffmpeg (on shutdown); the
+    # days are queued again when their chunks are handled in a later run
+    def cancel(self) -> None:
+        with self._lock:
+            self._cancelled = True
+            if self._process is not None:
+                self._process.terminate()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def close(self) -> None:
+        with self._lock:
+            worker, self._worker = self._worker, None
+        if worker is not None:
+            self._queue.put(None)
+            worker.join()
+
+    def _run(self) -> None:
+        while True:
+            prefix = self._queue.get()
+            if prefix is None:
+                return
+            try:
+                daily_filename = concatenate_day(prefix, self._started)
+                if daily_filename is not None:
+                    logging.info(f"Concatenated the day's footage into {daily_filename}")
+            except subprocess.CalledProcessError as e:
+                if self._cancelled:
+                    logging.info(f"Concatenation of {prefix} cancelled")
+                else:
+                    logging.error(
+                        f"Failed to concatenate {prefix}: {e}"
+                        f"{f' - {e.stderr.strip()}' if e.stderr else ''}"
+                    )
+            except (OSError, ValueError) as e:
+                logging.error(f"Failed to concatenate {prefix}: {e}")
+            finally:
+                with self._lock:
+                    self._process = None
+
+    def _started(self, process: "subprocess.Popen[str]") -> None:
+        with self._lock:
+            self._process = process
+            if self._cancelled:
+                process.terminate()
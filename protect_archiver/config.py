@@ -1,4 +1,8 @@
+from typing import Any
+from typing import Dict
+from typing import List
 from typing import Optional
+from typing import Tuple
 
 
 class Config:
@@ -25,6 +29,24 @@ class Config:
     )
     MAX_RETRIES: int = 3
     USE_UTC_FILENAMES: bool = False
+    SKIP_UNRECORDED_INTERVALS: bool = False
+    SHARD: Optional[Tuple[int, int]] = None  # (i, N) of '--shard i/N'
+    MAX_BANDWIDTH: Optional[Any] = None  # BandwidthSchedule of '--max-bandwidth', unlimited
+    SYNC_SCHEDULE: str = "camera"  # order of sync downloads: camera, expiry or newest
+    DOWNLOAD_CHUNK_SIZE: int = 2**16  # bytes read from a download response at a time
+    SHUTDOWN_GRACE: float = 30.0  # seconds the transfer in flight may take after SIGTERM
+
+    # stall watchdog ('--min-throughput'), disabled by default
+    MIN_THROUGHPUT: Optional[float] = None  # MB/s
+    STALL_WINDOW: float = 60.0  # seconds
+    STALL_FILE: str = "stalls.json"  # per-camera stall scores, in the destination directory
+    STALL_SCORE_DECAY: float = 0.8  # applied to a camera's score by every finished download
+    STALL_SCORE_THRESHOLD: float = 0.5  # cameras above this are downloaded last
+
+    DAILY_CONCAT: bool = False  # concatenate each finished camera-day with ffmpeg
+    FFMPEG: str = "ffmpeg"
+    FFPROBE: str = "ffprobe"
+    VERIFY_WORKERS: Optional[int] = None  # processes of 'verify', one per CPU by default
 
     # S3 upload settings
     S3_BUCKET: Optional[str] = None
@@ -32,6 +54,37 @@ class Config:
     S3_REGION: str = "us-east-1"
     S3_AWS_ACCESS_KEY_ID: Optional[str] = None
     S3_AWS_SECRET_ACCESS_KEY: Optional[str] = None
+    # keep up to this many GB of uploaded files locally ('--local-cache-size'), None to
+    # delete them right after the upload
+    LOCAL_CACHE_SIZE: Optional[float] = None
+    S3_INDEX_PREFIXES: int = 64  # camera-day listings cached by '--skip-existing-files'
+    LOCAL_CACHE_FILE: str = "local_cache.json"  # index of the cached files, in the destination
+
+    # storage sinks ('--sink'), mode -> local, s3, tar or null; unlisted modes write locally
+    SINKS: Optional[Dict[str, str]] = None
+    S3_PART_SIZE: int = 8 * 2**20  # part size of the s3 sink's multipart uploads (min. 5 MiB)
+    S3_UPLOAD_THREADS: int = 8  # parts of the s3 sinks uploaded at the same time
+    COPY_TO: Optional[List[str]] = None  # s3://bucket/prefix URLs of '--copy-to'
+    TAR_SPOOL_SIZE: int = 64 * 2**20  # tar sink files above this are buffered on disk
+
+    # download plan (--plan / --check-free-space) projection settings
+    PLAN_CONCURRENCY: int = 1
+    PLAN_THROUGHPUT: float = 10.0  # MB/s sustained export throughput of the controller
+    PLAN_REQUEST_OVERHEAD: float = 2.0  # seconds the controller needs to prepare an export
 
     # status CSV settings
     STATUS_CSV_DIR: Optional[str] = None
+    STATUS_SUMMARY: bool = False
+    STATUS_FLUSH_ROWS: int = 100  # flush the status CSV write buffer every N rows...
+    STATUS_FLUSH_INTERVAL: float = 5.0  # ...or after this many seconds
+    STATUS_QUEUE_SIZE: int = 10000  # rows waiting for the writer before producers block
+    STATUS_MAX_OPEN_FILES: int = 8  # day files kept open at the same time
+
+    # Prometheus metrics endpoint (--metrics-port), disabled by default
+    METRICS_PORT: Optional[int] = None
+
+    # multi-controller mode ('sites' command)
+    SITE_CONCURRENCY: int = 1  # parallel downloads per controller
+
+    # built-in profiler (--profile cprofile|tracemalloc), disabled by default
+    PROFILE: Optional[str] = None
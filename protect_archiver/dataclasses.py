@@ -1,8 +1,35 @@
 from dataclasses import dataclass
+from dataclasses import field
+from dataclasses import fields
 from datetime import datetime
 from typing import Any
+from typing import Dict
+from typing import Type
+from typing import TypeVar
 
 
+_T = TypeVar("_T")
+
+
+def slotted(cls: Type[_T]) -> Type[_T]:
+    """Rebuild a dataclass so that its instances use __slots__ instead of a __dict__.
+
+    Equivalent to dataclass(slots=True), which is only available from Python 3.10 on.
+    Must be applied on top of @dataclass; field defaults keep working because they are
+    baked into the generated __init__.
+    """
+    dataclass_cls: Any = cls
+    field_names = tuple(field.name for field in fields(dataclass_cls))
+    cls_dict = dict(dataclass_cls.__dict__)
+    cls_dict["__slots__"] = field_names
+    for name in field_names:
+        cls_dict.pop(name, None)
+    cls_dict.pop("__dict__", None)
+    cls_dict.pop("__weakref__", None)
+    return type(dataclass_cls)(dataclass_cls.__name__, dataclass_cls.__bases__, cls_dict)
+
+
+@slotted
 @dataclass
 class Camera:
     def __getitem__(self, key: str) -> Any:
@@ -11,8 +38,15 @@ class Camera:
     id: str
     name: str
     recording_start: datetime
+    # recordingSettings from the /cameras payload; mode is 'always', 'detections', ...
+    recording_mode: str = "always"
+    pre_padding_secs: int = 0
+    post_padding_secs: int = 0
+    # estimated size of exported footage, from the camera's storage stats or bitrate
+    bytes_per_second: float = 0.0
 
 
+@slotted
 @dataclass
 class MotionEvent:
     id: str
@@ -22,3 +56,27 @@ class MotionEvent:
     score: int
     thumbnail_id: str
     heatmap_id: str
+
+
+# timing breakdown of a single download_file() call, filled in when passed as `stats`
+@slotted
+@dataclass
+class DownloadStats:
+    bytes: int = 0
+    # seconds from sending the request until the response headers arrived
+    ttfb: float = 0.0
+    # seconds spent receiving and writing the body
+    transfer_seconds: float = 0.0
+    retries: int = 0
+    upload_seconds: float = 0.0
+    # hex digest of the downloaded body, and the checksum S3 has for it once uploaded
+    # (see manifest.FileDigest)
+    sha256: str = ""
+    s3_checksum: str = ""
+    # '--copy-to' destination -> uploaded/failed
+    copies: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def throughput(self) -> float:
+        """Transfer rate in bytes per second (0 if nothing was transferred)."""
+        return self.bytes / self.transfer_seconds if self.transfer_seconds > 0 else 0.0
@@ -1,6 +1,9 @@
 from datetime import datetime
 from typing import Any
+from typing import Dict
 from typing import List
+from typing import Optional
+from typing import Tuple
 
 from protect_archiver.config import Config
 from protect_archiver.downloader.download_detection_thumbnails import (
@@ -9,11 +12,16 @@ from protect_archiver.downloader.download_detection_thumbnails import (
 from protect_archiver.downloader.download_detections import download_detections
 from protect_archiver.downloader.download_file import download_file
 from protect_archiver.downloader.download_footage import download_footage
+from protect_archiver.downloader.download_footage import download_footage_interval
 from protect_archiver.downloader.download_motion_event import download_motion_event
 from protect_archiver.downloader.download_snapshot import download_snapshot
 from protect_archiver.downloader.get_camera_list import get_camera_list
 from protect_archiver.downloader.get_motion_event_list import get_detection_list
+from protect_archiver.downloader.get_motion_event_list import get_event_batch
 from protect_archiver.downloader.get_motion_event_list import get_motion_event_list
+from protect_archiver.downloader.plan_footage import estimate_download_plan
+from protect_archiver.downloader.plan_footage import plan_footage_intervals
+from protect_archiver.downloader.retry_failed import retry_failed
 from protect_archiver.downloader.upload_to_s3 import upload_to_s3
 
 
@@ -44,6 +52,12 @@ class Downloader:
     ) -> List[Any]:
         return get_motion_event_list(session, start, end, camera_list)
 
+    @staticmethod
+    def get_event_batch(
+        session: Any, start: datetime, end: datetime, camera_list: List[Any]
+    ) -> Any:
+        return get_event_batch(session, start, end, camera_list)
+
     @staticmethod
     def get_detection_list(
         session: Any, start: datetime, end: datetime, camera_list: List[Any]
@@ -67,8 +81,10 @@ class Downloader:
         download_detection_thumbnails(client, start, end, camera_list, max_height)
 
     @staticmethod
-    def download_file(client: Any, video_export_query: str, filename: str) -> Any:
-        return download_file(client, video_export_query, filename)
+    def download_file(
+        client: Any, video_export_query: str, filename: str, camera_name: str = ""
+    ) -> Any:
+        return download_file(client, video_export_query, filename, camera_name)
 
     @staticmethod
     def download_footage(
@@ -81,13 +97,63 @@ class Downloader:
     ) -> Any:
         return download_footage(client, start, end, camera, disable_alignment, disable_splitting)
 
+    @staticmethod
+    def download_footage_interval(
+        client: Any, camera: Any, interval_start: datetime, interval_end: datetime
+    ) -> Tuple[str, str]:
+        return download_footage_interval(client, camera, interval_start, interval_end)
+
+    @staticmethod
+    def plan_footage_intervals(
+        client: Any,
+        camera: Any,
+        start: datetime,
+        end: datetime,
+        disable_alignment: bool = Config.DISABLE_ALIGNMENT,
+        disable_splitting: bool = Config.DISABLE_SPLITTING,
+    ) -> List[Tuple[datetime, datetime]]:
+        return plan_footage_intervals(
+            client, camera, start, end, disable_alignment, disable_splitting
+        )
+
+    @staticmethod
+    def estimate_download_plan(
+        client: Any,
+        camera_list: List[Any],
+        start: datetime,
+        end: datetime,
+        disable_alignment: bool = Config.DISABLE_ALIGNMENT,
+        disable_splitting: bool = Config.DISABLE_SPLITTING,
+        concurrency: int = Config.PLAN_CONCURRENCY,
+        throughput: float = Config.PLAN_THROUGHPUT,
+    ) -> Dict[str, Any]:
+        return estimate_download_plan(
+            client,
+            camera_list,
+            start,
+            end,
+            disable_alignment,
+            disable_splitting,
+            concurrency,
+            throughput,
+        )
+
+    @staticmethod
+    def retry_failed(client: Any, csv_dir: str, camera_list: List[Any]) -> Tuple[int, int]:
+        return retry_failed(client, csv_dir, camera_list)
+
     @staticmethod
     def download_snapshot(client: Any, start: datetime, camera: Any) -> Any:
         return download_snapshot(client, start, camera)
 
     @staticmethod
-    def upload_to_s3(client: Any, filename: str) -> str:
-        return upload_to_s3(client, filename)
+    def upload_to_s3(
+        client: Any,
+        filename: str,
+        sha256: Optional[str] = None,
+        s3_checksum: Optional[str] = None,
+    ) -> str:
+        return upload_to_s3(client, filename, sha256, s3_checksum)
 
     @staticmethod
     def download_motion_event(
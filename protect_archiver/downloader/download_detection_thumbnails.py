@@ -8,10 +8,15 @@ from typing import Any
 from typing import Dict
 from typing import List
 
+from protect_archiver import shutdown
 from protect_archiver.dataclasses import Camera
+from protect_archiver.dataclasses import DownloadStats
 from protect_archiver.downloader.download_file import download_file
-from protect_archiver.downloader.get_motion_event_list import get_detection_list
+from protect_archiver.downloader.get_motion_event_list import get_event_batch
+from protect_archiver.downloader.upload_to_s3 import remove_uploaded_file
 from protect_archiver.downloader.upload_to_s3 import upload_to_s3
+from protect_archiver.profiling import span
+from protect_archiver.sinks import LocalSink
 from protect_archiver.utils import build_download_dir
 from protect_archiver.utils import calculate_day_intervals
 from protect_archiver.utils import make_camera_name_fs_safe
@@ -49,20 +54,23 @@ def download_detection_thumbnails(
 
         # fetch all detections for this day - resilient to per-day failures
         try:
-            detections = get_detection_list(client.session, query_start, query_end, camera_list)
+            detections = get_event_batch(client.session, query_start, query_end, camera_list)
         except Exception as e:
             logging.exception(f"Failed to fetch detections for {day_str}: {e}")
-            client.files_failed += 1
+            client.count(files_failed=1)
             continue
 
-        for detection in detections:
-            camera_id = detection.get("camera")
+        # keep only the selected cameras, in chronological order
+        detections = detections.filter_cameras(cameras_by_id).sorted_by_start()
+
+        for i, detection in enumerate(detections.records):
             thumbnail_id = detection.get("thumbnail")
-            # skip detections for unselected cameras or without a thumbnail asset
-            if camera_id not in cameras_by_id or not thumbnail_id:
+            # skip detections without a thumbnail asset
+            if not thumbnail_id:
                 continue
 
-            camera = cameras_by_id[camera_id]
+            camera = cameras_by_id[detections.camera_id(i)]
+            shutdown.check()
             try:
                 _download_thumbnail(client, camera, detection, thumbnail_id, max_height)
             except Exception as e:
@@ -70,7 +78,7 @@ def download_detection_thumbnails(
                     f"Failed to download thumbnail for detection"
                     f" {detection.get('id', thumbnail_id)}: {e}"
                 )
-                client.files_failed += 1
+                client.count(files_failed=1)
                 continue
 
         # flush status records for this day as we go (memory-friendly over long ranges)
@@ -106,18 +114,34 @@ def _download_thumbnail(
 
     # keep thumbnails in their own subfolder so the camera/date directory isn't flooded
     download_dir = os.path.join(base_dir, "thumbnails")
-    os.makedirs(download_dir, exist_ok=True)
 
     filename_timestamp = interval_start_tz.strftime("%Y-%m-%d - %H.%M.%S%z")
     event_id = detection.get("id", thumbnail_id)
-    filename = f"{download_dir}/{camera_name_fs_safe} - {filename_timestamp} - {event_id} - thumbnail.jpg"
+    filename = (
+        f"{download_dir}/{camera_name_fs_safe} - {filename_timestamp} - {event_id} - thumbnail.jpg"
+    )
 
     # throttle requests against the controller if --wait-between-downloads is set
     if client.download_wait:
         time.sleep(int(client.download_wait))
 
+    # thumbnails are resized locally before they are moved to any other sink (or copied to
+    # the '--copy-to' destinations)
+    sink = client.sink("thumbnails")
+    staged = not isinstance(sink, LocalSink)
+    if bool(client.skip_existing_files) and staged and sink.exists(filename):
+        logging.info(
+            f"File {filename} already exists ({sink.name} sink) and argument"
+            " '--skip-existing-files' is present - skipping download"
+        )
+        client.count(files_skipped=1)
+        return
+
     thumbnail_query = f"/thumbnails/{thumbnail_id}"
-    download_status = download_file(client, thumbnail_query, filename)
+    stats = DownloadStats()
+    download_status = download_file(
+        client, thumbnail_query, filename, camera.name, stats, LocalSink() if staged else sink
+    )
 
     # download_file already counts/handles failed, empty and skipped downloads
     if download_status not in ("downloaded", "already_exists"):
@@ -126,15 +150,18 @@ def _download_thumbnail(
     # scale down to max_height while preserving aspect ratio (never upscaling)
     if os.path.exists(filename) and os.path.getsize(filename) > 0:
         _resize_to_max_height(filename, max_height)
+    if staged:
+        stats.copies = sink.put(filename)
 
     # upload to S3 if configured (mirrors download_footage behavior)
     upload_status = "n/a"
-    if client.s3_bucket is not None:
+    if client.s3_bucket is not None and sink.local:
         if os.path.exists(filename) and os.path.getsize(filename) > 0:
+            upload_start = time.monotonic()
             upload_status = upload_to_s3(client, filename)
+            stats.upload_seconds = time.monotonic() - upload_start
             if upload_status == "uploaded":
-                os.remove(filename)
-                logging.info(f"Deleted local file {filename} after successful S3 upload")
+                remove_uploaded_file(client, filename)
         else:
             upload_status = "skipped"
 
@@ -147,6 +174,7 @@ def _download_thumbnail(
             filename=os.path.basename(filename),
             download_status=download_status,
             upload_status=upload_status,
+            stats=stats,
         )
 
 
@@ -156,7 +184,7 @@ def _resize_to_max_height(filename: str, max_height: int) -> None:
     try:
         from PIL import Image
 
-        with Image.open(filename) as img:
+        with span("resize"), Image.open(filename) as img:
             if img.height <= max_height:
                 return
             # Image.thumbnail preserves aspect ratio and never enlarges; bounding the
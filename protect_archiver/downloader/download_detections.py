@@ -1,4 +1,4 @@
-import json
+import bisect
 import logging
 import os
 import time
@@ -8,11 +8,17 @@ from typing import Any
 from typing import Dict
 from typing import List
 
+from protect_archiver import json_codec
+from protect_archiver import shutdown
 from protect_archiver.dataclasses import Camera
-from protect_archiver.downloader.get_motion_event_list import get_detection_list
+from protect_archiver.dataclasses import DownloadStats
+from protect_archiver.downloader.download_footage import footage_filename
+from protect_archiver.downloader.get_motion_event_list import get_event_batch
+from protect_archiver.downloader.upload_to_s3 import remove_uploaded_file
 from protect_archiver.downloader.upload_to_s3 import upload_to_s3
 from protect_archiver.utils import build_download_dir
 from protect_archiver.utils import calculate_day_intervals
+from protect_archiver.utils import calculate_intervals
 from protect_archiver.utils import make_camera_name_fs_safe
 
 
@@ -23,6 +29,10 @@ from protect_archiver.utils import make_camera_name_fs_safe
 # 'YYYY/MM/DD/<camera_name>/' structure used for footage, so a downstream process can
 # join detections to the already-downloaded video chunks by camera + timestamp range.
 #
+# Next to every detections file, a '<camera> - <day> - detection-index.json' maps each
+# detection ID to the footage chunk its start falls into and the offset in seconds inside
+# that chunk (see build_detection_index), so a player can seek straight to the event.
+#
 # The /events API is queried one calendar day at a time so that very large ranges do
 # not ride on a single huge request, and every day-fetch and per-camera write is
 # wrapped so that a single failure is logged and counted but never aborts the run.
@@ -39,6 +49,7 @@ def download_detections(
         start, end, client.use_utc_filenames
     ):
         day_str = day_anchor.strftime("%Y-%m-%d")
+        shutdown.check()
 
         # be gentle on the controller between day requests (if configured)
         if client.download_wait:
@@ -46,31 +57,33 @@ def download_detections(
 
         # fetch all detections for this day - resilient to per-day failures
         try:
-            detections = get_detection_list(client.session, query_start, query_end, camera_list)
+            detections = get_event_batch(client.session, query_start, query_end, camera_list)
         except Exception as e:
             logging.exception(f"Failed to fetch detections for {day_str}: {e}")
-            client.files_failed += 1
+            client.count(files_failed=1)
             continue
 
         # group detections by camera, keeping only the selected cameras
-        detections_by_camera: Dict[str, List[Dict[str, Any]]] = {}
-        for detection in detections:
-            camera_id = detection.get("camera")
-            if camera_id in cameras_by_id:
-                detections_by_camera.setdefault(camera_id, []).append(detection)
+        detections_by_camera = detections.filter_cameras(cameras_by_id).group_by_camera()
 
         # write one JSON file per camera per day - resilient to per-file failures
         for camera_id, camera_detections in detections_by_camera.items():
             camera = cameras_by_id[camera_id]
             try:
                 _save_detections(
-                    client, camera, day_anchor, day_str, query_start, query_end, camera_detections
+                    client,
+                    camera,
+                    day_anchor,
+                    day_str,
+                    query_start,
+                    query_end,
+                    camera_detections.records,
                 )
             except Exception as e:
                 logging.exception(
                     f"Failed to save detections for camera '{camera.name}' on {day_str}: {e}"
                 )
-                client.files_failed += 1
+                client.count(files_failed=1)
                 continue
 
         # flush status records for this day as we go (memory-friendly over long ranges)
@@ -98,22 +111,33 @@ def _save_detections(
     )
 
     filename = f"{download_dir}/{camera_name_fs_safe} - {day_str} - detections.json"
+    index_filename = f"{download_dir}/{camera_name_fs_safe} - {day_str} - detection-index.json"
 
-    # skip writing files that already exist on disk if --skip-existing-files is present
-    if bool(client.skip_existing_files) and os.path.exists(filename):
+    # skip writing files that already exist in the sink if --skip-existing-files is present
+    sink = client.sink("detections")
+    if bool(client.skip_existing_files) and sink.exists(filename):
         logging.info(
-            f"File {filename} already exists on disk and argument '--skip-existing-files' "
-            "is present - skipping \n"
+            f"File {filename} already exists ({sink.name} sink) and argument"
+            " '--skip-existing-files' is present - skipping \n"
         )
-        client.files_skipped += 1
+        client.count(files_skipped=1)
         return
 
-    with open(filename, "w") as fp:
-        json.dump(detections, fp, indent=2, default=str)
+    write_start = time.monotonic()
+    with sink.open(filename) as fp:
+        json_codec.dump_array(detections, fp, indent=True, default=str)
+    file_size, copies = fp.bytes, fp.copies
+    with sink.open(index_filename) as fp:
+        json_codec.dump(
+            build_detection_index(client, camera, query_start, query_end, detections),
+            fp,
+            indent=True,
+        )
 
-    file_size = os.path.getsize(filename)
-    client.files_downloaded += 1
-    client.bytes_downloaded += file_size
+    stats = DownloadStats(
+        bytes=file_size, transfer_seconds=time.monotonic() - write_start, copies=copies
+    )
+    client.count(files_downloaded=1, bytes_downloaded=file_size)
     logging.info(
         f"Saved {len(detections)} detection(s) for camera '{camera.name}' ({camera.id}) to"
         f" {filename}"
@@ -121,12 +145,15 @@ def _save_detections(
 
     # upload to S3 if configured (mirrors download_footage behavior)
     upload_status = "n/a"
-    if client.s3_bucket is not None:
+    if client.s3_bucket is not None and sink.local:
         if file_size > 0:
+            upload_start = time.monotonic()
             upload_status = upload_to_s3(client, filename)
+            stats.upload_seconds = time.monotonic() - upload_start
             if upload_status == "uploaded":
-                os.remove(filename)
-                logging.info(f"Deleted local file {filename} after successful S3 upload")
+                remove_uploaded_file(client, filename)
+            if upload_to_s3(client, index_filename) == "uploaded":
+                remove_uploaded_file(client, index_filename)
         else:
             upload_status = "skipped"
 
@@ -139,4 +166,34 @@ def _save_detections(
             filename=os.path.basename(filename),
             download_status="downloaded",
             upload_status=upload_status,
+            stats=stats,
         )
+
+
+# map each detection to the footage chunk that contains its start and the offset inside it.
+# The chunks of the day are the intervals download_footage creates for the same range
+# (calculate_intervals, full hours unless the range starts or ends mid-hour), named like
+# the footage files including '--use-utc-filenames'. Detections starting before the first
+# chunk (they began the day before) get offset 0 in the first chunk.
+def build_detection_index(
+    client: Any,
+    camera: Camera,
+    query_start: datetime,
+    query_end: datetime,
+    detections: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    intervals = list(calculate_intervals(query_start, query_end))
+    chunk_starts = [int(interval_start.timestamp() * 1000) for interval_start, _ in intervals]
+    chunk_names = [
+        os.path.basename(footage_filename(client, camera, interval_start))
+        for interval_start, _ in intervals
+    ]
+
+    index: Dict[str, Any] = {}
+    for detection in detections:
+        position = max(0, bisect.bisect_right(chunk_starts, detection["start"]) - 1)
+        index[detection["id"]] = {
+            "filename": chunk_names[position],
+            "offset": max(0, detection["start"] - chunk_starts[position]) / 1000,
+        }
+    return {"chunks": chunk_names, "detections": index}
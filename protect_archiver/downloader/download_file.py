@@ -5,61 +5,67 @@ import os
 import time
 
 from typing import Any
+from typing import Optional
 
 import requests
 
+from protect_archiver import metrics
+from protect_archiver import shutdown
+from protect_archiver.config import Config
+from protect_archiver.dataclasses import DownloadStats
 from protect_archiver.errors import DownloadFailed
 from protect_archiver.errors import ProtectError
+from protect_archiver.manifest import FileDigest
+from protect_archiver.profiling import span
 from protect_archiver.utils import format_bytes
 from protect_archiver.utils import print_download_stats
-
-
-def download_file(client: Any, query: str, filename: str) -> str:
+from protect_archiver.watchdog import watch_download
+
+
+# download `query` to `filename` in `sink` (the client's footage sink by default); if `stats`
+# is given, it is filled with the size, SHA-256, timing and retry count of the (last) attempt
+def download_file(
+    client: Any,
+    query: str,
+    filename: str,
+    camera_name: str = "",
+    stats: Optional[DownloadStats] = None,
+    sink: Any = None,
+) -> str:
+    if stats is None:
+        stats = DownloadStats()
+    sink = sink or client.sink("footage")
     exit_code = 1
     retry_delay = max(client.download_wait, 3)
     uri = f"{client.session.authority}{client.session.base_path}{query}"
 
-    # skip downloading files that already exist on disk if argument --skip-existing-files is present
+    # skip downloading files that already exist in the sink if argument --skip-existing-files
+    # is present
     # TODO(dcramer): sanity check on filesize would be valuable here
-    if bool(client.skip_existing_files) and os.path.exists(filename):
+    if bool(client.skip_existing_files) and sink.exists(filename):
         logging.info(
-            f"File {filename} already exists on disk and argument '--skip-existing-files' "
-            "is present - skipping download \n"
+            f"File {filename} already exists ({sink.name} sink) and argument"
+            " '--skip-existing-files' is present - skipping download \n"
         )
-        client.files_skipped += 1
+        client.count(files_skipped=1)
+        metrics.FILES.inc(camera=camera_name, result="skipped")
         return "already_exists"
 
     for retry_num in range(client.max_retries):
+        if retry_num:
+            # a retry is new work, it is not started once SIGTERM was received
+            shutdown.check()
+            metrics.DOWNLOAD_RETRIES.inc(camera=camera_name)
+            stats.retries = retry_num
+
         # make the GET request to retrieve the video file or snapshot
         try:
             start = time.monotonic()
-            response = (
-                requests.get(
-                    uri,
-                    cookies={"TOKEN": client.session.get_api_token()},
-                    verify=client.verify_ssl,
-                    timeout=client.download_timeout,
-                    stream=True,
-                )
-                if client.session.__class__.__name__ == "UniFiOSClient"
-                else requests.get(
-                    uri,
-                    headers={"Authorization": f"Bearer {client.session.get_api_token()}"},
-                    verify=client.verify_ssl,
-                    timeout=client.download_timeout,
-                    stream=True,
-                )
-            )
-
-            if response.status_code == 401:
-                # invalid current api token - we special case this
-                # as we dont want to retry on consecutive auth failures
-                # TODO: refactor this
-                start = time.monotonic()
+            with span("export_request"):
                 response = (
                     requests.get(
                         uri,
-                        cookies={"TOKEN": client.session.get_api_token(force=True)},
+                        cookies={"TOKEN": client.session.get_api_token()},
                         verify=client.verify_ssl,
                         timeout=client.download_timeout,
                         stream=True,
@@ -67,15 +73,42 @@ def download_file(client: Any, query: str, filename: str) -> str:
                     if client.session.__class__.__name__ == "UniFiOSClient"
                     else requests.get(
                         uri,
-                        headers={
-                            "Authorization": f"Bearer {client.session.get_api_token(force=True)}"
-                        },
+                        headers={"Authorization": f"Bearer {client.session.get_api_token()}"},
                         verify=client.verify_ssl,
                         timeout=client.download_timeout,
                         stream=True,
                     )
                 )
 
+            if response.status_code == 401:
+                # invalid current api token - we special case this
+                # as we dont want to retry on consecutive auth failures
+                # TODO: refactor this
+                start = time.monotonic()
+                with span("export_request"):
+                    api_token = client.session.get_api_token(force=True)
+                    response = (
+                        requests.get(
+                            uri,
+                            cookies={"TOKEN": api_token},
+                            verify=client.verify_ssl,
+                            timeout=client.download_timeout,
+                            stream=True,
+                        )
+                        if client.session.__class__.__name__ == "UniFiOSClient"
+                        else requests.get(
+                            uri,
+                            headers={"Authorization": f"Bearer {api_token}"},
+                            verify=client.verify_ssl,
+                            timeout=client.download_timeout,
+                            stream=True,
+                        )
+                    )
+
+            first_byte = time.monotonic()
+            metrics.TIME_TO_FIRST_BYTE.observe(first_byte - start, camera=camera_name)
+            stats.ttfb = first_byte - start
+
             # write file to disk if response.status_code is 200,
             # otherwise log error and then either exit or skip the download
             if response.status_code != 200:
@@ -91,45 +124,58 @@ def download_file(client: Any, query: str, filename: str) -> str:
                     f"Download failed with status {response.status_code} {response.reason}:\n"
                     f"{error_message}"
                 )
-                client.files_failed += 1
+                client.count(files_failed=1)
+                metrics.FILES.inc(camera=camera_name, result="failed")
                 return "failed"
 
             else:
                 total_bytes = int(response.headers.get("content-length") or 0)
+                # skip download if remote file is smaller than 300b (a response without
+                # Content-Length, i.e. with chunked transfer encoding, is always downloaded)
+                if 0 < total_bytes < 300:
+                    logging.warning(
+                        "File is smaller than 300 bytes (empty video clip) - skipping download"
+                    )
+                    client.count(files_skipped=1)
+                    metrics.FILES.inc(camera=camera_name, result="empty")
+                    return "empty_clip"
+
                 cur_bytes = 0
-                if not total_bytes:
-                    with open(filename, "wb") as fp:
-                        content = response.content
-                        cur_bytes = len(content)
-                        total_bytes = cur_bytes
-                        fp.write(content)
-
-                else:
-                    # skip download if remote file is smaller than 300b
-                    if total_bytes < 300:
-                        logging.warning(
-                            "File is smaller than 300 bytes (empty video clip) - skipping download"
-                        )
-                        client.files_skipped += 1
-                        return "empty_clip"
-
-                    with open(filename, "wb") as fp:
-                        for chunk in response.iter_content(None):
-                            cur_bytes += len(chunk)
-                            fp.write(chunk)
-                            # TODO
-                            # done = int(50 * cur_bytes / total_bytes)
-                            # sys.stdout.write("\r[%s%s] %sps" % ('=' * done, ' ' * (50-done),
-                            #   format_bytes(cur_bytes//(time.monotonic() - start))))
-                            # print('')
+                # hashed while streaming, so the file never has to be read back for it
+                digest = FileDigest()
+                # streamed with or without Content-Length, so that the watchdog sees the
+                # progress (without it, the watchdog has no total deadline)
+                with span("disk_write"), watch_download(
+                    client, response, camera_name, total_bytes
+                ) as watchdog, sink.open(filename) as fp:
+                    for chunk in response.iter_content(Config.DOWNLOAD_CHUNK_SIZE):
+                        cur_bytes += len(chunk)
+                        watchdog.progress(len(chunk))
+                        digest.update(chunk)
+                        fp.write(chunk)
+                        client.bandwidth_limiter.consume(len(chunk))
+                        # TODO
+                        # done = int(50 * cur_bytes / total_bytes)
+                        # sys.stdout.write("\r[%s%s] %sps" % ('=' * done, ' ' * (50-done),
+                        #   format_bytes(cur_bytes//(time.monotonic() - start))))
+                        # print('')
+                    watchdog.check()
 
                 elapsed = time.monotonic() - start
                 logging.info(
                     f"Download successful after {int(elapsed)}s ({format_bytes(cur_bytes)}, "
                     f"{format_bytes(int(cur_bytes // elapsed))}ps)"
                 )
-                client.files_downloaded += 1
-                client.bytes_downloaded += cur_bytes
+                client.count(files_downloaded=1, bytes_downloaded=cur_bytes)
+                transfer_seconds = time.monotonic() - first_byte
+                metrics.TRANSFER_DURATION.observe(transfer_seconds, camera=camera_name)
+                stats.bytes = cur_bytes
+                stats.sha256 = digest.hexdigest()
+                stats.s3_checksum = digest.s3_checksum()
+                stats.copies = fp.copies
+                stats.transfer_seconds = transfer_seconds
+                metrics.FILES.inc(camera=camera_name, result="downloaded")
+                metrics.BYTES_DOWNLOADED.inc(cur_bytes, camera=camera_name)
                 return "downloaded"
 
         except requests.exceptions.RequestException as request_exception:
@@ -150,6 +196,7 @@ def download_file(client: Any, query: str, filename: str) -> str:
         logging.warning(f"Retrying in {retry_delay} second(s)...")
         time.sleep(retry_delay)
 
+    metrics.FILES.inc(camera=camera_name, result="failed")
     if not client.ignore_failed_downloads:
         logging.info(
             "To skip failed downloads and continue with next file, add argument"
@@ -161,5 +208,5 @@ def download_file(client: Any, query: str, filename: str) -> str:
         logging.info(
             "Argument '--ignore-failed-downloads' is present, continue downloading files..."
         )
-        client.files_skipped += 1
+        client.count(files_skipped=1)
         return "failed"
@@ -5,13 +5,22 @@ import time
 from datetime import datetime
 from datetime import timezone
 from typing import Any
+from typing import Optional
+from typing import Tuple
 
+from protect_archiver import manifest
+from protect_archiver import metrics
+from protect_archiver import shutdown
 from protect_archiver.dataclasses import Camera
+from protect_archiver.dataclasses import DownloadStats
 from protect_archiver.downloader.download_file import download_file
+from protect_archiver.downloader.plan_footage import plan_footage_intervals
+from protect_archiver.downloader.upload_to_s3 import remove_uploaded_file
+from protect_archiver.downloader.upload_to_s3 import s3_key_for
 from protect_archiver.downloader.upload_to_s3 import upload_to_s3
 from protect_archiver.utils import build_download_dir
-from protect_archiver.utils import calculate_intervals
 from protect_archiver.utils import make_camera_name_fs_safe
+from protect_archiver.utils import touch_file
 
 
 def download_footage(
@@ -22,20 +31,23 @@ def download_footage(
     disable_alignment: bool = False,
     disable_splitting: bool = False,
 ) -> None:
-    # make camera name safe for use in file name
-    camera_name_fs_safe = make_camera_name_fs_safe(camera)
-
     logging.info(f"Downloading footage for camera '{camera.name}' ({camera.id})")
 
     current_day = None
 
     # split requested time frame into chunks of 1 hour or less and download them one by one
-    for interval_start, interval_end in calculate_intervals(
+    # (with '--skip-unrecorded-intervals', chunks without any recording are left out)
+    intervals = plan_footage_intervals(
+        client,
+        camera,
         start,
         end,
         disable_alignment,
         disable_splitting,
-    ):
+    )
+    for index, (interval_start, interval_end) in enumerate(intervals):
+        metrics.QUEUE_DEPTH.set(len(intervals) - index, queue="intervals")
+
         # flush status CSV when the day changes
         if client.status_tracker is not None:
             day_str = interval_start.strftime("%Y_%m_%d")
@@ -43,81 +55,180 @@ def download_footage(
                 client.status_tracker.flush_day(current_day)
             current_day = day_str
 
-        # wait n seconds before starting next download (if parameter is set)
-        if client.download_wait != 0 and client.files_downloaded == 0:
-            logging.debug(
-                "Command line argument '--wait-between-downloads' is set to"
-                f" {client.download_wait} second(s)... \n"
-            )
-            time.sleep(int(client.download_wait))
-
-        # start and end time of the video segment to be downloaded
-        js_timestamp_range_start = int(interval_start.timestamp() * 1e3)
-        js_timestamp_range_end = int(interval_end.timestamp() * 1e3)
-
-        # support selection between local time zone and UTC for file names
-        interval_start_tz = (
-            interval_start.astimezone(timezone.utc) if client.use_utc_filenames else interval_start
-        )
+        download_footage_interval(client, camera, interval_start, interval_end)
 
-        download_dir = build_download_dir(
-            use_subfolders=client.use_subfolders,
-            destination_path=client.destination_path,
-            interval_start_tz=interval_start_tz,
-            camera_name_fs_safe=camera_name_fs_safe,
+    metrics.QUEUE_DEPTH.set(0, queue="intervals")
+
+    # the last day is complete if its remaining intervals were left out of the plan
+    if client.daily_concat is not None:
+        client.daily_concat.range_done(
+            make_camera_name_fs_safe(camera),
+            end.astimezone(timezone.utc) if client.use_utc_filenames else end,
         )
 
-        # file name for download
-        filename_timestamp = interval_start_tz.strftime("%Y-%m-%d - %H.%M.%S%z")
-        filename = f"{download_dir}/{camera_name_fs_safe} - {filename_timestamp}.mp4"
+    # flush remaining status records for the last day processed by this camera
+    if client.status_tracker is not None and current_day is not None:
+        client.status_tracker.flush_day(current_day)
 
-        logging.info(
-            f"Downloading video for time range {interval_start} - {interval_end} to {filename}"
+
+# return the local file name of the footage chunk starting at interval_start
+def footage_filename(client: Any, camera: Camera, interval_start: datetime) -> str:
+    # make camera name safe for use in file name
+    camera_name_fs_safe = make_camera_name_fs_safe(camera)
+
+    # support selection between local time zone and UTC for file names
+    interval_start_tz = (
+        interval_start.astimezone(timezone.utc) if client.use_utc_filenames else interval_start
+    )
+
+    download_dir = build_download_dir(
+        use_subfolders=client.use_subfolders,
+        destination_path=client.destination_path,
+        interval_start_tz=interval_start_tz,
+        camera_name_fs_safe=camera_name_fs_safe,
+    )
+
+    # file name for download
+    filename_timestamp = interval_start_tz.strftime("%Y-%m-%d - %H.%M.%S%z")
+    return f"{download_dir}/{camera_name_fs_safe} - {filename_timestamp}.mp4"
+
+
+def download_footage_interval(
+    client: Any,
+    camera: Camera,
+    interval_start: datetime,
+    interval_end: datetime,
+    stats: Optional[DownloadStats] = None,
+) -> Tuple[str, str]:
+    """Download (and upload/record) a single footage chunk.
+
+    Returns the download and upload status that is also written to the status CSV.
+    If `stats` is given, it is filled with the download's size and timings.
+    """
+    shutdown.check()
+
+    # wait n seconds before starting next download (if parameter is set)
+    if client.download_wait != 0 and client.files_downloaded == 0:
+        logging.debug(
+            "Command line argument '--wait-between-downloads' is set to"
+            f" {client.download_wait} second(s)... \n"
         )
+        time.sleep(int(client.download_wait))
+
+    # start and end time of the video segment to be downloaded
+    js_timestamp_range_start = int(interval_start.timestamp() * 1e3)
+    js_timestamp_range_end = int(interval_end.timestamp() * 1e3)
+
+    filename = footage_filename(client, camera, interval_start)
 
-        # create file without content if argument --touch-files is present
-        # XXX(dcramer): would be nice to document why you'd ever want this
-        if bool(client.touch_files) and not os.path.exists(filename):
-            logging.debug(f"Argument '--touch-files' is present. Creating file at {filename}")
-            open(filename, "a").close()
+    logging.info(
+        f"Downloading video for time range {interval_start} - {interval_end} to {filename}"
+    )
 
-        # build video export query
-        video_export_query = (
-            f"/video/export?camera={camera.id}"
-            f"&start={js_timestamp_range_start}&end={js_timestamp_range_end}"
+    sink = client.sink("footage")
+
+    # create file without content if argument --touch-files is present
+    # XXX(dcramer): would be nice to document why you'd ever want this
+    if bool(client.touch_files) and sink.local and not os.path.exists(filename):
+        touch_file(filename)
+
+    # build video export query
+    video_export_query = (
+        f"/video/export?camera={camera.id}"
+        f"&start={js_timestamp_range_start}&end={js_timestamp_range_end}"
+    )
+
+    # download the file, unless '--skip-existing-files' finds it in S3
+    if stats is None:
+        stats = DownloadStats()
+    in_s3 = sink.local and uploaded_to_s3(client, filename)
+    if in_s3:
+        logging.info(
+            f"File {filename} already exists in S3 and argument '--skip-existing-files' "
+            "is present - skipping download"
+        )
+        client.count(files_skipped=1)
+        metrics.FILES.inc(camera=camera.name, result="skipped")
+        download_status = "already_exists"
+        # a copy kept by '--local-cache-size' was used again
+        if client.local_cache is not None:
+            client.local_cache.touch(filename)
+    else:
+        download_status = download_file(
+            client, video_export_query, filename, camera.name, stats, sink
+        )
+    if download_status == "downloaded" and sink.name != "null":
+        manifest.record_download(
+            filename,
+            interval_start,
+            interval_end,
+            video_export_query,
+            stats,
+            camera.recording_mode,
+        )
+        if sink.name == "s3":
+            manifest.record_upload(filename, s3_key_for(client, filename))
+
+    # whatever the status, so that a day whose last chunk is empty or failed is concatenated
+    if client.daily_concat is not None and sink.local:
+        # the day ends at midnight in the time zone of the file names
+        client.daily_concat.chunk_done(
+            filename,
+            interval_end.astimezone(timezone.utc) if client.use_utc_filenames else interval_end,
         )
 
-        # download the file
-        download_status = download_file(client, video_export_query, filename)
-
-        # upload to S3 if configured
-        upload_status = "n/a"
-        if client.s3_bucket is not None:
-            if download_status in ("downloaded", "already_exists"):
-                # only upload if the file exists and has content
-                if os.path.exists(filename) and os.path.getsize(filename) > 0:
-                    upload_status = upload_to_s3(client, filename)
-                    if upload_status == "uploaded":
-                        os.remove(filename)
-                        logging.info(
-                            f"Deleted local file {filename} after successful S3 upload"
-                        )
-                else:
-                    upload_status = "skipped"
-            else:
-                upload_status = "skipped"
-
-        # record status to CSV
-        if client.status_tracker is not None:
-            client.status_tracker.add_record(
-                camera_name=camera.name,
-                interval_start=interval_start,
-                interval_end=interval_end,
-                filename=os.path.basename(filename),
-                download_status=download_status,
-                upload_status=upload_status,
-            )
+    # upload to S3 if configured (and the file was written locally)
+    upload_status = "n/a"
+    if client.s3_bucket is not None and sink.local:
+        if in_s3:
+            upload_status = "already_exists"
+        elif download_status in ("downloaded", "already_exists"):
+            upload_status = upload_footage_file(client, filename, stats)
+        else:
+            upload_status = "skipped"
+
+    # record status to CSV
+    if client.status_tracker is not None:
+        client.status_tracker.add_record(
+            camera_name=camera.name,
+            interval_start=interval_start,
+            interval_end=interval_end,
+            filename=os.path.basename(filename),
+            download_status=download_status,
+            upload_status=upload_status,
+            stats=stats,
+        )
 
-    # flush remaining status records for the last day processed by this camera
-    if client.status_tracker is not None and current_day is not None:
-        client.status_tracker.flush_day(current_day)
+    return download_status, upload_status
+
+
+# upload a downloaded footage file to S3 and delete (or cache) the local copy once it is
+# uploaded
+def upload_footage_file(client: Any, filename: str, stats: DownloadStats) -> str:
+    # only upload if the file exists and has content
+    if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+        return "skipped"
+
+    # a file downloaded by an earlier run has its digest in the manifest
+    sha256 = stats.sha256 or manifest.known_sha256(filename)
+    s3_checksum = stats.s3_checksum or manifest.known_sha256(filename, "s3_checksum")
+    upload_start = time.monotonic()
+    upload_status = upload_to_s3(client, filename, sha256, s3_checksum)
+    stats.upload_seconds = time.monotonic() - upload_start
+    if upload_status in ("uploaded", "unverified"):
+        manifest.record_upload(filename, s3_key_for(client, filename))
+        remove_uploaded_file(client, filename)
+    return upload_status
+
+
+# return whether a footage file is in S3 already ('--skip-existing-files' in S3 mode): the
+# object must have the size recorded in the file's manifest, or be non-empty if the file
+# has no manifest entry
+def uploaded_to_s3(client: Any, filename: str) -> bool:
+    if client.s3_objects is None:
+        return False
+    size = client.s3_objects.size(client, s3_key_for(client, filename))
+    if not size:
+        return False
+    entry = manifest.lookup(filename)
+    return entry is None or entry.get("size") == size
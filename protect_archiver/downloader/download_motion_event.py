@@ -3,6 +3,7 @@ import logging
 from datetime import timezone
 from typing import Any
 
+from protect_archiver import shutdown
 from protect_archiver.dataclasses import Camera
 from protect_archiver.dataclasses import MotionEvent
 from protect_archiver.downloader.download_file import download_file
@@ -13,6 +14,8 @@ from protect_archiver.utils import make_camera_name_fs_safe
 def download_motion_event(
     client: Any, motion_event: MotionEvent, camera: Camera, download_motion_heatmaps: bool
 ) -> None:
+    shutdown.check()
+
     # make camera name safe for use in file name
     camera_name_fs_safe = make_camera_name_fs_safe(camera)
 
@@ -50,7 +53,7 @@ def download_motion_event(
     )
 
     # download the file
-    download_file(client, video_export_query, filename)
+    download_file(client, video_export_query, filename, camera.name, sink=client.sink("events"))
 
     # download motion heatmap if enabled and event has heatmap available
     if download_motion_heatmaps and motion_event.heatmap_id:
@@ -58,4 +61,6 @@ def download_motion_event(
 
         heatmap_filename = f"{download_dir}/{camera_name_fs_safe} - {filename_timestamp}.pgm"
         heatmap_export_query = f"/heatmaps/{motion_event.heatmap_id}"
-        download_file(client, heatmap_export_query, heatmap_filename)
+        download_file(
+            client, heatmap_export_query, heatmap_filename, camera.name, sink=client.sink("events")
+        )
@@ -5,13 +5,17 @@ from datetime import datetime
 from datetime import timezone
 from typing import Any
 
+from protect_archiver import shutdown
 from protect_archiver.dataclasses import Camera
 from protect_archiver.downloader.download_file import download_file
 from protect_archiver.utils import build_download_dir
 from protect_archiver.utils import make_camera_name_fs_safe
+from protect_archiver.utils import touch_file
 
 
 def download_snapshot(client: Any, start: datetime, camera: Camera) -> None:
+    shutdown.check()
+
     # make camera name safe for use in file name
     camera_name_fs_safe = make_camera_name_fs_safe(camera)
 
@@ -34,10 +38,11 @@ def download_snapshot(client: Any, start: datetime, camera: Camera) -> None:
         f" {filename}"
     )
 
+    sink = client.sink("snapshots")
+
     # create file without content if argument --touch-files is present
-    if bool(client.touch_files) and not os.path.exists(filename):
-        logging.debug(f"Argument '--touch-files' is present. Creating file at {filename}")
-        open(filename, "a").close()
+    if bool(client.touch_files) and sink.local and not os.path.exists(filename):
+        touch_file(filename)
 
     js_timestamp_start = int(start.timestamp() * 1e3)
 
@@ -45,4 +50,4 @@ def download_snapshot(client: Any, start: datetime, camera: Camera) -> None:
     snapshot_export_query = f"/cameras/{camera.id}/snapshot?ts={js_timestamp_start}"
 
     # download the file
-    download_file(client, snapshot_export_query, filename)
+    download_file(client, snapshot_export_query, filename, camera.name, sink=sink)
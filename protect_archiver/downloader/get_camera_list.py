@@ -3,6 +3,7 @@ import logging
 
 from datetime import datetime
 from typing import Any
+from typing import Dict
 from typing import List
 
 import requests
@@ -10,6 +11,27 @@ import requests
 from protect_archiver.dataclasses import Camera
 
 
+# estimate how many bytes of footage the camera produces per second of recording.
+# Prefers the average from the storage stats (used bytes over the recorded time span, which
+# also accounts for motion-only recording), falls back to the bitrate of the highest
+# quality enabled channel (the one exported by '/video/export').
+def estimate_bytes_per_second(camera: Dict[str, Any]) -> float:
+    stats = camera.get("stats") or {}
+    video_stats = stats.get("video") or {}
+    storage_used = (stats.get("storage") or {}).get("used")
+    recording_start = video_stats.get("recordingStart")
+    recording_end = video_stats.get("recordingEnd")
+    if storage_used and recording_start and recording_end and recording_end > recording_start:
+        return float(storage_used) / ((recording_end - recording_start) / 1000)
+
+    bitrates = [
+        channel.get("bitrate") or 0
+        for channel in camera.get("channels") or []
+        if channel.get("enabled")
+    ]
+    return max(bitrates, default=0) / 8
+
+
 def get_camera_list(session: Any) -> List[Camera]:
     cameras_uri = f"{session.authority}{session.base_path}/cameras"
 
@@ -36,7 +58,16 @@ def get_camera_list(session: Any) -> List[Camera]:
 
     camera_list = []
     for camera in cameras:
-        camera_data = Camera(id=camera["id"], name=camera["name"], recording_start=datetime.min)
+        recording_settings = camera.get("recordingSettings") or {}
+        camera_data = Camera(
+            id=camera["id"],
+            name=camera["name"],
+            recording_start=datetime.min,
+            recording_mode=recording_settings.get("mode") or "always",
+            pre_padding_secs=recording_settings.get("prePaddingSecs") or 0,
+            post_padding_secs=recording_settings.get("postPaddingSecs") or 0,
+            bytes_per_second=estimate_bytes_per_second(camera),
+        )
         if camera["stats"]["video"]["recordingStart"]:
             camera_data.recording_start = datetime.utcfromtimestamp(
                 camera["stats"]["video"]["recordingStart"] / 1000
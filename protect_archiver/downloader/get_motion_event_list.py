@@ -9,19 +9,28 @@ from typing import List
 
 import requests
 
+from protect_archiver import json_codec
 from protect_archiver.dataclasses import Camera
 from protect_archiver.dataclasses import MotionEvent
+from protect_archiver.errors import DownloadFailed
+from protect_archiver.event_batch import EventBatch
+from protect_archiver.profiling import span
 
 
 def get_detection_list(
-    session: Any, start: datetime, end: datetime, camera_list: List[Camera]
+    session: Any,
+    start: datetime,
+    end: datetime,
+    camera_list: List[Camera],
+    raise_on_error: bool = False,
 ) -> List[Dict[str, Any]]:
     """Fetch the raw detection (event) payloads from the Protect /events API.
 
     Returns the list of raw event dicts exactly as returned by the API (ongoing
     events without an 'end' are filtered out). Returns an empty list on a non-200
-    response. Network-level errors propagate to the caller so they can be handled
-    (e.g. retried or skipped) per request.
+    response, or raises DownloadFailed if raise_on_error is set (for callers that must
+    not mistake an error for "no events"). Network-level errors propagate to the caller
+    so they can be handled (e.g. retried or skipped) per request.
     """
     motion_events_uri = (
         # TODO: REMARK 2024-Jan-29 @danielfernau #388
@@ -51,11 +60,15 @@ def get_detection_list(
 
     if response.status_code != 200:
         print(f"Error while loading motion events list: {response.status_code}")
+        if raise_on_error:
+            raise DownloadFailed(f"Loading motion events failed with status {response.status_code}")
         return []
 
     logging.info(f"Successfully retrieved data from {motion_events_uri}")
     # filter ongoing event with no end date https://github.com/danielfernau/unifi-protect-video-downloader/issues/65
-    detections = [detection for detection in response.json() if detection.get("end")]
+    detections = [
+        detection for detection in json_codec.loads(response.content) if detection.get("end")
+    ]
 
     # noinspection PyTypeHints
     event_count_by_camera = Counter(d["camera"] for d in detections)
@@ -79,18 +92,19 @@ def get_detection_list(
     return detections
 
 
+def get_event_batch(
+    session: Any,
+    start: datetime,
+    end: datetime,
+    camera_list: List[Camera],
+    raise_on_error: bool = False,
+) -> EventBatch:
+    with span("events_fetch"):
+        detections = get_detection_list(session, start, end, camera_list, raise_on_error)
+    return EventBatch.from_detections(detections)
+
+
 def get_motion_event_list(
     session: Any, start: datetime, end: datetime, camera_list: List[Camera]
 ) -> List[MotionEvent]:
-    return [
-        MotionEvent(
-            id=detection["id"],
-            start=datetime.fromtimestamp(detection["start"] / 1000),
-            end=datetime.fromtimestamp(detection["end"] / 1000),
-            camera_id=detection["camera"],
-            score=detection["score"],
-            thumbnail_id=detection["thumbnail"],
-            heatmap_id=detection["heatmap"],
-        )
-        for detection in get_detection_list(session, start, end, camera_list)
-    ]
+    return list(get_event_batch(session, start, end, camera_list))
@@ -0,0 +1,286 @@
+# timeline-aware planning of footage downloads
+import logging
+import shutil
+
+from bisect import bisect_right
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from protect_archiver.config import Config
+from protect_archiver.dataclasses import Camera
+from protect_archiver.downloader.get_motion_event_list import get_event_batch
+from protect_archiver.utils import calculate_day_intervals
+from protect_archiver.utils import calculate_intervals
+from protect_archiver.utils import format_bytes
+from protect_archiver.utils import format_duration
+from protect_archiver.utils import in_shard
+
+
+# events are looked up with this much margin on both sides of the requested range so that
+# events (and their pre/post padding) reaching into the range from outside are not missed
+COVERAGE_QUERY_MARGIN = timedelta(hours=1)
+
+# cameras in this recording mode record continuously, every interval has footage
+CONTINUOUS_RECORDING_MODE = "always"
+
+
+# return the requested start, moved forward to the full hour in which the camera's
+# first recording lies if it is earlier than that (hour alignment keeps the file names
+# identical to an unclamped run)
+def clamp_to_recording_start(camera: Camera, start: datetime) -> datetime:
+    if camera.recording_start == datetime.min:
+        return start
+
+    # recording_start is a naive UTC datetime (see get_camera_list)
+    recording_start = camera.recording_start.replace(
+        minute=0, second=0, microsecond=0, tzinfo=timezone.utc
+    )
+    if start.timestamp() >= recording_start.timestamp():
+        return start
+
+    if start.tzinfo is not None:
+        return recording_start.astimezone(start.tzinfo)
+    return recording_start.astimezone().replace(tzinfo=None)
+
+
+# return the merged [start_ms, end_ms] ranges per camera ID covered by detection events
+# between start and end (recordings of non-continuous cameras are made around these).
+# Results are cached on the client so that planning several cameras over the same range
+# only queries the controller once.
+def get_recording_coverage(
+    client: Any, start: datetime, end: datetime, camera_list: List[Camera]
+) -> Dict[str, List[Tuple[int, int]]]:
+    cache_key = (int(start.timestamp() * 1e3), int(end.timestamp() * 1e3))
+    if cache_key in client.recording_coverage_cache:
+        return client.recording_coverage_cache[cache_key]
+
+    ranges: Dict[str, List[Tuple[int, int]]] = {}
+    for _day_anchor, query_start, query_end in calculate_day_intervals(
+        start - COVERAGE_QUERY_MARGIN, end + COVERAGE_QUERY_MARGIN
+    ):
+        # errors must not be mistaken for "no recordings", so let them propagate
+        events = get_event_batch(
+            client.session, query_start, query_end, camera_list, raise_on_error=True
+        )
+        for i in range(len(events)):
+            ranges.setdefault(events.camera_id(i), []).append((events.starts[i], events.ends[i]))
+
+    coverage = {
+        camera_id: merge_ranges(camera_ranges) for camera_id, camera_ranges in ranges.items()
+    }
+    client.recording_coverage_cache[cache_key] = coverage
+    return coverage
+
+
+# sort and merge overlapping [start, end] ranges
+def merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+    for range_start, range_end in sorted(ranges):
+        if merged and range_start <= merged[-1][1]:
+            if range_end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], range_end)
+        else:
+            merged.append((range_start, range_end))
+    return merged
+
+
+# return True if any of the (sorted, merged) coverage ranges overlaps [start_ms, end_ms]
+def is_covered(coverage: List[Tuple[int, int]], start_ms: int, end_ms: int) -> bool:
+    # last range starting at or before the end of the interval
+    index = bisect_right(coverage, (end_ms, float("inf"))) - 1
+    return index >= 0 and coverage[index][1] >= start_ms
+
+
+# return the (start, end) intervals to request from '/video/export' for a camera.
+# With '--shard i/N' only the intervals assigned to this node are returned.
+def plan_footage_intervals(
+    client: Any,
+    camera: Camera,
+    start: datetime,
+    end: datetime,
+    disable_alignment: bool = False,
+    disable_splitting: bool = False,
+) -> List[Tuple[datetime, datetime]]:
+    intervals = plan_recorded_intervals(
+        client, camera, start, end, disable_alignment, disable_splitting
+    )
+    if client.shard is None:
+        return intervals
+
+    planned = [
+        (interval_start, interval_end)
+        for interval_start, interval_end in intervals
+        if in_shard(client.shard, camera.id, interval_start)
+    ]
+    logging.info(
+        f"Shard {client.shard[0]}/{client.shard[1]}: {len(planned)} of {len(intervals)}"
+        f" interval(s) for camera '{camera.name}' ({camera.id})"
+    )
+    return planned
+
+
+# Without '--skip-unrecorded-intervals' this is exactly calculate_intervals(). With it,
+# the range is clamped to the camera's first recording and, for cameras that do not
+# record continuously, intervals without any recorded event are dropped up front instead
+# of being requested and discarded as an empty clip afterwards.
+def plan_recorded_intervals(
+    client: Any,
+    camera: Camera,
+    start: datetime,
+    end: datetime,
+    disable_alignment: bool = False,
+    disable_splitting: bool = False,
+) -> List[Tuple[datetime, datetime]]:
+    if not client.skip_unrecorded_intervals:
+        return list(calculate_intervals(start, end, disable_alignment, disable_splitting))
+
+    requested_start = start
+    start = clamp_to_recording_start(camera, start)
+    if start >= end:
+        logging.info(f"No recordings for camera '{camera.name}' ({camera.id}) before {end}")
+        return []
+
+    intervals = list(calculate_intervals(start, end, disable_alignment, disable_splitting))
+    if camera.recording_mode == CONTINUOUS_RECORDING_MODE:
+        return intervals
+
+    # coverage is looked up for the requested range so it can be shared between cameras
+    coverage = get_recording_coverage(client, requested_start, end, [camera]).get(camera.id, [])
+    # an event's footage starts pre_padding before and ends post_padding after the event
+    pre_padding_ms = camera.pre_padding_secs * 1000
+    post_padding_ms = camera.post_padding_secs * 1000
+    planned = [
+        (interval_start, interval_end)
+        for interval_start, interval_end in intervals
+        if is_covered(
+            coverage,
+            int(interval_start.timestamp() * 1e3) - post_padding_ms,
+            int(interval_end.timestamp() * 1e3) + pre_padding_ms,
+        )
+    ]
+
+    logging.info(
+        f"Skipping {len(intervals) - len(planned)} of {len(intervals)} interval(s) without"
+        f" recordings for camera '{camera.name}' ({camera.id}, recording mode"
+        f" '{camera.recording_mode}')"
+    )
+    return planned
+
+
+# estimate the requests, bytes and time a footage download of [start, end) will take.
+# Runs the same interval planning as download_footage for every camera and sizes each
+# interval from the camera's bytes_per_second. Sequential request time is the export
+# preparation overhead plus '--wait-between-downloads' per request and the transfer at the
+# given throughput (MB/s); the wall-clock projection spreads it over `concurrency` workers.
+# The result is a JSON-serializable dict with per-camera and per-day totals and a
+# comparison against the free space in the destination directory.
+def estimate_download_plan(
+    client: Any,
+    camera_list: List[Camera],
+    start: datetime,
+    end: datetime,
+    disable_alignment: bool = False,
+    disable_splitting: bool = False,
+    concurrency: int = Config.PLAN_CONCURRENCY,
+    throughput: float = Config.PLAN_THROUGHPUT,
+    request_overhead: float = Config.PLAN_REQUEST_OVERHEAD,
+) -> Dict[str, Any]:
+    bytes_per_second = throughput * 2**20
+    per_request_seconds = request_overhead + client.download_wait
+
+    cameras: List[Dict[str, Any]] = []
+    days: Dict[str, Dict[str, Any]] = {}
+    largest_file = 0
+
+    for camera in camera_list:
+        intervals = plan_footage_intervals(
+            client, camera, start, end, disable_alignment, disable_splitting
+        )
+
+        camera_bytes = 0
+        for interval_start, interval_end in intervals:
+            size = int((interval_end - interval_start).total_seconds() * camera.bytes_per_second)
+            camera_bytes += size
+            largest_file = max(largest_file, size)
+
+            # days are counted in the same frame that is used for the folder structure
+            interval_start_tz = (
+                interval_start.astimezone(timezone.utc)
+                if client.use_utc_filenames
+                else interval_start
+            )
+            day = days.setdefault(
+                interval_start_tz.strftime("%Y-%m-%d"), {"requests": 0, "bytes": 0}
+            )
+            day["requests"] += 1
+            day["bytes"] += size
+
+        cameras.append(
+            {
+                "id": camera.id,
+                "name": camera.name,
+                "bytes_per_second": round(camera.bytes_per_second),
+                "requests": len(intervals),
+                "bytes": camera_bytes,
+                "seconds": len(intervals) * per_request_seconds + camera_bytes / bytes_per_second,
+            }
+        )
+
+    total_bytes = sum(camera["bytes"] for camera in cameras)
+    total_seconds = sum(camera["seconds"] for camera in cameras)
+
+    # with S3 upload enabled, local files are deleted right after their upload
+    required_bytes = largest_file if client.s3_bucket is not None else total_bytes
+    free_bytes = shutil.disk_usage(client.destination_path).free
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "cameras": cameras,
+        "days": [{"date": date, **totals} for date, totals in sorted(days.items())],
+        "totals": {
+            "requests": sum(camera["requests"] for camera in cameras),
+            "bytes": total_bytes,
+            "seconds": total_seconds,
+            "concurrency": concurrency,
+            "throughput_mb_per_second": throughput,
+            "wall_clock_seconds": total_seconds / max(concurrency, 1),
+        },
+        "destination": {
+            "path": client.destination_path,
+            "free_bytes": free_bytes,
+            "required_bytes": required_bytes,
+            "fits": required_bytes <= free_bytes,
+        },
+    }
+
+
+def format_download_plan(plan: Dict[str, Any]) -> str:
+    lines = [f"Download plan for {plan['start']} - {plan['end']}", "", "Per camera:"]
+    for camera in plan["cameras"]:
+        lines.append(
+            f"- {camera['name']} ({camera['id']}): {camera['requests']} request(s),"
+            f" {format_bytes(camera['bytes'])}, {format_duration(camera['seconds'])}"
+        )
+
+    lines += ["", "Per day:"]
+    for day in plan["days"]:
+        lines.append(f"- {day['date']}: {day['requests']} request(s), {format_bytes(day['bytes'])}")
+
+    totals = plan["totals"]
+    destination = plan["destination"]
+    lines += [
+        "",
+        f"Total: {totals['requests']} request(s), {format_bytes(totals['bytes'])}",
+        f"Projected wall-clock time: {format_duration(totals['wall_clock_seconds'])} at"
+        f" concurrency {totals['concurrency']} and {totals['throughput_mb_per_second']} MB/s",
+        f"Free space in {destination['path']}: {format_bytes(destination['free_bytes'])}"
+        f" ({format_bytes(destination['required_bytes'])} required"
+        f"{'' if destination['fits'] else ' - NOT ENOUGH SPACE'})",
+    ]
+    return "\n".join(lines)
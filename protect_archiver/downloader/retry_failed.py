@@ -0,0 +1,154 @@
+import csv
+import logging
+import os
+
+from datetime import datetime
+from datetime import timedelta
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from protect_archiver.dataclasses import Camera
+from protect_archiver.dataclasses import DownloadStats
+from protect_archiver.downloader.download_footage import download_footage_interval
+from protect_archiver.downloader.download_footage import footage_filename
+from protect_archiver.downloader.download_footage import upload_footage_file
+from protect_archiver.status import STATUS_CSV_PATTERN
+from protect_archiver.status import StatusTracker
+from protect_archiver.status import copy_status_column
+from protect_archiver.status import write_status_csv
+from protect_archiver.utils import in_shard
+
+
+# the status CSV stores interval ends without milliseconds, but footage intervals always
+# end one millisecond before a full second (see calculate_intervals)
+INTERVAL_END_PADDING = timedelta(milliseconds=999)
+
+
+# Retry the downloads and uploads recorded as failed in a status CSV directory
+# ('--status-csv-dir' of an earlier run).
+#
+# The daily CSVs are processed one at a time, so memory stays bounded by the size of a
+# single day. Every footage row with download_status, upload_status or the upload status of
+# a '--copy-to' destination 'failed' is retried: rows whose download succeeded and whose
+# local file is still there are only re-uploaded or copied to the failed destinations, all
+# others are downloaded again (and uploaded if S3 is configured). The statuses and
+# timing columns of the retried rows are then updated in place, with the CSV replaced
+# atomically so an interrupted retry never leaves a half-written file behind.
+#
+# Returns the number of retried rows and the number of those that failed again.
+def retry_failed(client: Any, csv_dir: str, camera_list: List[Camera]) -> Tuple[int, int]:
+    cameras_by_name = {camera.name: camera for camera in camera_list}
+    retried = 0
+    still_failed = 0
+
+    for csv_name in sorted(os.listdir(csv_dir)):
+        if not STATUS_CSV_PATTERN.match(csv_name):
+            continue
+        day_retried, day_failed = retry_failed_day(
+            client, os.path.join(csv_dir, csv_name), cameras_by_name
+        )
+        retried += day_retried
+        still_failed += day_failed
+
+    return retried, still_failed
+
+
+def retry_failed_day(
+    client: Any, filepath: str, cameras_by_name: Dict[str, Camera]
+) -> Tuple[int, int]:
+    with open(filepath, newline="") as fp:
+        rows = list(csv.DictReader(fp))
+
+    retried = 0
+    still_failed = 0
+    try:
+        for row in rows:
+            if not row_failed(row):
+                continue
+            stats = retry_row(client, row, cameras_by_name)
+            if stats is None:
+                continue
+            retried += 1
+            if row_failed(row):
+                still_failed += 1
+            row.update(StatusTracker.format_stats(stats))
+    finally:
+        # also keep the rows retried so far if a failed download aborts the run
+        if retried:
+            write_status_csv(filepath, rows)
+            logging.info(f"Updated {retried} retried row(s) in {filepath}")
+
+    return retried, still_failed
+
+
+# whether the download, the S3 upload or one of the '--copy-to' copies of a row failed
+def row_failed(row: Dict[str, str]) -> bool:
+    return any(
+        value == "failed"
+        for name, value in row.items()
+        if name in ("download_status", "upload_status")
+        or (name is not None and name.startswith(copy_status_column("")))
+    )
+
+
+# retry a single failed row, updating its statuses; returns None if it can't be retried
+def retry_row(
+    client: Any, row: Dict[str, str], cameras_by_name: Dict[str, Camera]
+) -> Optional[DownloadStats]:
+    if not row["filename"].endswith(".mp4"):
+        logging.info(f"Skipping {row['filename']}: only footage downloads can be retried")
+        return None
+
+    camera = cameras_by_name.get(row["camera"])
+    if camera is None:
+        logging.warning(f"Skipping {row['filename']}: camera '{row['camera']}' not found")
+        return None
+
+    interval_start = datetime.strptime(row["interval_start"], "%Y-%m-%d %H:%M:%S")
+    interval_end = (
+        datetime.strptime(row["interval_end"], "%Y-%m-%d %H:%M:%S") + INTERVAL_END_PADDING
+    )
+
+    # with '--shard', rows of the other shards are left to them
+    if not in_shard(client.shard, camera.id, interval_start):
+        return None
+
+    filename = footage_filename(client, camera, interval_start)
+    if os.path.basename(filename) != row["filename"]:
+        logging.warning(
+            f"Skipping {row['filename']}: file name does not match {os.path.basename(filename)}"
+            " (was the original run using different --use-utc-filenames settings?)"
+        )
+        return None
+
+    # copies to destinations that are no longer configured can't be retried
+    failed_copies = [
+        destination
+        for destination in client.copy_to
+        if row.get(copy_status_column(destination)) == "failed"
+    ]
+    reupload = row["upload_status"] == "failed" and client.s3_bucket is not None
+
+    stats = DownloadStats()
+    if (
+        row["download_status"] != "failed"
+        and (reupload or failed_copies)
+        and os.path.exists(filename)
+    ):
+        if reupload:
+            logging.info(f"Retrying S3 upload of {filename}")
+            row["upload_status"] = upload_footage_file(client, filename, stats)
+        if failed_copies:
+            logging.info(f"Retrying copies of {filename} to {', '.join(failed_copies)}")
+            stats.copies = client.sink("footage").copy_to(filename, failed_copies)
+    else:
+        logging.info(f"Retrying download of {filename}")
+        row["download_status"], row["upload_status"] = download_footage_interval(
+            client, camera, interval_start, interval_end, stats
+        )
+    for destination, status in stats.copies.items():
+        row[copy_status_column(destination)] = status
+    return stats
@@ -1,29 +1,122 @@
+import base64
 import logging
 import os
+import time
 
 from typing import Any
+from typing import Dict
+from typing import Optional
 
-from botocore.exceptions import ClientError
+from protect_archiver import metrics
+from protect_archiver.config import Config
+from protect_archiver.profiling import span
 
 
-def upload_to_s3(client: Any, filename: str) -> str:
+# return the S3 key of a local file: its path relative to the client's destination
+# directory, prefixed with the configured S3 prefix
+def s3_key_for(client: Any, filename: str) -> str:
+    relative_path = os.path.relpath(filename, client.destination_path)
+    return f"{client.s3_prefix}/{relative_path}" if client.s3_prefix else relative_path
+
+
+def upload_to_s3(
+    client: Any,
+    filename: str,
+    sha256: Optional[str] = None,
+    s3_checksum: Optional[str] = None,
+) -> str:
     """Upload a local file to S3 and return the upload status.
 
     The S3 key is derived from the file's path relative to the client's
     destination directory, prefixed with the configured S3 prefix.
 
+    If the file's SHA-256 (hex) is given, S3 checks every uploaded part against its own
+    SHA-256 and the object is verified against the digest after the upload (see
+    verify_s3_object). Objects uploaded in several parts can only be verified with the
+    file's `s3_checksum` (see manifest.FileDigest).
+
     Returns:
-        "uploaded" on success, "failed" on error.
+        "uploaded" on success, "unverified" if the object could not be verified,
+        "failed" on error.
     """
-    relative_path = os.path.relpath(filename, client.destination_path)
-    s3_key = f"{client.s3_prefix}/{relative_path}" if client.s3_prefix else relative_path
+    # botocore is only needed once S3 upload is enabled
+    from boto3.s3.transfer import TransferConfig
+    from botocore.exceptions import ClientError
+
+    s3_key = s3_key_for(client, filename)
+    extra_args: Dict[str, Any] = {}
+    if sha256:
+        extra_args = {"ChecksumAlgorithm": "SHA256", "Metadata": {"sha256": sha256}}
 
+    start = time.monotonic()
     try:
-        client.s3_client.upload_file(filename, client.s3_bucket, s3_key)
+        with span("upload"):
+            client.s3_client.upload_file(
+                filename,
+                client.s3_bucket,
+                s3_key,
+                ExtraArgs=extra_args,
+                Callback=client.bandwidth_limiter.consume,
+                # the parts FileDigest derives the object's checksum from
+                Config=TransferConfig(
+                    multipart_threshold=Config.S3_PART_SIZE,
+                    multipart_chunksize=Config.S3_PART_SIZE,
+                ),
+            )
+        status = "uploaded"
+        if sha256:
+            verified = verify_s3_object(
+                client, s3_key, os.path.getsize(filename), sha256, s3_checksum
+            )
+            if verified is False:
+                raise ValueError("the uploaded object does not match the local file")
+            if verified is None:
+                status = "unverified"
         logging.info(f"Uploaded {filename} to s3://{client.s3_bucket}/{s3_key}")
-        client.files_uploaded += 1
-        return "uploaded"
-    except ClientError as e:
+        client.count(files_uploaded=1)
+    except (ClientError, ValueError) as e:
         logging.error(f"Failed to upload {filename} to S3: {e}")
-        client.files_upload_failed += 1
-        return "failed"
+        client.count(files_upload_failed=1)
+        status = "failed"
+
+    metrics.S3_UPLOADS.inc(result=status)
+    metrics.S3_UPLOAD_DURATION.observe(time.monotonic() - start, result=status)
+    return status
+
+
+# compare an uploaded object's size and checksum with the local file's: the SHA-256 of a
+# single-part upload, the composite checksum of a multipart upload (its part checksums,
+# see manifest.FileDigest). Returns None if the object can't be verified, because S3 has no
+# checksum for it or the file's composite checksum is unknown.
+def verify_s3_object(
+    client: Any, s3_key: str, size: int, sha256: str, s3_checksum: Optional[str] = None
+) -> Optional[bool]:
+    head = client.s3_client.head_object(Bucket=client.s3_bucket, Key=s3_key, ChecksumMode="ENABLED")
+    if head.get("ContentLength") != size:
+        logging.error(
+            f"s3://{client.s3_bucket}/{s3_key} has {head.get('ContentLength')} bytes,"
+            f" expected {size}"
+        )
+        return False
+
+    checksum = head.get("ChecksumSHA256") or ""
+    if "-" in checksum:
+        expected = s3_checksum
+    else:
+        expected = base64.b64encode(bytes.fromhex(sha256)).decode()
+    if not checksum or not expected:
+        logging.warning(f"Could not verify the checksum of s3://{client.s3_bucket}/{s3_key}")
+        return None
+    if checksum != expected:
+        logging.error(f"SHA-256 of s3://{client.s3_bucket}/{s3_key} does not match {sha256}")
+        return False
+    return True
+
+
+# a file was uploaded: delete it locally, or keep it in the local cache ('--local-cache-size')
+def remove_uploaded_file(client: Any, filename: str) -> None:
+    if client.local_cache is not None:
+        client.local_cache.add(filename)
+        return
+    os.remove(filename)
+    logging.info(f"Deleted local file {filename} after successful S3 upload")
@@ -0,0 +1,120 @@
+from array import array
+from datetime import datetime
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+from protect_archiver.dataclasses import MotionEvent
+
+
+class EventBatch:
+    """Columnar, array-backed collection of detection (event) payloads.
+
+    Start and end times are kept as parallel int64 arrays of epoch milliseconds and the
+    camera of every event as an index into a list of interned camera IDs, so filtering,
+    sorting and grouping a multi-week event pull does not create a Python object (or a
+    datetime) per event. The raw payloads are kept alongside for the code paths that need
+    to write them out; MotionEvent objects are only built on demand while iterating.
+    """
+
+    __slots__ = ("starts", "ends", "cameras", "camera_ids", "records")
+
+    def __init__(
+        self,
+        starts: "array[int]",
+        ends: "array[int]",
+        cameras: "array[int]",
+        camera_ids: List[str],
+        records: List[Dict[str, Any]],
+    ) -> None:
+        self.starts = starts
+        self.ends = ends
+        self.cameras = cameras
+        self.camera_ids = camera_ids
+        self.records = records
+
+    @classmethod
+    def from_detections(cls, detections: Iterable[Dict[str, Any]]) -> "EventBatch":
+        starts = array("q")
+        ends = array("q")
+        cameras = array("q")
+        camera_ids: List[str] = []
+        camera_index: Dict[str, int] = {}
+        records: List[Dict[str, Any]] = []
+
+        for detection in detections:
+            camera_id = detection["camera"]
+            index = camera_index.get(camera_id)
+            if index is None:
+                index = camera_index[camera_id] = len(camera_ids)
+                camera_ids.append(camera_id)
+
+            starts.append(detection["start"])
+            ends.append(detection.get("end") or detection["start"])
+            cameras.append(index)
+            records.append(detection)
+
+        return cls(starts, ends, cameras, camera_ids, records)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __iter__(self) -> Iterator[MotionEvent]:
+        for i in range(len(self)):
+            yield self.motion_event(i)
+
+    def camera_id(self, i: int) -> str:
+        return self.camera_ids[self.cameras[i]]
+
+    def motion_event(self, i: int) -> MotionEvent:
+        record = self.records[i]
+        return MotionEvent(
+            id=record["id"],
+            start=datetime.fromtimestamp(self.starts[i] / 1000),
+            end=datetime.fromtimestamp(self.ends[i] / 1000),
+            camera_id=self.camera_id(i),
+            score=record["score"],
+            thumbnail_id=record["thumbnail"],
+            heatmap_id=record["heatmap"],
+        )
+
+    def take(self, indices: Iterable[int]) -> "EventBatch":
+        """Return a new, compacted batch holding only the events at the given positions."""
+        indices = list(indices)
+        return EventBatch(
+            array("q", (self.starts[i] for i in indices)),
+            array("q", (self.ends[i] for i in indices)),
+            array("q", (self.cameras[i] for i in indices)),
+            self.camera_ids,
+            [self.records[i] for i in indices],
+        )
+
+    def filter_cameras(self, camera_ids: Iterable[str]) -> "EventBatch":
+        selected = set(camera_ids)
+        wanted = {index for index, camera_id in enumerate(self.camera_ids) if camera_id in selected}
+        return self.take(i for i, camera in enumerate(self.cameras) if camera in wanted)
+
+    def filter_range(self, start_ms: int, end_ms: int) -> "EventBatch":
+        """Keep events overlapping [start_ms, end_ms)."""
+        starts, ends = self.starts, self.ends
+        return self.take(i for i in range(len(self)) if starts[i] < end_ms and ends[i] >= start_ms)
+
+    def sorted_by_start(self, reverse: bool = False) -> "EventBatch":
+        return self.take(sorted(range(len(self)), key=self.starts.__getitem__, reverse=reverse))
+
+    def group_by_camera(self) -> Dict[str, "EventBatch"]:
+        positions: List[Optional[List[int]]] = [None] * len(self.camera_ids)
+        for i, camera in enumerate(self.cameras):
+            bucket = positions[camera]
+            if bucket is None:
+                bucket = positions[camera] = []
+            bucket.append(i)
+
+        return {
+            self.camera_ids[camera]: self.take(bucket)
+            for camera, bucket in enumerate(positions)
+            if bucket is not None
+        }
@@ -0,0 +1,122 @@
+import json
+
+from typing import IO
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import Optional
+from typing import Union
+
+
+try:
+    import orjson
+
+    HAS_ORJSON = True
+except ImportError:  # optional dependency (pip install orjson)
+    HAS_ORJSON = False
+
+
+class StdlibJSONCodec:
+    """JSON codec backed by the standard library json module."""
+
+    name = "json"
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+    def dumps(
+        self,
+        obj: Any,
+        indent: bool = False,
+        default: Optional[Callable[[Any], Any]] = None,
+    ) -> bytes:
+        if indent:
+            text = json.dumps(obj, indent=2, default=default)
+        else:
+            text = json.dumps(obj, separators=(",", ":"), default=default)
+        return text.encode("utf-8")
+
+
+class OrjsonCodec(StdlibJSONCodec):
+    """JSON codec backed by orjson (several times faster for both directions).
+
+    Unlike the standard library codec, which escapes non-ASCII characters (\\u00fc) as
+    json.dump always did, orjson writes them as UTF-8. Both decode to the same data.
+    """
+
+    name = "orjson"
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
+
+    def dumps(
+        self,
+        obj: Any,
+        indent: bool = False,
+        default: Optional[Callable[[Any], Any]] = None,
+    ) -> bytes:
+        return orjson.dumps(obj, default=default, option=orjson.OPT_INDENT_2 if indent else 0)
+
+
+CODECS = {StdlibJSONCodec.name: StdlibJSONCodec, OrjsonCodec.name: OrjsonCodec}
+
+# orjson is used whenever it is installed, the standard library otherwise
+codec: StdlibJSONCodec = OrjsonCodec() if HAS_ORJSON else StdlibJSONCodec()
+
+
+def use_codec(name: str) -> StdlibJSONCodec:
+    """Switch the codec used by this module's helpers ('orjson' or 'json')."""
+    global codec
+    if name == OrjsonCodec.name and not HAS_ORJSON:
+        raise ImportError("orjson is not installed")
+    codec = CODECS[name]()
+    return codec
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    return codec.loads(data)
+
+
+def dumps(obj: Any, indent: bool = False, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    return codec.dumps(obj, indent=indent, default=default)
+
+
+def load(fp: IO[bytes]) -> Any:
+    return codec.loads(fp.read())
+
+
+def dump(
+    obj: Any,
+    fp: IO[bytes],
+    indent: bool = False,
+    default: Optional[Callable[[Any], Any]] = None,
+) -> None:
+    fp.write(codec.dumps(obj, indent=indent, default=default))
+
+
+def dump_array(
+    items: Iterable[Any],
+    fp: IO[bytes],
+    indent: bool = False,
+    default: Optional[Callable[[Any], Any]] = None,
+) -> int:
+    """Stream a JSON array to fp one element at a time and return the number of elements.
+
+    The encoded document never has to be held in memory as a whole, which matters for
+    days with hundreds of thousands of detections. With indent set the output has the
+    same layout as json.dump(..., indent=2).
+    """
+    opening, separator, closing = (b"[\n  ", b",\n  ", b"\n]") if indent else (b"[", b",", b"]")
+
+    count = 0
+    for item in items:
+        encoded = codec.dumps(item, indent=indent, default=default)
+        if indent:
+            # nest the element one level deeper (newlines inside strings are escaped)
+            encoded = encoded.replace(b"\n", b"\n  ")
+        fp.write(separator if count else opening)
+        fp.write(encoded)
+        count += 1
+
+    fp.write(closing if count else b"[]")
+    return count
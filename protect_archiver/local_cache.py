@@ -0,0 +1,79 @@
+# local LRU cache of uploaded files ('--local-cache-size')
+#
+# Without a cache, files are deleted locally as soon as they are uploaded to S3. With one,
+# they stay in the destination directory until the cached files together exceed the size
+# limit; then the least recently used ones are deleted. A file is used when it is uploaded
+# and when '--skip-existing-files' finds it in S3 again (see touch()).
+#
+# The cached files and their sizes are tracked in an index file in the destination
+# directory (in LRU order), so eviction never has to walk the archive. Processes sharing the
+# destination ('--shard') update the index one at a time, see utils.file_lock.
+import logging
+import os
+import threading
+
+from collections import OrderedDict
+from typing import List
+from typing import Tuple
+
+from protect_archiver import json_codec
+from protect_archiver.config import Config
+from protect_archiver.utils import file_lock
+from protect_archiver.utils import write_file_atomic
+
+
+class LocalCache:
+    def __init__(self, destination_path: str, max_bytes: int) -> None:
+        self.destination_path = destination_path
+        self.max_bytes = max_bytes
+        self.index_file = os.path.join(destination_path, Config.LOCAL_CACHE_FILE)
+        self._lock = threading.Lock()
+        # path relative to the destination -> size, least recently used first
+        self.files: "OrderedDict[str, int]" = OrderedDict()
+        self.total_bytes = 0
+        self._read_index()
+
+    def add(self, filename: str) -> None:
+        """Keep an uploaded file, evicting the least recently used files over the limit."""
+        relative_path = os.path.relpath(filename, self.destination_path)
+        with self._lock, file_lock(self.index_file):
+            # start from the index, which other processes sharing the destination update too
+            self._read_index()
+            self.total_bytes -= self.files.pop(relative_path, 0)
+            self.files[relative_path] = os.path.getsize(filename)
+            self.total_bytes += self.files[relative_path]
+
+            while self.total_bytes > self.max_bytes and self.files:
+                evicted, size = self.files.popitem(last=False)
+                self.total_bytes -= size
+                self._remove(evicted)
+            self._write_index()
+
+    def touch(self, filename: str) -> None:
+        """Mark a cached file as used, so that it is evicted after the others."""
+        relative_path = os.path.relpath(filename, self.destination_path)
+        with self._lock, file_lock(self.index_file):
+            self._read_index()
+            if relative_path in self.files:
+                self.files.move_to_end(relative_path)
+                self._write_index()
+
+    def _read_index(self) -> None:
+        self.files.clear()
+        if os.path.isfile(self.index_file):
+            with open(self.index_file, "rb") as fp:
+                for relative_path, size in json_codec.load(fp)["files"]:
+                    self.files[relative_path] = size
+        self.total_bytes = sum(self.files.values())
+
+    def _remove(self, relative_path: str) -> None:
+        filename = os.path.join(self.destination_path, relative_path)
+        try:
+            os.remove(filename)
+            logging.info(f"Evicted {filename} from the local cache")
+        except FileNotFoundError:
+            pass
+
+    def _write_index(self) -> None:
+        entries: List[Tuple[str, int]] = list(self.files.items())
+        write_file_atomic(self.index_file, json_codec.dumps({"files": entries}))
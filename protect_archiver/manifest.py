@@ -0,0 +1,167 @@
+# per-camera-day manifests of downloaded footage
+#
+# download_file() hashes every chunk as it is written, so the SHA-256 of a footage file is
+# known the moment its download finishes. The digests are kept in one manifest per camera
+# and day next to the footage, e.g.
+#
+#   Front Door - 2024-01-02.manifest.json
+#   {"camera": {"recording_mode": "always"},
+#    "files": {"Front Door - 2024-01-02 - 03.00.00+0100.mp4": {
+#       "size": 734003200, "sha256": "9f86d0...", "interval_start": "2024-01-02T03:00:00",
+#       "interval_end": "2024-01-02T03:59:59.999000",
+#       "query": "/video/export?camera=...&start=...&end=...",
+#       "s3_checksum": "Jtvv...=-88", "s3_key": "..."}}}
+#
+# The manifest stays behind when the footage itself is deleted after an S3 upload, so the
+# archive can be checked against it later without downloading or re-reading it twice: the
+# S3 upload is verified with the digest right away (see upload_to_s3), local files only
+# need to be hashed once by whoever checks them. "s3_checksum" is the checksum S3 reports for
+# the file once uploaded, see FileDigest.
+import base64
+import hashlib
+import logging
+import os
+import threading
+
+from datetime import datetime
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from protect_archiver import json_codec
+from protect_archiver.config import Config
+from protect_archiver.dataclasses import DownloadStats
+from protect_archiver.utils import file_lock
+from protect_archiver.utils import write_file_atomic
+
+
+MANIFEST_SUFFIX = ".manifest.json"
+
+# manifests are rewritten as a whole, from any download worker of the process (and, with
+# '--shard', of the other processes writing to the destination, see utils.file_lock)
+_lock = threading.Lock()
+
+
+class FileDigest:
+    """SHA-256 of a file, plus the checksum S3 reports for it once it is uploaded.
+
+    Uploads of Config.S3_PART_SIZE or more are split into parts of that size (see
+    upload_to_s3); S3's checksum of such an object is the SHA-256 of the concatenated part
+    digests, followed by "-<number of parts>". Smaller files are uploaded in one request and
+    have the SHA-256 of their content.
+    """
+
+    def __init__(self, part_size: int = Config.S3_PART_SIZE) -> None:
+        self.part_size = part_size
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._part = hashlib.sha256()
+        self._part_bytes = 0
+        self._parts: List[bytes] = []
+
+    def update(self, data: bytes) -> None:
+        self._digest.update(data)
+        self.size += len(data)
+        view = memoryview(data)
+        while view:
+            take = self.part_size - self._part_bytes
+            part, view = view[:take], view[take:]
+            self._part.update(part)
+            self._part_bytes += len(part)
+            if self._part_bytes == self.part_size:
+                self._parts.append(self._part.digest())
+                self._part = hashlib.sha256()
+                self._part_bytes = 0
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+    def s3_checksum(self) -> str:
+        if self.size < self.part_size:
+            return base64.b64encode(self._digest.digest()).decode()
+        parts = self._parts + ([self._part.digest()] if self._part_bytes else [])
+        composite = hashlib.sha256(b"".join(parts)).digest()
+        return f"{base64.b64encode(composite).decode()}-{len(parts)}"
+
+
+# return the manifest of a footage file: "<camera> - <day> - <time>.mp4" belongs to
+# "<camera> - <day>.manifest.json" in the same directory
+def manifest_filename(filename: str) -> str:
+    return f"{filename.rsplit(' - ', 1)[0]}{MANIFEST_SUFFIX}"
+
+
+def read_manifest(filepath: str) -> Dict[str, Any]:
+    if not os.path.isfile(filepath):
+        return {"files": {}}
+    with open(filepath, "rb") as fp:
+        return json_codec.load(fp)
+
+
+# update a file's entry, and with `camera` the camera's settings kept next to the entries
+def _update_entry(filename: str, camera: Optional[Dict[str, Any]] = None, **values: Any) -> None:
+    filepath = manifest_filename(filename)
+    os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+    with _lock, file_lock(filepath):
+        manifest = read_manifest(filepath)
+        manifest["files"].setdefault(os.path.basename(filename), {}).update(values)
+        if camera:
+            manifest.setdefault("camera", {}).update(camera)
+        write_file_atomic(filepath, json_codec.dumps(manifest, indent=True))
+
+
+# add a downloaded footage file to its manifest (replacing an older entry of the file)
+def record_download(
+    filename: str,
+    interval_start: datetime,
+    interval_end: datetime,
+    query: str,
+    stats: DownloadStats,
+    # the camera's recordingSettings mode, so that 'verify' knows whether it records all day
+    recording_mode: Optional[str] = None,
+) -> None:
+    try:
+        _update_entry(
+            filename,
+            camera={"recording_mode": recording_mode} if recording_mode else None,
+            size=stats.bytes,
+            sha256=stats.sha256,
+            interval_start=interval_start.isoformat(),
+            interval_end=interval_end.isoformat(),
+            query=query,
+            s3_checksum=stats.s3_checksum,
+        )
+    except OSError as e:
+        logging.error(f"Failed to update the manifest of {filename}: {e}")
+
+
+def record_upload(filename: str, s3_key: str) -> None:
+    try:
+        _update_entry(filename, s3_key=s3_key)
+    except OSError as e:
+        logging.error(f"Failed to update the manifest of {filename}: {e}")
+
+
+# return the manifest entry of a footage file, None if it has none
+def lookup(filename: str) -> Optional[Dict[str, Any]]:
+    try:
+        return read_manifest(manifest_filename(filename))["files"].get(os.path.basename(filename))
+    except (OSError, ValueError):
+        return None
+
+
+# return the SHA-256 (or with key="s3_checksum" the S3 checksum) of a local file as recorded
+# in its manifest, None if it has no entry or the entry does not match the file's size
+def known_sha256(filename: str, key: str = "sha256") -> Optional[str]:
+    entry = lookup(filename)
+    if not entry or not entry.get(key) or entry.get("size") != os.path.getsize(filename):
+        return None
+    return str(entry[key])
+
+
+def file_sha256(filename: str, chunk_size: int = 2**20) -> str:
+    digest = hashlib.sha256()
+    with open(filename, "rb") as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
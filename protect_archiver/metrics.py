@@ -0,0 +1,218 @@
+# Prometheus metrics for long-running archiver jobs
+#
+# Counters, gauges and histograms are always recorded (a dict update under a lock) and
+# rendered in the Prometheus text exposition format. They are only served over HTTP if
+# '--metrics-port' is set, see start_metrics_server().
+import logging
+import threading
+
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Sequence
+from typing import Tuple
+
+
+# seconds, from a fast local NVR (tens of ms) up to exports that take minutes
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+REGISTRY: List["Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str]) -> str:
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values))
+    return f"{{{pairs}}}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [
+                f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items())
+            ]
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ] + self._samples()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            # [non-cumulative bucket counts..., sum]
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-1] += value
+
+    def _samples(self) -> List[str]:
+        labelnames = self.labelnames + ("le",)
+        lines = []
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, state):
+                    cumulative += count
+                    labels = _format_labels(labelnames, key + (_format_value(bound),))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(state[-1])}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+FILES = Counter(
+    "protect_archiver_files_total",
+    "Files processed by camera and result (downloaded, skipped, empty, failed)",
+    ["camera", "result"],
+)
+BYTES_DOWNLOADED = Counter(
+    "protect_archiver_downloaded_bytes_total", "Bytes downloaded by camera", ["camera"]
+)
+DOWNLOAD_RETRIES = Counter(
+    "protect_archiver_download_retries_total", "Download attempts that were retried", ["camera"]
+)
+TIME_TO_FIRST_BYTE = Histogram(
+    "protect_archiver_download_ttfb_seconds",
+    "Time from sending a download request until the response headers arrived",
+    ["camera"],
+)
+TRANSFER_DURATION = Histogram(
+    "protect_archiver_download_transfer_seconds",
+    "Time spent receiving and writing a download's body",
+    ["camera"],
+)
+DOWNLOAD_STALLS = Counter(
+    "protect_archiver_download_stalls_total",
+    "Downloads aborted by the stall watchdog by camera and reason (throughput, deadline)",
+    ["camera", "reason"],
+)
+EXPIRED_INTERVALS = Counter(
+    "protect_archiver_expired_intervals_total",
+    "Intervals deleted by the NVR's retention before sync could archive them",
+    ["camera"],
+)
+S3_UPLOADS = Counter(
+    "protect_archiver_s3_uploads_total", "S3 uploads by result (uploaded, failed)", ["result"]
+)
+S3_UPLOAD_DURATION = Histogram(
+    "protect_archiver_s3_upload_seconds", "Duration of S3 uploads", ["result"]
+)
+QUEUE_DEPTH = Gauge(
+    "protect_archiver_queue_depth",
+    "Work items waiting to be processed (intervals, events, status_rows)",
+    ["queue"],
+)
+AUTH_REFRESHES = Counter(
+    "protect_archiver_auth_refreshes_total",
+    "Session token (re-)fetches by reason (login, expired)",
+    ["reason"],
+)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(port: int, address: str = "") -> Any:
+    """Serve all metrics at http://<address>:<port>/metrics from a daemon thread."""
+    from http.server import BaseHTTPRequestHandler
+    from http.server import ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer((address, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logging.info(f"Serving Prometheus metrics on port {server.server_address[1]}")
+    return server
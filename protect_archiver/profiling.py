@@ -0,0 +1,180 @@
+# built-in profiling for the download pipeline ('--profile')
+#
+# start_profiling() wraps a command body with cProfile or tracemalloc and enables the
+# timing spans placed around the hot sections of the pipeline (auth, camera list, events
+# fetch, export request, disk write, resize, upload). Spans nest: a token fetch ('auth') is
+# also counted in the span of the request that triggered it. stop_profiling() writes the
+# report into the destination directory:
+#   profile_<command>_<timestamp>.pstats  (cprofile, open with 'python -m pstats')
+#   profile_<command>_<timestamp>.txt     (timing spans, plus top allocations for tracemalloc)
+#
+# Before Python 3.12 a cProfile profile only sees the thread that enabled it, so worker
+# threads are started with profile_thread(target), which profiles each thread separately
+# and merges its stats into the report.
+import logging
+import os
+import threading
+import time
+
+from datetime import datetime
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+
+
+PROFILE_MODES = ["cprofile", "tracemalloc"]
+
+# number of allocation sites listed in the tracemalloc report
+TRACEMALLOC_TOP = 50
+
+# span name -> [count, total seconds]; None while profiling is off so spans cost nothing
+_spans: Optional[Dict[str, List[float]]] = None
+_spans_lock = threading.Lock()
+
+# the running profiler, for profile_thread()
+_profiler: Optional["Profiler"] = None
+
+
+class span:
+    """Context manager that adds the time spent in its block to the named timing span."""
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> "span":
+        if _spans is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        if _spans is None:
+            return
+        elapsed = time.perf_counter() - self.start
+        with _spans_lock:
+            totals = _spans.setdefault(self.name, [0, 0.0])
+            totals[0] += 1
+            totals[1] += elapsed
+
+
+class Profiler:
+    def __init__(self, mode: str, destination_path: str, command: str) -> None:
+        self.mode = mode
+        timestamp = datetime.now().strftime("%Y_%m_%d_%H%M%S")
+        self.basename = os.path.join(destination_path, f"profile_{command}_{timestamp}")
+        self.started = time.perf_counter()
+        self._profile: Any = None
+        # cProfile profiles of the finished worker threads
+        self._thread_profiles: List[Any] = []
+        self._thread_profiles_lock = threading.Lock()
+
+    def start(self) -> None:
+        global _spans
+        _spans = {}
+
+        if self.mode == "cprofile":
+            import cProfile
+
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            import tracemalloc
+
+            tracemalloc.start(25)
+
+        self.started = time.perf_counter()
+
+    def stop(self) -> List[str]:
+        """Stop profiling, write the report files and return their paths."""
+        global _spans
+        wall_seconds = time.perf_counter() - self.started
+        written = []
+        lines = [f"wall-clock time: {wall_seconds:.3f}s", ""]
+
+        if self.mode == "cprofile":
+            import pstats
+
+            self._profile.disable()
+            stats = pstats.Stats(self._profile)
+            with self._thread_profiles_lock:
+                for profile in self._thread_profiles:
+                    stats.add(profile)
+            stats.dump_stats(f"{self.basename}.pstats")
+            written.append(f"{self.basename}.pstats")
+        else:
+            import tracemalloc
+
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            lines += [f"traced memory: {current / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB", ""]
+            lines += [f"top {TRACEMALLOC_TOP} allocation sites:"]
+            for stat in snapshot.statistics("lineno")[:TRACEMALLOC_TOP]:
+                lines.append(f"  {stat}")
+            lines.append("")
+
+        with _spans_lock:
+            spans, _spans = _spans or {}, None
+
+        lines.append(f"{'span':<20}{'count':>8}{'total s':>12}{'mean ms':>12}{'% wall':>9}")
+        for name, (count, total) in sorted(spans.items(), key=lambda item: -item[1][1]):
+            lines.append(
+                f"{name:<20}{int(count):>8}{total:>12.3f}{total / count * 1000:>12.1f}"
+                f"{total / wall_seconds * 100 if wall_seconds else 0:>9.1f}"
+            )
+
+        with open(f"{self.basename}.txt", "w") as fp:
+            fp.write("\n".join(lines) + "\n")
+        written.append(f"{self.basename}.txt")
+
+        for filepath in written:
+            logging.info(f"Wrote {self.mode} profile to {filepath}")
+        return written
+
+    def run_thread(self, target: Callable[[], None]) -> None:
+        import cProfile
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ profiles through sys.monitoring: one profiler at a time, which
+            # already sees every thread
+            target()
+            return
+        try:
+            target()
+        finally:
+            profile.disable()
+            with self._thread_profiles_lock:
+                self._thread_profiles.append(profile)
+
+
+# wrap the target of a worker thread so that '--profile cprofile' covers the thread as well
+def profile_thread(target: Callable[[], None]) -> Callable[[], None]:
+    profiler = _profiler
+    if profiler is None or profiler.mode != "cprofile":
+        return target
+    return lambda: profiler.run_thread(target)
+
+
+def start_profiling(mode: Optional[str], destination_path: str, command: str) -> Optional[Profiler]:
+    global _profiler
+    if mode is None:
+        return None
+    profiler = _profiler = Profiler(mode, destination_path, command)
+    profiler.start()
+    return profiler
+
+
+def stop_profiling(profiler: Optional[Profiler]) -> None:
+    global _profiler
+    if profiler is None:
+        return
+    _profiler = None
+    for filepath in profiler.stop():
+        print(f"Profile written to {filepath}")
@@ -0,0 +1,51 @@
+# S3-aware '--skip-existing-files'
+#
+# In S3 mode uploaded files are deleted locally, so the local existence check of
+# '--skip-existing-files' never matches on a rerun. S3ObjectIndex answers it from the
+# bucket instead: the first lookup of a key lists its whole "directory" (the camera-day
+# prefix YYYY/MM/DD/<camera>/ with subfolders) with one paginated ListObjectsV2 call and
+# caches the keys and sizes, so a rerun costs one listing per camera-day instead of one
+# HEAD request (or download) per file.
+import logging
+import threading
+
+from collections import OrderedDict
+from typing import Any
+from typing import Dict
+from typing import Optional
+
+from protect_archiver.config import Config
+
+
+class S3ObjectIndex:
+    def __init__(
+        self, max_prefixes: int = Config.S3_INDEX_PREFIXES, bucket: Optional[str] = None
+    ) -> None:
+        self.max_prefixes = max_prefixes
+        # the client's bucket by default
+        self.bucket = bucket
+        # prefix -> {key: size}, least recently used first
+        self._prefixes: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def size(self, client: Any, key: str) -> Optional[int]:
+        """Return the size of the object `key` in the bucket, None if it is missing."""
+        prefix = f"{key.rsplit('/', 1)[0]}/" if "/" in key else ""
+        with self._lock:
+            objects = self._prefixes.get(prefix)
+            if objects is None:
+                objects = self._prefixes[prefix] = self._list(client, prefix)
+                while len(self._prefixes) > self.max_prefixes:
+                    self._prefixes.popitem(last=False)
+            self._prefixes.move_to_end(prefix)
+            return objects.get(key)
+
+    def _list(self, client: Any, prefix: str) -> Dict[str, int]:
+        objects = {}
+        bucket = self.bucket or client.s3_bucket
+        paginator = client.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for item in page.get("Contents", []):
+                objects[item["Key"]] = item["Size"]
+        logging.debug(f"Listed {len(objects)} object(s) in s3://{bucket}/{prefix}")
+        return objects
@@ -0,0 +1,82 @@
+# graceful shutdown on SIGTERM (download, events and sync)
+#
+# A container redeploy sends SIGTERM and kills the process a little later. Instead of dying
+# mid-download, the commands install a handler that
+#   - stops scheduling new work: the next file, interval or event raises ShutdownRequested
+#     (check() at the scheduling points),
+#   - lets the transfer in flight finish within the grace period ('--shutdown-grace'); when
+#     the period is over (or on a second SIGTERM), ShutdownRequested is raised wherever the
+#     main thread is, so the transfer is aborted like any failed download: its sink removes
+#     the partial file and the interval stays unfinished in the sync state,
+# after which the command flushes its status CSVs and state and exits with code 8.
+#
+# ShutdownRequested derives from BaseException, like KeyboardInterrupt, so the handlers that
+# keep a run going past a single failed file ('except Exception') don't swallow it, while
+# 'finally' blocks and context managers still clean up on the way out.
+import logging
+import signal
+import threading
+
+from typing import Any
+from typing import Dict
+
+from protect_archiver.config import Config
+
+
+EXIT_CODE = 8
+
+
+class ShutdownRequested(BaseException):
+    pass
+
+
+_requested = threading.Event()
+_previous_handlers: Dict[int, Any] = {}
+
+
+def requested() -> bool:
+    return _requested.is_set()
+
+
+# raise ShutdownRequested once SIGTERM was received; called before starting new work
+def check() -> None:
+    if _requested.is_set():
+        raise ShutdownRequested("shutdown requested")
+
+
+def install(grace: float = Config.SHUTDOWN_GRACE) -> None:
+    """Handle SIGTERM as described above; must be called from the main thread."""
+    _requested.clear()
+
+    def on_sigterm(signum: int, frame: Any) -> None:
+        if _requested.is_set():
+            raise ShutdownRequested("second SIGTERM received")
+        _requested.set()
+        if grace <= 0 or not hasattr(signal, "setitimer"):
+            raise ShutdownRequested("SIGTERM received")
+        logging.warning(
+            f"SIGTERM received - finishing the transfer in flight (at most {grace:.0f}s), then"
+            " exiting"
+        )
+        signal.setitimer(signal.ITIMER_REAL, grace)
+
+    def on_deadline(signum: int, frame: Any) -> None:
+        raise ShutdownRequested(f"the transfer in flight did not finish within {grace:.0f}s")
+
+    _previous_handlers[signal.SIGTERM] = signal.signal(signal.SIGTERM, on_sigterm)
+    if hasattr(signal, "setitimer"):
+        _previous_handlers[signal.SIGALRM] = signal.signal(signal.SIGALRM, on_deadline)
+
+
+# cancel the grace period timer, so that cleaning up after ShutdownRequested isn't
+# interrupted
+def disarm() -> None:
+    if hasattr(signal, "setitimer"):
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def uninstall() -> None:
+    disarm()
+    for signum, handler in _previous_handlers.items():
+        signal.signal(signum, handler)
+    _previous_handlers.clear()
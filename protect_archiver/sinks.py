@@ -0,0 +1,483 @@
+# storage sinks ('--sink')
+#
+# Every download mode writes its files through a sink instead of opening local files
+# itself. The file names stay the local paths below the destination directory (as built by
+# build_download_dir); each sink maps them to its own storage:
+#
+#   local  the file itself (the default)
+#   s3     the object s3_key_for(filename), streamed with a multipart upload while the file
+#          is downloaded, nothing is written locally
+#   tar    a member of the day's archive <destination>/<YYYY-MM-DD>.tar, named by the path
+#          relative to the destination
+#   null   nothing, the data is discarded (to measure network throughput without disk)
+#
+# The sink of each mode is chosen separately, e.g. '--sink thumbnails=tar --sink footage=s3'.
+# With '--copy-to s3://bucket/prefix' (multiple), every sink is wrapped in a TeeSink that
+# also streams each file to those S3 destinations.
+#
+# sink.open(filename) returns a writer that is committed when its 'with' block ends and
+# aborted (leaving nothing behind) when the block raises. Files that have to be processed
+# locally first (resized thumbnails) are written to the local sink and moved with
+# sink.put(filename).
+import atexit
+import logging
+import os
+import re
+import tarfile
+import tempfile
+import threading
+import time
+
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from types import TracebackType
+from typing import Any
+from typing import BinaryIO
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+from typing import Type
+
+from protect_archiver import metrics
+from protect_archiver.config import Config
+from protect_archiver.s3_index import S3ObjectIndex
+
+
+SINK_KINDS = ("local", "s3", "tar", "null")
+SINK_MODES = ("footage", "snapshots", "events", "detections", "thumbnails")
+
+_DAY_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+class Writer:
+    """File-like object of an open sink file; counts the bytes written."""
+
+    def __init__(self) -> None:
+        self.bytes = 0
+        # destination -> uploaded/failed of the '--copy-to' copies, once committed
+        self.copies: Dict[str, str] = {}
+
+    def write(self, data: bytes) -> int:
+        self.bytes += len(data)
+        self._write(data)
+        return len(data)
+
+    def _write(self, data: bytes) -> None:
+        pass
+
+    def commit(self) -> None:
+        pass
+
+    def abort(self) -> None:
+        pass
+
+    def __enter__(self) -> "Writer":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+class Sink:
+    name = ""
+    # whether the files end up at their local path (and can be uploaded, concatenated, ...)
+    local = False
+
+    def open(self, filename: str) -> Writer:
+        raise NotImplementedError
+
+    def exists(self, filename: str) -> bool:
+        raise NotImplementedError
+
+    # write the local file `filename` to the sink
+    def copy(self, filename: str) -> Dict[str, str]:
+        with open(filename, "rb") as fp, self.open(filename) as writer:
+            for chunk in iter(lambda: fp.read(Config.DOWNLOAD_CHUNK_SIZE), b""):
+                writer.write(chunk)
+        return writer.copies
+
+    # move the local file `filename` into the sink; returns the status of its copies
+    def put(self, filename: str) -> Dict[str, str]:
+        copies = self.copy(filename)
+        os.remove(filename)
+        return copies
+
+    def close(self) -> None:
+        pass
+
+
+class _LocalWriter(Writer):
+    def __init__(self, filename: str) -> None:
+        super().__init__()
+        self.filename = filename
+        self.fp = open(filename, "wb")
+
+    def _write(self, data: bytes) -> None:
+        self.fp.write(data)
+
+    def commit(self) -> None:
+        self.fp.close()
+
+    def abort(self) -> None:
+        self.fp.close()
+        os.remove(self.filename)
+
+
+class LocalSink(Sink):
+    name = "local"
+    local = True
+
+    def open(self, filename: str) -> Writer:
+        directory = os.path.dirname(filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+            logging.info(f"Created path {directory}")
+        return _LocalWriter(filename)
+
+    def exists(self, filename: str) -> bool:
+        return os.path.exists(filename)
+
+    def put(self, filename: str) -> Dict[str, str]:
+        return {}
+
+
+class NullSink(Sink):
+    name = "null"
+
+    def open(self, filename: str) -> Writer:
+        return Writer()
+
+    def exists(self, filename: str) -> bool:
+        return False
+
+
+# part uploads of the s3 sinks run here, so the download (and the other destinations of a
+# '--copy-to' fan-out) continue while a part is sent; each file has at most one part in flight
+_part_uploads = ThreadPoolExecutor(max_workers=Config.S3_UPLOAD_THREADS, thread_name_prefix="s3")
+
+
+class _S3Writer(Writer):
+    def __init__(self, client: Any, bucket: str, key: str) -> None:
+        super().__init__()
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.buffer = bytearray()
+        self.upload_id: Optional[str] = None
+        self.parts: List[Dict[str, Any]] = []
+        self.pending: Optional["Future[Dict[str, Any]]"] = None
+
+    def _write(self, data: bytes) -> None:
+        self.buffer += data
+        if len(self.buffer) >= Config.S3_PART_SIZE:
+            self._upload_part()
+
+    def _upload_part(self) -> None:
+        if self.upload_id is None:
+            self.upload_id = self.client.s3_client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, ChecksumAlgorithm="SHA256"
+            )["UploadId"]
+        body = bytes(self.buffer)
+        self.buffer.clear()
+        self._wait()
+        self.pending = _part_uploads.submit(self._send_part, len(self.parts) + 1, body)
+
+    def _send_part(self, part_number: int, body: bytes) -> Dict[str, Any]:
+        # '--max-bandwidth' also covers the uploads
+        self.client.bandwidth_limiter.consume(len(body))
+        response = self.client.s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=body,
+            ChecksumAlgorithm="SHA256",
+        )
+        return {
+            "PartNumber": part_number,
+            "ETag": response["ETag"],
+            "ChecksumSHA256": response.get("ChecksumSHA256"),
+        }
+
+    # wait for the part in flight, raising its error
+    def _wait(self) -> None:
+        pending, self.pending = self.pending, None
+        if pending is not None:
+            self.parts.append(pending.result())
+
+    def commit(self) -> None:
+        s3 = self.client.s3_client
+        if self.upload_id is None:
+            # small enough for a single request
+            self.client.bandwidth_limiter.consume(len(self.buffer))
+            s3.put_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Body=bytes(self.buffer),
+                ChecksumAlgorithm="SHA256",
+            )
+        else:
+            if self.buffer:
+                self._upload_part()
+            self._wait()
+            s3.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={"Parts": self.parts},
+            )
+        self.client.count(files_uploaded=1)
+        metrics.S3_UPLOADS.inc(result="uploaded")
+        logging.info(f"Streamed {self.bytes} bytes to s3://{self.bucket}/{self.key}")
+
+    def abort(self) -> None:
+        metrics.S3_UPLOADS.inc(result="failed")
+        if self.pending is not None:
+            self.pending.exception()
+            self.pending = None
+        if self.upload_id is not None:
+            self.client.s3_client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id
+            )
+        self.buffer.clear()
+
+
+class S3Sink(Sink):
+    name = "s3"
+
+    # the client's S3 bucket and prefix unless a bucket is given
+    def __init__(self, client: Any, bucket: Optional[str] = None, prefix: str = "") -> None:
+        if bucket is None:
+            if client.s3_bucket is None:
+                raise ValueError("the s3 sink needs an S3 bucket")
+            bucket, prefix = client.s3_bucket, client.s3_prefix
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.objects = (
+            client.s3_objects
+            if client.s3_objects is not None and bucket == client.s3_bucket
+            else S3ObjectIndex(bucket=bucket)
+        )
+
+    def open(self, filename: str) -> Writer:
+        return _S3Writer(self.client, self.bucket, self.key(filename))
+
+    # the file's path relative to the destination directory, below the prefix (like
+    # s3_key_for)
+    def key(self, filename: str) -> str:
+        relative_path = os.path.relpath(filename, self.client.destination_path)
+        return f"{self.prefix}/{relative_path}" if self.prefix else relative_path
+
+    def exists(self, filename: str) -> bool:
+        return bool(self.objects.size(self.client, self.key(filename)))
+
+
+class _TarWriter(Writer):
+    def __init__(self, sink: "TarSink", filename: str) -> None:
+        super().__init__()
+        self.sink = sink
+        self.filename = filename
+        # buffered until the file is complete: a tar member's size precedes its data
+        self.spool: BinaryIO = tempfile.SpooledTemporaryFile(  # type: ignore[assignment]
+            max_size=Config.TAR_SPOOL_SIZE
+        )
+
+    def _write(self, data: bytes) -> None:
+        self.spool.write(data)
+
+    def commit(self) -> None:
+        self.spool.seek(0)
+        self.sink.add(self.filename, self.spool, self.bytes)
+        self.spool.close()
+
+    def abort(self) -> None:
+        self.spool.close()
+
+
+class TarSink(Sink):
+    name = "tar"
+
+    def __init__(self, destination_path: str) -> None:
+        self.destination_path = destination_path
+        self._archives: Dict[str, tarfile.TarFile] = {}
+        self._members: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    # "<dest>/2024/01/02/Front Door/Front Door - 2024-01-02 - 03.00.00+0100.mp4"
+    #   -> ("<dest>/2024-01-02.tar", "2024/01/02/Front Door/Front Door - ...")
+    def locate(self, filename: str) -> Tuple[str, str]:
+        member = os.path.relpath(filename, self.destination_path)
+        match = _DAY_PATTERN.search(os.path.basename(filename))
+        day = match.group(0) if match else "undated"
+        return os.path.join(self.destination_path, f"{day}.tar"), member
+
+    def _archive(self, archive_filename: str) -> tarfile.TarFile:
+        # called with the lock held
+        archive = self._archives.get(archive_filename)
+        if archive is None:
+            os.makedirs(os.path.dirname(archive_filename), exist_ok=True)
+            archive = self._archives[archive_filename] = tarfile.open(archive_filename, "a")
+            self._members[archive_filename] = set(archive.getnames())
+        return archive
+
+    def open(self, filename: str) -> Writer:
+        return _TarWriter(self, filename)
+
+    def add(self, filename: str, fp: BinaryIO, size: int) -> None:
+        archive_filename, member = self.locate(filename)
+        info = tarfile.TarInfo(member)
+        info.size = size
+        info.mtime = int(time.time())
+        with self._lock:
+            archive = self._archive(archive_filename)
+            archive.addfile(info, fp)
+            archive.fileobj.flush()  # type: ignore[attr-defined]
+            self._members[archive_filename].add(member)
+
+    def exists(self, filename: str) -> bool:
+        archive_filename, member = self.locate(filename)
+        with self._lock:
+            if archive_filename not in self._archives and not os.path.isfile(archive_filename):
+                return False
+            self._archive(archive_filename)
+            return member in self._members[archive_filename]
+
+    def close(self) -> None:
+        with self._lock:
+            archives, self._archives = self._archives, {}
+            for archive in archives.values():
+                archive.close()
+
+
+class _TeeWriter(Writer):
+    def __init__(self, primary: Writer, copies: Dict[str, Writer]) -> None:
+        super().__init__()
+        self.primary = primary
+        self.writers = copies
+        self.copies = {destination: "failed" for destination in copies}
+
+    def _write(self, data: bytes) -> None:
+        self.primary.write(data)
+        for destination, writer in list(self.writers.items()):
+            try:
+                writer.write(data)
+            except Exception as e:
+                self._fail(destination, e)
+
+    def commit(self) -> None:
+        try:
+            self.primary.commit()
+        except Exception:
+            self.abort()
+            raise
+        for destination, writer in list(self.writers.items()):
+            try:
+                writer.commit()
+                self.copies[destination] = "uploaded"
+            except Exception as e:
+                self._fail(destination, e)
+
+    def abort(self) -> None:
+        self.primary.abort()
+        for destination in list(self.writers):
+            self._fail(destination, None)
+
+    # a failed copy is dropped, the download and the other copies go on
+    def _fail(self, destination: str, error: Optional[Exception]) -> None:
+        writer = self.writers.pop(destination)
+        if error is not None:
+            logging.error(f"Failed to copy to {destination}: {error}")
+        try:
+            writer.abort()
+        except Exception as e:
+            logging.error(f"Failed to abort the copy to {destination}: {e}")
+
+
+class TeeSink(Sink):
+    """Writes every file to a primary sink and to one or more copies ('--copy-to').
+
+    The copies are written while the file is downloaded, so each export is read from the
+    controller once. Errors of the primary sink fail the download as before; a failed copy
+    is only logged and reported in the writer's `copies` statuses.
+    """
+
+    name = "tee"
+
+    def __init__(self, primary: Sink, copies: Dict[str, Sink]) -> None:
+        self.primary = primary
+        self.copies = copies
+        self.local = primary.local
+
+    def open(self, filename: str) -> Writer:
+        return _TeeWriter(
+            self.primary.open(filename),
+            {destination: sink.open(filename) for destination, sink in self.copies.items()},
+        )
+
+    # a file exists once it is in the primary sink and in every copy
+    def exists(self, filename: str) -> bool:
+        return self.primary.exists(filename) and all(
+            sink.exists(filename) for sink in self.copies.values()
+        )
+
+    def put(self, filename: str) -> Dict[str, str]:
+        copies = self.copy_to(filename, list(self.copies))
+        self.primary.put(filename)
+        return copies
+
+    # write the local file `filename` to some of the copies (e.g. those that failed in an
+    # earlier run); returns their statuses
+    def copy_to(self, filename: str, destinations: List[str]) -> Dict[str, str]:
+        copies = {}
+        for destination in destinations:
+            try:
+                self.copies[destination].copy(filename)
+                copies[destination] = "uploaded"
+            except Exception as e:
+                logging.error(f"Failed to copy {filename} to {destination}: {e}")
+                copies[destination] = "failed"
+        return copies
+
+    def close(self) -> None:
+        self.primary.close()
+        for sink in self.copies.values():
+            sink.close()
+
+
+# "s3://bucket/prefix" -> ("bucket", "prefix")
+def parse_s3_url(url: str) -> Tuple[str, str]:
+    match = re.match(r"^s3://([^/]+)/?(.*)$", url)
+    if not match:
+        raise ValueError(f"'{url}' is not an S3 URL like s3://bucket/prefix")
+    return match.group(1), match.group(2).strip("/")
+
+
+def create_sink(client: Any, kind: str) -> Sink:
+    sink: Sink
+    if kind == "s3":
+        sink = S3Sink(client)
+    elif kind == "tar":
+        sink = TarSink(client.destination_path)
+    elif kind == "null":
+        sink = NullSink()
+    else:
+        sink = LocalSink()
+
+    if client.copy_to:
+        return TeeSink(
+            sink,
+            {url: S3Sink(client, *parse_s3_url(url)) for url in client.copy_to},
+        )
+    return sink
@@ -0,0 +1,303 @@
+# archive several Protect controllers ("sites") from one process
+#
+# The sites are described in a JSON config file:
+#
+#   {
+#     "destination": "/archive",
+#     "max_bandwidth": "08:00-18:00=5,40",
+#     "status_csv_dir": "/archive/status",
+#     "min_throughput": 0.5, "stall_window": 60,
+#     "s3": {"bucket": "...", "prefix": "...", "region": "...",
+#            "aws_access_key_id": "...", "aws_secret_access_key": "..."},
+#     "controllers": [
+#       {"name": "hq", "address": "10.0.0.1", "username": "archiver",
+#        "password_env": "HQ_PASSWORD", "cameras": ["id_1", "id_2"],
+#        "destination_prefix": "hq", "concurrency": 2},
+#       ...
+#     ]
+#   }
+#
+# Only "destination" and, per controller, "name", "address", "username" and "password" (or
+# "password_env", the name of an environment variable holding it) are required. Every
+# controller also accepts "port", "not_unifi_os" and "verify_ssl".
+#
+# Each site gets its own ProtectClient and `concurrency` download workers, so a slow or
+# unreachable controller never holds up the others. All workers share one bandwidth budget
+# ("max_bandwidth" in MB/s, optionally by time of day like '--max-bandwidth'), one boto3
+# client for the S3 uploads and the process' metrics.
+# Footage of a site goes to <destination>/<destination_prefix> (the site name by default),
+# its status CSVs to a subdirectory of "status_csv_dir" named after the site.
+# "min_throughput" and "stall_window" enable the stall watchdog like '--min-throughput'.
+# "local_cache_size" (GB, per site) keeps uploaded files locally like '--local-cache-size'.
+import logging
+import os
+import queue
+import threading
+
+from dataclasses import dataclass
+from dataclasses import field
+from datetime import datetime
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from protect_archiver import json_codec
+from protect_archiver import metrics
+from protect_archiver.bandwidth import BandwidthSchedule
+from protect_archiver.bandwidth import TokenBucket
+from protect_archiver.client import ProtectClient
+from protect_archiver.config import Config
+from protect_archiver.dataclasses import Camera
+from protect_archiver.downloader import Downloader
+from protect_archiver.errors import ProtectError
+from protect_archiver.profiling import profile_thread
+from protect_archiver.sync import Watermark
+from protect_archiver.sync import read_state
+from protect_archiver.sync import sync_start
+from protect_archiver.sync import write_state
+from protect_archiver.utils import print_download_stats
+
+
+@dataclass
+class Site:
+    name: str
+    address: str
+    username: str
+    password: str
+    port: int = Config.PORT
+    not_unifi_os: bool = False
+    verify_ssl: bool = False
+    # camera IDs to archive, all cameras if empty
+    cameras: List[str] = field(default_factory=list)
+    destination_prefix: str = ""
+    concurrency: int = Config.SITE_CONCURRENCY
+
+
+# read the sites config file, returns the global settings and the sites.
+# Raises ValueError if the file is incomplete.
+def load_sites_config(filepath: str) -> Tuple[Dict[str, Any], List[Site]]:
+    with open(filepath, "rb") as fp:
+        config = json_codec.load(fp)
+
+    if not config.get("destination"):
+        raise ValueError("'destination' is missing")
+    if not config.get("controllers"):
+        raise ValueError("no 'controllers' are configured")
+    if config.get("max_bandwidth"):
+        BandwidthSchedule(str(config["max_bandwidth"]))
+
+    sites = []
+    for index, controller in enumerate(config["controllers"]):
+        controller = dict(controller)
+        password_env = controller.pop("password_env", None)
+        if password_env:
+            controller["password"] = os.environ.get(password_env)
+        for key in ("name", "address", "username", "password"):
+            if not controller.get(key):
+                raise ValueError(f"controller #{index + 1}: '{key}' is missing")
+        cameras = controller.get("cameras", [])
+        controller["cameras"] = [] if cameras == "all" else list(cameras)
+        try:
+            sites.append(Site(**controller))
+        except TypeError as e:
+            raise ValueError(f"controller #{index + 1}: {e}")
+
+    names = [site.name for site in sites]
+    if len(set(names)) != len(names):
+        raise ValueError("controller names must be unique")
+
+    return config, sites
+
+
+class SiteArchiver:
+    def __init__(
+        self,
+        site: Site,
+        client: ProtectClient,
+        start: Optional[datetime],
+        end: Optional[datetime],
+    ) -> None:
+        self.site = site
+        self.client = client
+        # without a range, each camera is synced from where the site's sync state left off
+        self.start = start
+        self.end = end
+        self.statefile = os.path.join(client.destination_path, "sync.state")
+        self.failed = False
+
+        self._units: "queue.Queue[Tuple[Camera, int, datetime, datetime]]" = queue.Queue()
+        self._progress: Dict[str, Watermark] = {}
+        self._state: Dict[str, Any] = {"cameras": {}}
+        self._state_lock = threading.Lock()
+
+    def run(self) -> None:
+        try:
+            self.plan()
+            workers = [
+                threading.Thread(target=profile_thread(self.work), name=f"{self.site.name}-{index}")
+                for index in range(max(1, self.site.concurrency))
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            # units left behind by a stopped site
+            metrics.QUEUE_DEPTH.dec(self._units.qsize(), queue="intervals")
+        except Exception:
+            logging.exception(f"[{self.site.name}] Failed to archive site")
+            self.failed = True
+        finally:
+            if self.client.status_tracker is not None:
+                self.client.status_tracker.close()
+
+    # queue the camera x interval units of the site, ordered by time so that all cameras
+    # make progress at the same pace
+    def plan(self) -> None:
+        camera_list = self.client.get_camera_list()
+        if self.site.cameras:
+            camera_list = [camera for camera in camera_list if camera.id in self.site.cameras]
+
+        if self.start is None:
+            self._state = read_state(self.statefile)
+        end = self.end or datetime.now().replace(minute=0, second=0, microsecond=0)
+
+        units = []
+        for camera in camera_list:
+            start = self.start or sync_start(
+                camera, self._state["cameras"].setdefault(camera.id, {})
+            )
+            intervals = Downloader.plan_footage_intervals(self.client, camera, start, end)
+            self._progress[camera.id] = Watermark([interval_end for _, interval_end in intervals])
+            for index, (interval_start, interval_end) in enumerate(intervals):
+                units.append((interval_start, camera.id, camera, index, interval_end))
+
+        # cameras that keep stalling go last (see watchdog.StallTracker)
+        tracker = self.client.stall_tracker
+        units.sort(
+            key=lambda unit: (
+                tracker is not None and tracker.is_slow(unit[2].name),
+                unit[0],
+                unit[1],
+            )
+        )
+        for interval_start, _camera_id, camera, index, interval_end in units:
+            self._units.put((camera, index, interval_start, interval_end))
+        metrics.QUEUE_DEPTH.inc(len(units), queue="intervals")
+        logging.info(
+            f"[{self.site.name}] Archiving {len(units)} interval(s) of {len(camera_list)}"
+            f" camera(s) with {self.site.concurrency} worker(s)"
+        )
+
+    def work(self) -> None:
+        while not self.failed:
+            try:
+                camera, index, interval_start, interval_end = self._units.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                Downloader.download_footage_interval(
+                    self.client, camera, interval_start, interval_end
+                )
+                self.complete(camera, index)
+            except ProtectError as e:
+                # a failed download without '--ignore-failed-downloads': stop the site
+                logging.error(f"[{self.site.name}] Stopping after error code {e.code}")
+                self.failed = True
+            except Exception:
+                logging.exception(
+                    f"[{self.site.name}] Failed to download {camera.name} {interval_start}"
+                )
+            finally:
+                metrics.QUEUE_DEPTH.dec(queue="intervals")
+
+    def complete(self, camera: Camera, index: int) -> None:
+        if self.start is not None:
+            return
+        with self._state_lock:
+            last = self._progress[camera.id].complete(index)
+            if last is not None:
+                self._state["cameras"][camera.id] = {"last": last, "name": camera.name}
+                write_state(self.statefile, self._state)
+
+
+# archive all sites concurrently; returns the names of the sites that failed
+def archive_sites(
+    config: Dict[str, Any],
+    sites: List[Site],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    ignore_failed_downloads: bool = Config.IGNORE_FAILED_DOWNLOADS,
+    skip_existing_files: bool = Config.SKIP_EXISTING_FILES,
+) -> List[str]:
+    bandwidth_limiter = TokenBucket(
+        schedule=(
+            BandwidthSchedule(str(config["max_bandwidth"])) if config.get("max_bandwidth") else None
+        )
+    )
+
+    s3 = config.get("s3") or {}
+    s3_client = None
+    if s3.get("bucket"):
+        import boto3
+
+        from botocore.config import Config as BotoConfig
+
+        kwargs: Dict[str, Any] = {"region_name": s3.get("region", Config.S3_REGION)}
+        if s3.get("aws_access_key_id") and s3.get("aws_secret_access_key"):
+            kwargs["aws_access_key_id"] = s3["aws_access_key_id"]
+            kwargs["aws_secret_access_key"] = s3["aws_secret_access_key"]
+        # one connection per download worker, all of them may upload at the same time
+        pool_size = max(10, sum(max(1, site.concurrency) for site in sites))
+        s3_client = boto3.client("s3", config=BotoConfig(max_pool_connections=pool_size), **kwargs)
+
+    archivers = []
+    for site in sites:
+        destination_path = os.path.join(config["destination"], site.destination_prefix or site.name)
+        os.makedirs(destination_path, exist_ok=True)
+        client = ProtectClient(
+            address=site.address,
+            port=site.port,
+            not_unifi_os=site.not_unifi_os,
+            username=site.username,
+            password=site.password,
+            verify_ssl=site.verify_ssl,
+            destination_path=destination_path,
+            use_subfolders=True,
+            ignore_failed_downloads=ignore_failed_downloads,
+            skip_existing_files=skip_existing_files,
+            s3_bucket=s3.get("bucket"),
+            # keep the sites apart in the bucket as well
+            s3_prefix="/".join(
+                part
+                for part in (s3.get("prefix", ""), site.destination_prefix or site.name)
+                if part
+            ),
+            s3_client=s3_client,
+            local_cache_size=config.get("local_cache_size"),
+            min_throughput=config.get("min_throughput"),
+            stall_window=config.get("stall_window", Config.STALL_WINDOW),
+            status_csv_dir=(
+                os.path.join(config["status_csv_dir"], site.name)
+                if config.get("status_csv_dir")
+                else None
+            ),
+        )
+        client.bandwidth_limiter = bandwidth_limiter
+        archivers.append(SiteArchiver(site, client, start, end))
+
+    threads = [
+        threading.Thread(target=profile_thread(archiver.run), name=archiver.site.name)
+        for archiver in archivers
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for archiver in archivers:
+        print(f"[{archiver.site.name}] ", end="")
+        print_download_stats(archiver.client)
+
+    return [archiver.site.name for archiver in archivers if archiver.failed]
@@ -1,15 +1,70 @@
+import atexit
 import csv
 import logging
 import os
+import queue
+import re
+import threading
+import time
 
+from collections import OrderedDict
 from datetime import datetime
+from typing import IO
+from typing import Any
 from typing import Dict
 from typing import List
 from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from protect_archiver import metrics
+from protect_archiver.config import Config
+from protect_archiver.dataclasses import DownloadStats
+
+
+SUMMARY_PERCENTILES = (50, 95, 99)
+
+# daily status CSVs: YYYY_MM_DD.csv, or YYYY_MM_DD.shard-<i>-of-<N>.csv for a '--shard' run
+STATUS_CSV_PATTERN = re.compile(r"^(\d{4}_\d{2}_\d{2})(\.shard-\d+-of-\d+)?\.csv$")
+
+
+# status column of a '--copy-to' destination
+def copy_status_column(destination: str) -> str:
+    return f"upload_status:{destination}"
+
+
+# linear interpolation between the closest ranks of the sorted values
+def percentile(sorted_values: Sequence[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * p / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+class _DayFile:
+    """Append handle of one day's status CSV, owned by the writer thread."""
+
+    def __init__(self, filepath: str, fieldnames: List[str]) -> None:
+        self.filepath = filepath
+        self.fp: IO[str] = open(filepath, "a", newline="")
+        self.writer = csv.DictWriter(self.fp, fieldnames=fieldnames, restval="")
+        self.rows = 0
+
+    def sync(self) -> None:
+        self.fp.flush()
+        os.fsync(self.fp.fileno())
 
 
 class StatusTracker:
-    """Tracks download/upload status per file and writes daily CSV reports."""
+    """Tracks download/upload status per file and writes daily CSV reports.
+
+    Records are handed to a single writer thread through a bounded queue, so the tracker
+    can be used from several download threads at once. The writer appends to one open,
+    buffered file per day, flushes every `flush_rows` rows or `flush_interval` seconds and
+    fsyncs a day's file when rows for another day arrive and on flush_day()/flush_all().
+    """
 
     FIELDNAMES = [
         "camera",
@@ -18,16 +73,62 @@ class StatusTracker:
         "filename",
         "download_status",
         "upload_status",
+        "bytes",
+        "ttfb_seconds",
+        "transfer_seconds",
+        "throughput_mb_per_second",
+        "retries",
+        "upload_seconds",
     ]
 
-    def __init__(self, csv_dir: str) -> None:
+    SUMMARY_FIELDNAMES = ["group", "key", "downloads"] + [
+        f"{metric}_p{p}"
+        for metric in ("ttfb_seconds", "transfer_seconds", "throughput_mb_per_second")
+        for p in SUMMARY_PERCENTILES
+    ]
+
+    def __init__(
+        self,
+        csv_dir: str,
+        flush_rows: int = Config.STATUS_FLUSH_ROWS,
+        flush_interval: float = Config.STATUS_FLUSH_INTERVAL,
+        file_suffix: str = "",
+        # '--copy-to' destinations, each gets an upload status column
+        destinations: Sequence[str] = (),
+        # collect the download timings for write_summary() ('--status-summary')
+        summary: bool = Config.STATUS_SUMMARY,
+    ) -> None:
         self.csv_dir = os.path.abspath(csv_dir)
-        self._records: Dict[str, List[Dict[str, str]]] = {}
+        self.fieldnames = self.FIELDNAMES + [copy_status_column(d) for d in destinations]
+        # inserted before '.csv', so that the nodes of a sharded run never share a file
+        self.file_suffix = file_suffix
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.summary = summary
+        # (camera, hour of day, ttfb, transfer seconds, MB/s) of every download, for the
+        # summary; one tuple per download, so only kept if a summary is going to be written
+        self._timings: List[Tuple[str, int, float, float, float]] = []
+        self._timings_lock = threading.Lock()
+
+        # rows and flush commands for the writer thread; bounded so that producers wait
+        # for the disk instead of piling up rows in memory
+        self._queue: "queue.Queue[Tuple[str, Any, Any]]" = queue.Queue(Config.STATUS_QUEUE_SIZE)
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+
+        # state owned by the writer thread: open files by day (least recently used first)
+        self._files: "OrderedDict[str, _DayFile]" = OrderedDict()
+        self._current_day: Optional[str] = None
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
 
         if not os.path.isdir(self.csv_dir):
             os.makedirs(self.csv_dir, exist_ok=True)
             logging.info(f"Created status CSV directory {self.csv_dir}")
 
+        # rows still queued when the interpreter exits are written out
+        atexit.register(self.close)
+
     def add_record(
         self,
         camera_name: str,
@@ -36,40 +137,247 @@ class StatusTracker:
         filename: str,
         download_status: str,
         upload_status: str,
+        stats: Optional[DownloadStats] = None,
     ) -> None:
-        date_str = interval_start.strftime("%Y_%m_%d")
-        if date_str not in self._records:
-            self._records[date_str] = []
-
-        self._records[date_str].append(
-            {
-                "camera": camera_name,
-                "interval_start": interval_start.strftime("%Y-%m-%d %H:%M:%S"),
-                "interval_end": interval_end.strftime("%Y-%m-%d %H:%M:%S"),
-                "filename": filename,
-                "download_status": download_status,
-                "upload_status": upload_status,
-            }
-        )
+        record = {
+            "camera": camera_name,
+            "interval_start": interval_start.strftime("%Y-%m-%d %H:%M:%S"),
+            "interval_end": interval_end.strftime("%Y-%m-%d %H:%M:%S"),
+            "filename": filename,
+            "download_status": download_status,
+            "upload_status": upload_status,
+        }
+        if stats is not None:
+            throughput = stats.throughput / 2**20
+            record.update(self.format_stats(stats))
+            for destination, status in stats.copies.items():
+                record[copy_status_column(destination)] = status
+            if self.summary and download_status == "downloaded":
+                with self._timings_lock:
+                    self._timings.append(
+                        (
+                            camera_name,
+                            interval_start.hour,
+                            stats.ttfb,
+                            stats.transfer_seconds,
+                            throughput,
+                        )
+                    )
+
+        self._ensure_writer()
+        self._queue.put(("row", interval_start.strftime("%Y_%m_%d"), record))
+        metrics.QUEUE_DEPTH.set(self._queue.qsize(), queue="status_rows")
+
+    @staticmethod
+    def format_stats(stats: DownloadStats) -> Dict[str, str]:
+        """Return the timing columns of a status row."""
+        return {
+            "bytes": str(stats.bytes),
+            "ttfb_seconds": f"{stats.ttfb:.3f}",
+            "transfer_seconds": f"{stats.transfer_seconds:.3f}",
+            "throughput_mb_per_second": f"{stats.throughput / 2**20:.3f}",
+            "retries": str(stats.retries),
+            "upload_seconds": f"{stats.upload_seconds:.3f}",
+        }
 
     def flush_day(self, date_str: str) -> None:
-        """Write buffered records for the given day to a CSV file and clear the buffer."""
-        if date_str not in self._records:
-            return
+        """Write all queued records for the given day to disk (fsynced) and close its file."""
+        self._call("flush_day", date_str)
+
+    def flush_all(self) -> None:
+        """Write all queued records to disk (fsynced) and close all files."""
+        self._call("flush_all")
+
+    def close(self) -> None:
+        """Flush everything and stop the writer thread (restarted by the next record)."""
+        with self._writer_lock:
+            writer = self._writer
+        if writer is not None and writer.is_alive():
+            self._call("close")
+            writer.join()
 
-        records = self._records.pop(date_str)
-        filepath = os.path.join(self.csv_dir, f"{date_str}.csv")
+    def _ensure_writer(self) -> None:
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run, name="status-writer", daemon=True)
+                self._writer.start()
+
+    # queue a command for the writer thread and wait until it has been carried out
+    def _call(self, command: str, date_str: Optional[str] = None) -> None:
+        self._ensure_writer()
+        done = threading.Event()
+        self._queue.put((command, date_str, done))
+        done.wait()
+
+    def _run(self) -> None:
+        while True:
+            # wake up in time for the next interval flush if rows are waiting in the buffer
+            timeout = (
+                max(self._last_flush + self.flush_interval - time.monotonic(), 0)
+                if self._unflushed
+                else None
+            )
+            try:
+                command, date_str, payload = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._flush_buffers()
+                continue
+
+            try:
+                if command == "row":
+                    self._write(date_str, payload)
+                elif command == "flush_day":
+                    self._close_day(date_str)
+                else:
+                    for open_day in list(self._files):
+                        self._close_day(open_day)
+            except Exception:
+                logging.exception("Failed to write status records")
+            finally:
+                metrics.QUEUE_DEPTH.set(self._queue.qsize(), queue="status_rows")
+                if command != "row":
+                    payload.set()
+
+            if command == "close":
+                return
+
+    def _write(self, date_str: str, record: Dict[str, str]) -> None:
+        # make the previous day durable as soon as rows for another day come in
+        if self._current_day not in (None, date_str) and self._current_day in self._files:
+            self._files[self._current_day].sync()
+        self._current_day = date_str
+
+        day_file = self._open_day(date_str)
+        day_file.writer.writerow(record)
+        day_file.rows += 1
+        self._unflushed += 1
+        if self._unflushed >= self.flush_rows:
+            self._flush_buffers()
+
+    def _open_day(self, date_str: str) -> "_DayFile":
+        if date_str in self._files:
+            self._files.move_to_end(date_str)
+            return self._files[date_str]
+
+        if len(self._files) >= Config.STATUS_MAX_OPEN_FILES:
+            self._close_day(next(iter(self._files)))
+
+        filepath = os.path.join(self.csv_dir, f"{date_str}{self.file_suffix}.csv")
         write_header = not os.path.exists(filepath)
+        fieldnames = self.fieldnames if write_header else self._upgrade_header(filepath)
+
+        day_file = _DayFile(filepath, fieldnames)
+        if write_header:
+            day_file.writer.writeheader()
+        self._files[date_str] = day_file
+        return day_file
 
-        with open(filepath, "a", newline="") as fp:
-            writer = csv.DictWriter(fp, fieldnames=self.FIELDNAMES)
-            if write_header:
-                writer.writeheader()
-            writer.writerows(records)
+    def _close_day(self, date_str: Optional[str]) -> None:
+        day_file = self._files.pop(date_str, None) if date_str is not None else None
+        if day_file is None:
+            return
+        day_file.sync()
+        day_file.fp.close()
+        logging.info(f"Wrote {day_file.rows} status records to {day_file.filepath}")
 
-        logging.info(f"Wrote {len(records)} status records to {filepath}")
+    def _flush_buffers(self) -> None:
+        for day_file in self._files.values():
+            day_file.fp.flush()
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
 
-    def flush_all(self) -> None:
-        """Flush all buffered records to their respective CSV files."""
-        for date_str in list(self._records.keys()):
-            self.flush_day(date_str)
+    def _upgrade_header(self, filepath: str) -> List[str]:
+        """Rewrite a CSV file written with fewer columns so that new rows line up; returns
+        the file's columns (including those of other '--copy-to' destinations)."""
+        with open(filepath, newline="") as fp:
+            reader = csv.DictReader(fp)
+            if reader.fieldnames is None:
+                return self.fieldnames
+            fieldnames = self.fieldnames + [
+                name for name in reader.fieldnames if name not in self.fieldnames
+            ]
+            if list(reader.fieldnames) == fieldnames:
+                return fieldnames
+            rows = list(reader)
+
+        write_status_csv(filepath, rows, fieldnames)
+        logging.info(f"Added status columns to {filepath}")
+        return fieldnames
+
+    def write_summary(self) -> Optional[str]:
+        """Write p50/p95/p99 of the download timings recorded in this run, per camera and per
+        hour of day, to summary_<timestamp>.csv and return its path (None if no downloads)."""
+        if not self._timings:
+            return None
+
+        groups: Dict[Tuple[str, str], List[Tuple[float, float, float]]] = {}
+        for camera, hour, ttfb, transfer_seconds, throughput in self._timings:
+            for group_key in (("camera", camera), ("hour", f"{hour:02d}")):
+                groups.setdefault(group_key, []).append((ttfb, transfer_seconds, throughput))
+
+        filepath = os.path.join(
+            self.csv_dir,
+            f"summary_{datetime.now().strftime('%Y_%m_%d_%H%M%S')}{self.file_suffix}.csv",
+        )
+        with open(filepath, "w", newline="") as fp:
+            writer = csv.DictWriter(fp, fieldnames=self.SUMMARY_FIELDNAMES)
+            writer.writeheader()
+            for (group, key), timings in sorted(groups.items()):
+                row = {"group": group, "key": key, "downloads": str(len(timings))}
+                for index, metric in enumerate(
+                    ("ttfb_seconds", "transfer_seconds", "throughput_mb_per_second")
+                ):
+                    values = sorted(timing[index] for timing in timings)
+                    for p in SUMMARY_PERCENTILES:
+                        row[f"{metric}_p{p}"] = f"{percentile(values, p):.3f}"
+                writer.writerow(row)
+
+        logging.info(f"Wrote download timing summary to {filepath}")
+        return filepath
+
+
+# replace a status CSV with the given rows, written to a temporary file first; columns
+# beyond StatusTracker.FIELDNAMES ('--copy-to' statuses) are kept
+def write_status_csv(
+    filepath: str, rows: List[Dict[str, str]], fieldnames: Optional[List[str]] = None
+) -> None:
+    fieldnames = list(fieldnames or StatusTracker.FIELDNAMES)
+    for row in rows:
+        fieldnames += [name for name in row if name not in fieldnames and name is not None]
+
+    tmp_filepath = f"{filepath}.tmp"
+    with open(tmp_filepath, "w", newline="") as fp:
+        writer = csv.DictWriter(fp, fieldnames=fieldnames, restval="", extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(tmp_filepath, filepath)
+
+
+# merge the per-shard status CSVs of a '--shard' run into one YYYY_MM_DD.csv per day
+# (appended to an existing one), sorted by interval start and camera. The shard files are
+# removed once the merged file is in place. Returns the number of merged shard files.
+def merge_shard_csvs(csv_dir: str) -> int:
+    shard_files: Dict[str, List[str]] = {}
+    for name in sorted(os.listdir(csv_dir)):
+        match = STATUS_CSV_PATTERN.match(name)
+        if match and match.group(2):
+            shard_files.setdefault(match.group(1), []).append(os.path.join(csv_dir, name))
+
+    merged = 0
+    for date_str, filepaths in sorted(shard_files.items()):
+        filepath = os.path.join(csv_dir, f"{date_str}.csv")
+        rows: List[Dict[str, str]] = []
+        for source in ([filepath] if os.path.exists(filepath) else []) + filepaths:
+            with open(source, newline="") as fp:
+                rows += list(csv.DictReader(fp))
+        rows.sort(key=lambda row: (row["interval_start"], row["camera"], row["filename"]))
+
+        write_status_csv(filepath, rows)
+        for source in filepaths:
+            os.remove(source)
+        merged += len(filepaths)
+        logging.info(f"Merged {len(filepaths)} shard file(s) into {filepath}")
+
+    return merged
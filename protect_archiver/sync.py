@@ -1,36 +1,89 @@
-import json
 import logging
+import os
+import re
 
 from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
 from os import path
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
 
-import dateutil.parser
-
+from . import json_codec
+from . import metrics
 from .client import ProtectClient
+from .config import Config
+from .dataclasses import Camera
 from .downloader import Downloader
+from .downloader.plan_footage import clamp_to_recording_start
 from .utils import calculate_intervals
+from .utils import in_shard
 from .utils import json_encode
+from .utils import shard_suffix
+
+
+# return the state file name used by the given '--shard', e.g. sync.shard-1-of-4.state
+def shard_statefile(statefile: str, shard: Tuple[int, int]) -> str:
+    root, ext = path.splitext(statefile)
+    return f"{root}.{shard_suffix(shard)}{ext}"
+
+
+def read_state(statefile: str) -> dict:
+    if path.isfile(statefile):
+        with open(statefile, "rb") as fp:
+            state = json_codec.load(fp)
+    else:
+        state = {"cameras": {}}
+
+    return state
+
+
+# written to a temporary file first, so that a shutdown never leaves a truncated state
+def write_state(statefile: str, state: dict) -> None:
+    tmp_statefile = f"{statefile}.tmp"
+    with open(tmp_statefile, "wb") as fp:
+        json_codec.dump(state, fp, default=json_encode)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(tmp_statefile, statefile)
+
+
+# return where to continue syncing a camera: the full hour of the last synced interval, or
+# of the camera's first recording if it has not been synced yet
+def sync_start(camera: Camera, camera_state: dict) -> datetime:
+    import dateutil.parser
+
+    if "last" in camera_state:
+        return dateutil.parser.parse(camera_state["last"]).replace(
+            minute=0, second=0, microsecond=0
+        )
+    return camera.recording_start.replace(minute=0, second=0, microsecond=0)
 
 
 class ProtectSync:
     def __init__(self, client: ProtectClient, destination_path: str, statefile: str) -> None:
         self.client = client
         self.statefile = path.abspath(path.join(destination_path, statefile))
+        # camera name -> number of intervals that expired before they could be archived
+        self.expired: Dict[str, int] = {}
+        # with '--sink null' nothing is archived, the state must not move past the footage
+        self.keep_state = client.sink("footage").name != "null"
 
     def readstate(self) -> dict:
-        if path.isfile(self.statefile):
-            with open(self.statefile) as fp:
-                state = json.load(fp)
-        else:
-            state = {"cameras": {}}
-
-        return state
+        return read_state(self.statefile)
 
     def writestate(self, state: dict) -> None:
-        with open(self.statefile, "w") as fp:
-            json.dump(state, fp, default=json_encode)
+        if self.keep_state:
+            write_state(self.statefile, state)
 
-    def run(self, camera_list: list, ignore_state: bool = False) -> None:
+    def run(
+        self,
+        camera_list: list,
+        ignore_state: bool = False,
+        schedule: str = Config.SYNC_SCHEDULE,
+    ) -> None:
         # noinspection PyUnboundLocalVariable
         logging.info(
             f"Synchronizing video files from 'https://{self.client.address}:{self.client.port}"
@@ -40,33 +93,204 @@ class ProtectSync:
             state = self.readstate()
         else:
             state = {"cameras": {}}
+        if self.client.stall_tracker is not None:
+            camera_list = self.client.stall_tracker.prioritize(camera_list)
+
+        end = datetime.now().replace(minute=0, second=0, microsecond=0)
+        plans = []
         for camera in camera_list:
             try:
-                camera_state = state["cameras"].setdefault(camera.id, {})
-                start = (
-                    dateutil.parser.parse(camera_state["last"]).replace(
-                        minute=0, second=0, microsecond=0
-                    )
-                    if "last" in camera_state
-                    else camera.recording_start.replace(minute=0, second=0, microsecond=0)
+                plans.append((camera, self.plan(camera, state, end)))
+            except Exception:
+                logging.exception(
+                    f"Failed to plan sync of camera {camera.name} - continuing to next device"
                 )
-                end = datetime.now().replace(minute=0, second=0, microsecond=0)
-                for interval_start, interval_end in calculate_intervals(start, end):
-                    Downloader.download_footage(
-                        self.client,
-                        interval_start,
-                        interval_end,
-                        camera,
-                        disable_alignment=False,
-                        disable_splitting=False,
+        self.writestate(state)
+
+        if schedule == "camera":
+            self.sync_by_camera(plans, state, end)
+        else:
+            self.sync_scheduled(plans, state, end, newest_first=schedule == "newest")
+
+        for camera_name, hours in self.expired.items():
+            logging.warning(
+                f"{hours} interval(s) of camera {camera_name} expired on the NVR before they"
+                " could be archived"
+            )
+
+    # return the intervals of a camera to sync up to `end`. Intervals that the NVR's rolling
+    # retention deleted since the last sync (before the camera's recording_start) are
+    # skipped, reported in self.expired and marked as done in the state.
+    def plan(self, camera: Camera, state: dict, end: datetime) -> List[Tuple[datetime, datetime]]:
+        camera_state = state["cameras"].setdefault(camera.id, {})
+        start = sync_start(camera, camera_state)
+        available_from = min(clamp_to_recording_start(camera, start), end)
+        if available_from > start and "last" in camera_state:
+            import dateutil.parser
+
+            # sync restarts at the full hour of the last interval, don't count it twice
+            last = dateutil.parser.parse(str(camera_state["last"]))
+            expired = [
+                interval
+                for interval in calculate_intervals(start, available_from)
+                if interval[1] > last and in_shard(self.client.shard, camera.id, interval[0])
+            ]
+            if expired:
+                self.expired[camera.name] = self.expired.get(camera.name, 0) + len(expired)
+                metrics.EXPIRED_INTERVALS.inc(len(expired), camera=camera.name)
+                state["cameras"][camera.id] = {"last": expired[-1][1], "name": camera.name}
+
+        return Downloader.plan_footage_intervals(self.client, camera, available_from, end)
+
+    # oldest hour first, one camera after the other
+    def sync_by_camera(
+        self,
+        plans: List[Tuple[Camera, List[Tuple[datetime, datetime]]]],
+        state: dict,
+        end: datetime,
+    ) -> None:
+        for camera, intervals in plans:
+            try:
+                for index, (interval_start, interval_end) in enumerate(intervals):
+                    metrics.QUEUE_DEPTH.set(len(intervals) - index, queue="intervals")
+                    Downloader.download_footage_interval(
+                        self.client, camera, interval_start, interval_end
                     )
                     state["cameras"][camera.id] = {
                         "last": interval_end,
                         "name": camera.name,
                     }
+                # a shard only downloads some of the intervals, but all of its intervals
+                # up to the end of the range are done now
+                if self.client.shard is not None:
+                    state["cameras"][camera.id] = {
+                        "last": end - timedelta(milliseconds=1),
+                        "name": camera.name,
+                    }
             except Exception:
                 logging.exception(
                     f"Failed to sync camera {camera.name} - continuing to next device"
                 )
             finally:
+                metrics.QUEUE_DEPTH.set(0, queue="intervals")
+                self.writestate(state)
+
+    # the intervals of all cameras in one queue: by default those closest to expiry (the
+    # least time after the camera's recording_start) first, or the newest first. A camera's
+    # state only moves past intervals that are all done, see Watermark.
+    def sync_scheduled(
+        self,
+        plans: List[Tuple[Camera, List[Tuple[datetime, datetime]]]],
+        state: dict,
+        end: datetime,
+        newest_first: bool = False,
+    ) -> None:
+        units = []
+        watermarks: Dict[str, Watermark] = {}
+        for camera, intervals in plans:
+            watermarks[camera.id] = Watermark([interval_end for _, interval_end in intervals])
+            units += [
+                (camera, index, interval_start, interval_end)
+                for index, (interval_start, interval_end) in enumerate(intervals)
+            ]
+
+        if newest_first:
+            units.sort(key=lambda unit: (-unit[2].timestamp(), unit[0].id))
+        else:
+            units.sort(key=lambda unit: (expiry_headroom(unit[0], unit[2]), unit[0].id))
+
+        failed = set()
+        for position, (camera, index, interval_start, interval_end) in enumerate(units):
+            metrics.QUEUE_DEPTH.set(len(units) - position, queue="intervals")
+            if camera.id in failed:
+                continue
+            try:
+                Downloader.download_footage_interval(
+                    self.client, camera, interval_start, interval_end
+                )
+            except Exception:
+                logging.exception(
+                    f"Failed to sync camera {camera.name} - continuing with the other devices"
+                )
+                failed.add(camera.id)
+                continue
+
+            last = watermarks[camera.id].complete(index)
+            if last is not None:
+                state["cameras"][camera.id] = {"last": last, "name": camera.name}
                 self.writestate(state)
+        metrics.QUEUE_DEPTH.set(0, queue="intervals")
+
+        # see sync_by_camera()
+        if self.client.shard is not None:
+            for camera, _intervals in plans:
+                if camera.id not in failed:
+                    state["cameras"][camera.id] = {
+                        "last": end - timedelta(milliseconds=1),
+                        "name": camera.name,
+                    }
+            self.writestate(state)
+
+
+# time until the NVR's rolling retention reaches an interval, assuming it keeps deleting
+# the camera's oldest footage as fast as it records new footage
+def expiry_headroom(camera: Camera, interval_start: datetime) -> float:
+    if camera.recording_start == datetime.min:
+        return float("inf")
+    # recording_start is a naive UTC datetime (see get_camera_list)
+    return (
+        interval_start.timestamp() - camera.recording_start.replace(tzinfo=timezone.utc).timestamp()
+    )
+
+
+# completion watermark of a camera's intervals: intervals finish out of order when several
+# workers or '--schedule' download them, but the sync state may only move past intervals that
+# are all done
+class Watermark:
+    def __init__(self, interval_ends: List[datetime]) -> None:
+        self.interval_ends = interval_ends
+        self.done = [False] * len(interval_ends)
+        self.next = 0
+
+    # mark an interval as done and return the new watermark, if it moved
+    def complete(self, index: int) -> Optional[datetime]:
+        self.done[index] = True
+        if not self.done[self.next]:
+            return None
+        while self.next < len(self.done) and self.done[self.next]:
+            self.next += 1
+        return self.interval_ends[self.next - 1]
+
+
+# merge the per-shard state files of a sharded sync (and the state file itself, if it
+# exists) into the state file. A camera is only synced up to where all shards got, so its
+# merged 'last' is the earliest one. The shard state files are removed afterwards.
+# Returns the number of merged shard state files.
+def merge_shard_states(destination_path: str, statefile: str) -> int:
+    import dateutil.parser
+
+    root, ext = path.splitext(statefile)
+    pattern = re.compile(rf"^{re.escape(root)}\.shard-\d+-of-\d+{re.escape(ext)}$")
+    shard_files: List[str] = [
+        path.join(destination_path, name)
+        for name in sorted(os.listdir(destination_path))
+        if pattern.match(name)
+    ]
+    if not shard_files:
+        return 0
+
+    target = path.abspath(path.join(destination_path, statefile))
+    merged = read_state(target)
+    for filepath in shard_files:
+        for camera_id, camera_state in read_state(filepath)["cameras"].items():
+            current = merged["cameras"].get(camera_id)
+            if current is None or dateutil.parser.parse(
+                camera_state["last"]
+            ) < dateutil.parser.parse(current["last"]):
+                merged["cameras"][camera_id] = camera_state
+
+    write_state(target, merged)
+    for filepath in shard_files:
+        os.remove(filepath)
+    logging.info(f"Merged {len(shard_files)} shard state file(s) into {target}")
+    return len(shard_files)
@@ -0,0 +1,51 @@
+import threading
+import time
+
+from datetime import datetime
+
+import pytest
+
+from .bandwidth import BandwidthSchedule
+from .bandwidth import TokenBucket
+
+
+def test_schedule() -> None:
+    schedule = BandwidthSchedule("08:00-18:00=5, 22:00-06:00=100, 50")
+
+    assert schedule.rate_at(datetime(2024, 1, 1, 8, 0)) == 5 * 2**20
+    assert schedule.rate_at(datetime(2024, 1, 1, 17, 59)) == 5 * 2**20
+    assert schedule.rate_at(datetime(2024, 1, 1, 18, 0)) == 50 * 2**20
+    assert schedule.rate_at(datetime(2024, 1, 1, 23, 0)) == 100 * 2**20
+    assert schedule.rate_at(datetime(2024, 1, 1, 5, 59)) == 100 * 2**20
+
+    assert BandwidthSchedule("20").rate_at(datetime(2024, 1, 1)) == 20 * 2**20
+    assert BandwidthSchedule("08:00-18:00=5").rate_at(datetime(2024, 1, 1, 20)) is None
+
+
+@pytest.mark.parametrize("value", ["", "0", "fast", "08:00=5", "8-18=5", "08:00-25:00=5"])
+def test_schedule_errors(value: str) -> None:
+    with pytest.raises(ValueError):
+        BandwidthSchedule(value)
+
+
+def test_token_bucket_shared_rate() -> None:
+    bucket = TokenBucket(rate=1_000_000, burst=0)
+
+    def transfer() -> None:
+        for _ in range(10):
+            bucket.consume(10_000)
+
+    # 4 workers x 100 kB at 1 MB/s together take about 0.4 s
+    started = time.monotonic()
+    threads = [threading.Thread(target=transfer) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert 0.35 <= time.monotonic() - started < 1.0
+
+
+def test_token_bucket_unlimited() -> None:
+    started = time.monotonic()
+    TokenBucket().consume(10**12)
+    assert time.monotonic() - started < 0.1
@@ -0,0 +1,31 @@
+import subprocess
+import sys
+
+import click
+import pytest
+
+from .cli.download import check_sink_options
+
+
+def test_help_does_not_import_heavy_dependencies() -> None:
+    code = (
+        "import sys\n"
+        "from protect_archiver.cli import main\n"
+        "sys.argv = ['protect-archiver', 'download', '--help']\n"
+        "try:\n"
+        "    main()\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "heavy = {'boto3', 'botocore', 'PIL', 'dateutil', 'requests'}\n"
+        "print('imported:' + ','.join(sorted(heavy & {m.split('.')[0] for m in sys.modules})))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+
+    assert result.stdout.strip().splitlines()[-1] == "imported:"
+
+
+def test_daily_concat_rejects_shard() -> None:
+    with pytest.raises(click.UsageError, match="--shard"):
+        check_sink_options(None, None, None, None, True, (1, 2), False, False)
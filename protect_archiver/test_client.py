@@ -1,11 +1,15 @@
+import csv
 import os
 
 from datetime import datetime
 from datetime import timezone
 from typing import Any
+from typing import List
 
 import pytest
 
+from protect_archiver import manifest
+from protect_archiver.client import ProtectClient
 from protect_archiver.downloader import Downloader
 
 
@@ -94,3 +98,92 @@ def test_download_footage(
             "e1d02d3942f029bec370e7d12bd62bec347b373c66bccced3a1071fc69cef311"
             "d19e46501c94273a42fb72f694ddbf1fcb22c257970b206e981dab011915aa42"
         )
+
+    # hashed while downloading
+    entry = manifest.lookup(file_name)
+    assert entry is not None
+    assert entry["size"] == 320
+    assert entry["sha256"] == manifest.file_sha256(file_name)
+    assert entry["query"].startswith("/video/export?camera=exteriorCameraId")
+
+
+def test_client_uses_configured_port(test_output_dest: Any) -> None:
+    client = ProtectClient(destination_path=test_output_dest, password="test", port=8443)
+
+    assert client.session.authority == "https://unifi:8443"
+
+
+def test_retry_failed(
+    responses: Any, client: Any, sample_camera: Any, test_output_dest: Any
+) -> None:
+    # status CSVs store naive local times
+    start = datetime(2020, 1, 8, 23, 0, 0)
+    start_ms = int(start.timestamp() * 1000)
+    responses.add(
+        responses.GET,
+        "https://unifi:443/proxy/protect/api/video/export?camera=exteriorCameraId"
+        f"&start={start_ms}&end={start_ms + 3599999}",
+        body=b"0" * 320,
+        headers={"Content-Type": "video/mp4", "Content-Length": "320"},
+    )
+
+    csv_path = os.path.join(test_output_dest, "2020_01_08.csv")
+    with open(csv_path, "w", newline="") as fp:
+        fp.write("camera,interval_start,interval_end,filename,download_status,upload_status\n")
+        fp.write(
+            "Exterior,2020-01-08 22:00:00,2020-01-08 22:59:59,"
+            "Exterior (raId) - 2020-01-08 - 22.00.00.mp4,downloaded,n/a\n"
+        )
+        fp.write(
+            "Exterior,2020-01-08 23:00:00,2020-01-08 23:59:59,"
+            "Exterior (raId) - 2020-01-08 - 23.00.00.mp4,failed,skipped\n"
+        )
+
+    assert Downloader.retry_failed(client, test_output_dest, [sample_camera]) == (1, 0)
+
+    with open(csv_path, newline="") as fp:
+        rows = list(csv.DictReader(fp))
+    assert [row["download_status"] for row in rows] == ["downloaded", "downloaded"]
+    assert rows[0]["bytes"] == ""
+    assert rows[1]["bytes"] == "320"
+    assert os.path.exists(
+        os.path.join(test_output_dest, "Exterior (raId) - 2020-01-08 - 23.00.00.mp4")
+    )
+
+
+class StubS3:
+    def __init__(self) -> None:
+        self.keys: List[str] = []
+
+    def put_object(self, **kwargs: Any) -> None:
+        self.keys.append(f"s3://{kwargs['Bucket']}/{kwargs['Key']}")
+
+
+def test_retry_failed_copies(sample_camera: Any, test_output_dest: Any) -> None:
+    s3 = StubS3()
+    client = ProtectClient(
+        destination_path=test_output_dest,
+        password="test",
+        copy_to=["s3://offsite/p"],
+        s3_client=s3,
+    )
+    filename = "Exterior (raId) - 2020-01-08 - 23.00.00.mp4"
+    with open(os.path.join(test_output_dest, filename), "wb") as fp:
+        fp.write(b"0" * 320)
+
+    csv_path = os.path.join(test_output_dest, "2020_01_08.csv")
+    with open(csv_path, "w", newline="") as fp:
+        fp.write(
+            "camera,interval_start,interval_end,filename,download_status,upload_status,"
+            "upload_status:s3://offsite/p\n"
+        )
+        fp.write(
+            f"Exterior,2020-01-08 23:00:00,2020-01-08 23:59:59,{filename},downloaded,n/a,failed\n"
+        )
+
+    # only the copy is retried, from the local file
+    assert Downloader.retry_failed(client, test_output_dest, [sample_camera]) == (1, 0)
+    assert s3.keys == [f"s3://offsite/p/{filename}"]
+    with open(csv_path, newline="") as fp:
+        rows = list(csv.DictReader(fp))
+    assert rows[0]["upload_status:s3://offsite/p"] == "uploaded"
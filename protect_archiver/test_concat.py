@@ -0,0 +1,119 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from datetime import datetime
+from typing import Any
+from typing import Callable
+from typing import List
+
+import pytest
+
+from . import concat
+from .concat import DailyConcatenator
+from .concat import concatenate_day
+from .concat import day_chunks
+from .concat import ends_day
+from .concat import ffmpeg_available
+from .config import Config
+
+
+def test_ends_day() -> None:
+    assert ends_day(datetime(2024, 1, 2, 23, 59, 59, 999000))
+    assert not ends_day(datetime(2024, 1, 2, 22, 59, 59, 999000))
+
+
+def test_day_chunks(tmpdir: Any) -> None:
+    for name in (
+        "Front - 2024-01-02 - 01.00.00.mp4",
+        "Front - 2024-01-02 - 00.00.00.mp4",
+        "Front - 2024-01-03 - 00.00.00.mp4",
+        "Front - 2024-01-02.daily.mp4",
+    ):
+        with open(os.path.join(str(tmpdir), name), "wb") as fp:
+            fp.write(b"footage")
+    # touched placeholder
+    open(os.path.join(str(tmpdir), "Front - 2024-01-02 - 02.00.00.mp4"), "wb").close()
+
+    assert [
+        os.path.basename(chunk)
+        for chunk in day_chunks(os.path.join(str(tmpdir), "Front - 2024-01-02"))
+    ] == ["Front - 2024-01-02 - 00.00.00.mp4", "Front - 2024-01-02 - 01.00.00.mp4"]
+
+
+def test_concatenator_queues_finished_days(monkeypatch: Any) -> None:
+    concatenated: List[str] = []
+    monkeypatch.setattr(
+        concat, "concatenate_day", lambda prefix, started: concatenated.append(prefix)
+    )
+
+    concatenator = DailyConcatenator()
+    concatenator.chunk_done("/a/Front - 2024-01-02 - 22.00.00.mp4", datetime(2024, 1, 2, 22, 59))
+    concatenator.chunk_done(
+        "/a/Front - 2024-01-02 - 23.00.00.mp4", datetime(2024, 1, 2, 23, 59, 59, 999000)
+    )
+    # the last hours of 2024-01-03 were not planned: the day is done once the camera moves on
+    concatenator.chunk_done("/a/Front - 2024-01-03 - 05.00.00.mp4", datetime(2024, 1, 3, 5, 59))
+    concatenator.chunk_done("/a/Back - 2024-01-03 - 06.00.00.mp4", datetime(2024, 1, 3, 6, 59))
+    concatenator.chunk_done("/a/Front - 2024-01-04 - 01.00.00.mp4", datetime(2024, 1, 4, 1, 59))
+    # or once the range has reached the end of the day
+    concatenator.range_done("Back", datetime(2024, 1, 3, 12))
+    concatenator.range_done("Front", datetime(2024, 1, 5))
+    concatenator.close()
+
+    assert concatenated == [
+        "/a/Front - 2024-01-02",
+        "/a/Front - 2024-01-03",
+        "/a/Front - 2024-01-04",
+    ]
+
+
+def test_concatenator_cancel_stops_ffmpeg(monkeypatch: Any) -> None:
+    started = threading.Event()
+
+    def concatenate_day(prefix: str, on_start: Callable) -> None:
+        process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"], text=True)
+        on_start(process)
+        started.set()
+        process.wait()
+        raise subprocess.CalledProcessError(process.returncode, process.args)
+
+    monkeypatch.setattr(concat, "concatenate_day", concatenate_day)
+
+    concatenator = DailyConcatenator()
+    concatenator.submit("/a/Front - 2024-01-02")
+    assert started.wait(10)
+    concatenator.cancel()
+    begin = time.monotonic()
+    concatenator.close()
+    assert time.monotonic() - begin < 10
+
+
+@pytest.mark.skipif(not ffmpeg_available(), reason="ffmpeg is not installed")
+def test_concatenate_day(tmpdir: Any) -> None:
+    from . import json_codec
+
+    for hour in range(2):
+        subprocess.run(
+            [
+                Config.FFMPEG,
+                "-loglevel",
+                "error",
+                "-f",
+                "lavfi",
+                "-i",
+                "testsrc=duration=2:size=64x64:rate=10",
+                os.path.join(str(tmpdir), f"Front - 2024-01-02 - {hour:02}.00.00.mp4"),
+            ],
+            check=True,
+        )
+
+    daily_filename = concatenate_day(os.path.join(str(tmpdir), "Front - 2024-01-02"))
+
+    assert daily_filename is not None and os.path.getsize(daily_filename) > 0
+    with open(os.path.join(str(tmpdir), "Front - 2024-01-02.daily.json"), "rb") as fp:
+        index = json_codec.load(fp)
+    assert [chunk["offset"] for chunk in index["chunks"]] == [0.0, 2.0]
+    assert not [name for name in os.listdir(str(tmpdir)) if name.endswith((".tmp", ".txt"))]
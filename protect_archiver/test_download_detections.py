@@ -0,0 +1,59 @@
+from datetime import datetime
+from datetime import timezone
+from typing import Any
+
+from .dataclasses import Camera
+from .downloader.download_detections import build_detection_index
+
+
+class StubClient:
+    use_subfolders = False
+    use_utc_filenames = False
+
+    def __init__(self, destination_path: str) -> None:
+        self.destination_path = destination_path
+
+
+def ms(moment: datetime) -> int:
+    return int(moment.timestamp() * 1000)
+
+
+def test_build_detection_index(tmpdir: Any) -> None:
+    camera = Camera(id="cameraabcd", name="Front", recording_start=datetime.min)
+    # the range starts mid-hour, so does its first chunk
+    start = datetime(2024, 1, 2, 9, 15)
+    end = datetime(2024, 1, 3)
+    detections = [
+        {"id": "before", "start": ms(datetime(2024, 1, 2, 9, 0))},
+        {"id": "first", "start": ms(datetime(2024, 1, 2, 9, 20))},
+        {"id": "later", "start": ms(datetime(2024, 1, 2, 10, 30, 15, 500000))},
+    ]
+
+    index = build_detection_index(StubClient(str(tmpdir)), camera, start, end, detections)
+
+    assert index["chunks"][:2] == [
+        "Front (abcd) - 2024-01-02 - 09.15.00.mp4",
+        "Front (abcd) - 2024-01-02 - 10.00.00.mp4",
+    ]
+    assert index["detections"] == {
+        "before": {"filename": "Front (abcd) - 2024-01-02 - 09.15.00.mp4", "offset": 0},
+        "first": {"filename": "Front (abcd) - 2024-01-02 - 09.15.00.mp4", "offset": 300.0},
+        "later": {"filename": "Front (abcd) - 2024-01-02 - 10.00.00.mp4", "offset": 1815.5},
+    }
+
+
+def test_build_detection_index_utc_filenames(tmpdir: Any) -> None:
+    client = StubClient(str(tmpdir))
+    client.use_utc_filenames = True
+    camera = Camera(id="cameraabcd", name="Front", recording_start=datetime.min)
+    start = datetime(2024, 1, 2, tzinfo=timezone.utc)
+    detection = {"id": "a", "start": ms(datetime(2024, 1, 2, 5, 1, tzinfo=timezone.utc))}
+
+    index = build_detection_index(
+        client, camera, start, datetime(2024, 1, 3, tzinfo=timezone.utc), [detection]
+    )
+
+    assert index["detections"]["a"] == {
+        "filename": "Front (abcd) - 2024-01-02 - 05.00.00+0000.mp4",
+        "offset": 60.0,
+    }
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+from .dataclasses import Camera
+from .event_batch import EventBatch
+
+
+DETECTIONS = [
+    {
+        "id": "e1",
+        "camera": "camA",
+        "start": 3000,
+        "end": 4000,
+        "score": 10,
+        "thumbnail": "t1",
+        "heatmap": "h1",
+    },
+    {
+        "id": "e2",
+        "camera": "camB",
+        "start": 1000,
+        "end": 2000,
+        "score": 20,
+        "thumbnail": "t2",
+        "heatmap": "h2",
+    },
+    {
+        "id": "e3",
+        "camera": "camA",
+        "start": 2000,
+        "end": 2500,
+        "score": 30,
+        "thumbnail": "t3",
+        "heatmap": "h3",
+    },
+]
+
+
+def test_models_are_slotted() -> None:
+    camera = Camera(id="camA", name="A", recording_start=datetime.min)
+
+    assert not hasattr(camera, "__dict__")
+    assert camera["name"] == "A"
+
+
+def test_event_batch_interns_camera_ids() -> None:
+    batch = EventBatch.from_detections(DETECTIONS)
+
+    assert len(batch) == 3
+    assert batch.camera_ids == ["camA", "camB"]
+    assert list(batch.cameras) == [0, 1, 0]
+    assert list(batch.starts) == [3000, 1000, 2000]
+
+
+def test_event_batch_filter_sort_group() -> None:
+    batch = EventBatch.from_detections(DETECTIONS)
+
+    assert [r["id"] for r in batch.filter_cameras({"camA"}).records] == ["e1", "e3"]
+    assert [r["id"] for r in batch.sorted_by_start().records] == ["e2", "e3", "e1"]
+    assert [r["id"] for r in batch.filter_range(1500, 2100).records] == ["e2", "e3"]
+
+    groups = batch.group_by_camera()
+    assert sorted(groups) == ["camA", "camB"]
+    assert [r["id"] for r in groups["camA"].records] == ["e1", "e3"]
+
+
+def test_event_batch_materializes_motion_events() -> None:
+    events = list(EventBatch.from_detections(DETECTIONS).sorted_by_start())
+
+    assert [e.id for e in events] == ["e2", "e3", "e1"]
+    assert events[0].camera_id == "camB"
+    assert events[0].start == datetime.fromtimestamp(1)
+    assert events[0].heatmap_id == "h2"
@@ -0,0 +1,47 @@
+import io
+import json
+
+from typing import Any
+
+import pytest
+
+from . import json_codec
+
+
+DETECTIONS = [
+    {"id": "e1", "camera": "camA", "start": 1000, "end": 2000, "smartDetectTypes": ["person"]},
+    {"id": "e2", "camera": "camB", "start": 3000, "end": 4000, "metadata": {"text": "a\nb"}},
+]
+
+
+@pytest.fixture(params=list(json_codec.CODECS))
+def codec(request: Any) -> Any:
+    if request.param == json_codec.OrjsonCodec.name and not json_codec.HAS_ORJSON:
+        pytest.skip("orjson is not installed")
+    previous = json_codec.codec.name
+    yield json_codec.use_codec(request.param)
+    json_codec.use_codec(previous)
+
+
+def test_dump_array_matches_stdlib_layout(codec: Any) -> None:
+    fp = io.BytesIO()
+    count = json_codec.dump_array(DETECTIONS, fp, indent=True)
+
+    assert count == 2
+    assert fp.getvalue().decode("utf-8") == json.dumps(DETECTIONS, indent=2)
+
+
+def test_dump_array_empty(codec: Any) -> None:
+    fp = io.BytesIO()
+    json_codec.dump_array([], fp, indent=True)
+
+    assert json.loads(fp.getvalue()) == []
+
+
+def test_roundtrip(codec: Any) -> None:
+    assert json_codec.loads(json_codec.dumps(DETECTIONS)) == DETECTIONS
+
+
+def test_stdlib_codec_escapes_non_ascii() -> None:
+    # same output as the json.dump calls the codec replaced
+    assert json_codec.StdlibJSONCodec().dumps({"name": "Küche"}) == b'{"name":"K\\u00fcche"}'
@@ -0,0 +1,62 @@
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+from .local_cache import LocalCache
+
+
+def write(directory: str, name: str, size: int) -> str:
+    filename = os.path.join(directory, name)
+    with open(filename, "wb") as fp:
+        fp.write(b"0" * size)
+    return filename
+
+
+def test_evicts_least_recently_used(tmpdir: Any) -> None:
+    directory = str(tmpdir)
+    cache = LocalCache(directory, max_bytes=250)
+
+    for name in ("a.mp4", "b.mp4"):
+        cache.add(write(directory, name, 100))
+    # re-uploaded, so b is now the oldest
+    cache.add(os.path.join(directory, "a.mp4"))
+    cache.add(write(directory, "c.mp4", 100))
+
+    assert not os.path.exists(os.path.join(directory, "b.mp4"))
+    assert list(cache.files) == ["a.mp4", "c.mp4"]
+    assert cache.total_bytes == 200
+
+    # the index survives a restart
+    cache = LocalCache(directory, max_bytes=150)
+    assert list(cache.files) == ["a.mp4", "c.mp4"]
+    cache.add(write(directory, "d.mp4", 50))
+    assert sorted(name for name in os.listdir(directory) if name.endswith(".mp4")) == [
+        "c.mp4",
+        "d.mp4",
+    ]
+
+
+def test_touch_keeps_used_files(tmpdir: Any) -> None:
+    directory = str(tmpdir)
+    cache = LocalCache(directory, max_bytes=250)
+
+    for name in ("a.mp4", "b.mp4"):
+        cache.add(write(directory, name, 100))
+    # found in S3 by '--skip-existing-files', so b is now the least recently used
+    cache.touch(os.path.join(directory, "a.mp4"))
+    cache.add(write(directory, "c.mp4", 100))
+
+    assert list(cache.files) == ["a.mp4", "c.mp4"]
+
+
+def add_file(directory: str, name: str) -> None:
+    LocalCache(directory, max_bytes=2**20).add(write(directory, name, 10))
+
+
+def test_concurrent_processes_keep_all_files(tmpdir: Any) -> None:
+    # '--shard' processes sharing the destination update the same index
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        list(executor.map(add_file, [str(tmpdir)] * 16, [f"{i}.mp4" for i in range(16)]))
+
+    assert len(LocalCache(str(tmpdir), max_bytes=2**20).files) == 16
@@ -0,0 +1,134 @@
+import base64
+import hashlib
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any
+
+from . import manifest
+from .dataclasses import DownloadStats
+from .downloader.upload_to_s3 import verify_s3_object
+
+
+class StubS3Client:
+    def __init__(self, head: dict) -> None:
+        self.head = head
+
+    def head_object(self, **kwargs: Any) -> dict:
+        return self.head
+
+
+class StubClient:
+    s3_bucket = "bucket"
+
+    def __init__(self, head: dict) -> None:
+        self.s3_client = StubS3Client(head)
+
+
+def test_manifest_filename() -> None:
+    assert (
+        manifest.manifest_filename("/a/Front - Door - 2024-01-02 - 03.00.00+0100.mp4")
+        == "/a/Front - Door - 2024-01-02.manifest.json"
+    )
+
+
+def test_record_and_lookup(tmpdir: Any) -> None:
+    filename = os.path.join(str(tmpdir), "Front - 2024-01-02 - 03.00.00.mp4")
+    with open(filename, "wb") as fp:
+        fp.write(b"footage")
+    sha256 = hashlib.sha256(b"footage").hexdigest()
+
+    manifest.record_download(
+        filename,
+        datetime(2024, 1, 2, 3),
+        datetime(2024, 1, 2, 3, 59, 59, 999000),
+        "/video/export?camera=a",
+        DownloadStats(bytes=7, sha256=sha256),
+    )
+    manifest.record_upload(filename, "prefix/Front - 2024-01-02 - 03.00.00.mp4")
+
+    assert sorted(os.listdir(str(tmpdir))) == [
+        "Front - 2024-01-02 - 03.00.00.mp4",
+        "Front - 2024-01-02.manifest.json",
+    ]
+    entry = manifest.lookup(filename)
+    assert entry is not None
+    assert entry["interval_start"] == "2024-01-02T03:00:00"
+    assert entry["s3_key"] == "prefix/Front - 2024-01-02 - 03.00.00.mp4"
+    assert manifest.known_sha256(filename) == manifest.file_sha256(filename) == sha256
+
+    # a file that changed size since it was recorded
+    with open(filename, "ab") as fp:
+        fp.write(b"!")
+    assert manifest.known_sha256(filename) is None
+
+
+def record_hour(directory: str, hour: int) -> None:
+    manifest.record_download(
+        os.path.join(directory, f"Front - 2024-01-02 - {hour:02}.00.00.mp4"),
+        datetime(2024, 1, 2, hour),
+        datetime(2024, 1, 2, hour, 59, 59, 999000),
+        "/video/export?camera=a",
+        DownloadStats(bytes=7),
+    )
+
+
+def test_concurrent_processes_keep_all_entries(tmpdir: Any) -> None:
+    # '--shard' processes sharing the destination update the same manifest
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        list(executor.map(record_hour, [str(tmpdir)] * 24, range(24)))
+
+    entries = manifest.read_manifest(
+        manifest.manifest_filename(os.path.join(str(tmpdir), "Front - 2024-01-02 - 00.00.00.mp4"))
+    )["files"]
+    assert len(entries) == 24
+    # the lock file is removed with the lock
+    assert not [name for name in os.listdir(str(tmpdir)) if name.endswith(".lock")]
+
+
+def test_verify_s3_object() -> None:
+    sha256 = hashlib.sha256(b"footage").hexdigest()
+    single_part = base64.b64encode(bytes.fromhex(sha256)).decode()
+
+    assert verify_s3_object(
+        StubClient({"ContentLength": 7, "ChecksumSHA256": single_part}), "key", 7, sha256
+    )
+    assert not verify_s3_object(
+        StubClient({"ContentLength": 8, "ChecksumSHA256": single_part}), "key", 7, sha256
+    )
+    assert not verify_s3_object(
+        StubClient({"ContentLength": 7, "ChecksumSHA256": "AAAA"}), "key", 7, sha256
+    )
+    # multipart: the composite checksum of the parts is compared, if it is known
+    digest = manifest.FileDigest(part_size=3)
+    for chunk in (b"foo", b"tag", b"e"):
+        digest.update(chunk)
+    composite = digest.s3_checksum()
+    parts = [hashlib.sha256(part).digest() for part in (b"foo", b"tag", b"e")]
+    assert composite == base64.b64encode(hashlib.sha256(b"".join(parts)).digest()).decode() + "-3"
+    multipart = StubClient(
+        {"ContentLength": 7, "ChecksumSHA256": composite, "Metadata": {"sha256": sha256}}
+    )
+    assert verify_s3_object(multipart, "key", 7, sha256, composite) is True
+    assert verify_s3_object(multipart, "key", 7, sha256, "AAAA-3") is False
+    assert verify_s3_object(multipart, "key", 7, sha256) is None
+    assert verify_s3_object(StubClient({"ContentLength": 7}), "key", 7, sha256) is None
+
+
+def test_file_digest_parts() -> None:
+    # chunks don't line up with the parts
+    digest = manifest.FileDigest(part_size=4)
+    for chunk in (b"abcdef", b"gh", b"ijklmnop"):
+        digest.update(chunk)
+    parts = [hashlib.sha256(part).digest() for part in (b"abcd", b"efgh", b"ijkl", b"mnop")]
+    assert digest.hexdigest() == hashlib.sha256(b"abcdefghijklmnop").hexdigest()
+    assert digest.s3_checksum().endswith("-4")
+    assert digest.s3_checksum().startswith(
+        base64.b64encode(hashlib.sha256(b"".join(parts)).digest()).decode()
+    )
+
+    # below the part size: a single request, the SHA-256 of the content
+    digest = manifest.FileDigest(part_size=4)
+    digest.update(b"abc")
+    assert digest.s3_checksum() == base64.b64encode(hashlib.sha256(b"abc").digest()).decode()
@@ -0,0 +1,47 @@
+from urllib.request import urlopen
+
+from .metrics import Counter
+from .metrics import Histogram
+from .metrics import start_metrics_server
+
+
+def test_counter_render() -> None:
+    counter = Counter("test_files_total", "Files", ["camera", "result"])
+    counter.inc(camera='Front "Door"', result="downloaded")
+    counter.inc(2, camera="Back", result="failed")
+
+    assert counter.render() == [
+        "# HELP test_files_total Files",
+        "# TYPE test_files_total counter",
+        'test_files_total{camera="Back",result="failed"} 2',
+        'test_files_total{camera="Front \\"Door\\"",result="downloaded"} 1',
+    ]
+
+
+def test_histogram_render() -> None:
+    histogram = Histogram("test_seconds", "Duration", buckets=(1, 5))
+    histogram.observe(0.5)
+    histogram.observe(3)
+    histogram.observe(10)
+
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{le="1"} 1',
+        'test_seconds_bucket{le="5"} 2',
+        'test_seconds_bucket{le="+Inf"} 3',
+        "test_seconds_sum 13.5",
+        "test_seconds_count 3",
+    ]
+
+
+def test_metrics_server() -> None:
+    counter = Counter("test_served_total", "Served")
+    counter.inc()
+    server = start_metrics_server(0, "127.0.0.1")
+    try:
+        with urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            body = response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+
+    assert "test_served_total 1\n" in body
+    assert "# TYPE protect_archiver_download_ttfb_seconds histogram" in body
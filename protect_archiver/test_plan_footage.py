@@ -0,0 +1,104 @@
+from datetime import datetime
+from datetime import timezone
+from typing import Any
+
+from .dataclasses import Camera
+from .downloader.get_camera_list import estimate_bytes_per_second
+from .downloader.plan_footage import clamp_to_recording_start
+from .downloader.plan_footage import estimate_download_plan
+from .downloader.plan_footage import is_covered
+from .downloader.plan_footage import merge_ranges
+from .downloader.plan_footage import plan_footage_intervals
+
+
+def test_merge_ranges() -> None:
+    assert merge_ranges([(5, 7), (1, 3), (2, 4), (8, 9)]) == [(1, 4), (5, 7), (8, 9)]
+
+
+def test_is_covered() -> None:
+    coverage = [(10, 20), (40, 50)]
+
+    assert is_covered(coverage, 0, 10)
+    assert is_covered(coverage, 15, 16)
+    assert is_covered(coverage, 50, 60)
+    assert not is_covered(coverage, 21, 39)
+    assert not is_covered(coverage, 0, 9)
+
+
+def test_clamp_to_recording_start(sample_camera: Camera) -> None:
+    # recording starts at 2020-01-08 23:26:09 UTC, clamped to the full hour
+    start = datetime(2020, 1, 8, 20, 0, tzinfo=timezone.utc)
+    assert clamp_to_recording_start(sample_camera, start) == datetime(
+        2020, 1, 8, 23, 0, tzinfo=timezone.utc
+    )
+
+    later = datetime(2020, 1, 9, 1, 0, tzinfo=timezone.utc)
+    assert clamp_to_recording_start(sample_camera, later) == later
+
+
+def test_plan_skips_intervals_without_events(responses: Any, client: Any) -> None:
+    camera = Camera(
+        id="motionCameraId",
+        name="Motion",
+        recording_start=datetime.min,
+        recording_mode="detections",
+    )
+    # one event at 10:30 UTC
+    event_start = int(datetime(2020, 1, 9, 10, 30, tzinfo=timezone.utc).timestamp() * 1e3)
+    responses.add(
+        responses.POST,
+        "https://unifi:443/api/auth/login",
+        headers={"Set-Cookie": "TOKEN=token.token.token"},
+        json={},
+    )
+    responses.add(
+        responses.GET,
+        "https://unifi:443/proxy/protect/api/events",
+        json=[{"id": "e1", "camera": camera.id, "start": event_start, "end": event_start + 5000}],
+    )
+
+    start = datetime(2020, 1, 9, 8, 0, tzinfo=timezone.utc)
+    end = datetime(2020, 1, 9, 12, 0, tzinfo=timezone.utc)
+
+    assert len(plan_footage_intervals(client, camera, start, end)) == 4
+
+    client.skip_unrecorded_intervals = True
+    assert plan_footage_intervals(client, camera, start, end) == [
+        (
+            datetime(2020, 1, 9, 10, 0, tzinfo=timezone.utc),
+            datetime(2020, 1, 9, 10, 59, 59, 999000, tzinfo=timezone.utc),
+        )
+    ]
+
+
+def test_estimate_bytes_per_second() -> None:
+    # storage used over the recorded span wins over the configured bitrate
+    camera = {
+        "stats": {
+            "storage": {"used": 3_600_000},
+            "video": {"recordingStart": 1_000, "recordingEnd": 3_601_000},
+        },
+        "channels": [{"enabled": True, "bitrate": 8_000_000}],
+    }
+    assert estimate_bytes_per_second(camera) == 1000.0
+
+    del camera["stats"]
+    assert estimate_bytes_per_second(camera) == 1_000_000.0
+    assert estimate_bytes_per_second({}) == 0.0
+
+
+def test_estimate_download_plan(client: Any) -> None:
+    camera = Camera(
+        id="cameraId", name="Camera", recording_start=datetime.min, bytes_per_second=1000.0
+    )
+    start = datetime(2020, 1, 9, 22, 0, tzinfo=timezone.utc)
+    end = datetime(2020, 1, 10, 2, 0, tzinfo=timezone.utc)
+    client.use_utc_filenames = True
+
+    plan = estimate_download_plan(client, [camera], start, end, concurrency=2, throughput=1.0)
+
+    assert plan["totals"]["requests"] == 4
+    assert plan["cameras"][0]["bytes"] == plan["totals"]["bytes"]
+    assert [day["requests"] for day in plan["days"]] == [2, 2]
+    assert plan["totals"]["wall_clock_seconds"] == plan["totals"]["seconds"] / 2
+    assert plan["destination"]["fits"]
@@ -0,0 +1,59 @@
+import os
+import pstats
+import threading
+
+from . import profiling
+from .profiling import span
+from .profiling import start_profiling
+from .profiling import stop_profiling
+
+
+def test_span_is_noop_without_profiler() -> None:
+    with span("auth"):
+        pass
+
+    assert profiling._spans is None
+
+
+def test_cprofile_report(tmpdir: str) -> None:
+    profiler = start_profiling("cprofile", str(tmpdir), "download")
+    with span("export_request"):
+        sum(range(1000))
+    with span("export_request"):
+        pass
+    stop_profiling(profiler)
+
+    names = sorted(os.listdir(str(tmpdir)))
+    assert [os.path.splitext(name)[1] for name in names] == [".pstats", ".txt"]
+    with open(os.path.join(str(tmpdir), names[1])) as fp:
+        report = fp.read()
+    assert "export_request" in report
+    assert profiling._spans is None
+
+
+def test_tracemalloc_report(tmpdir: str) -> None:
+    profiler = start_profiling("tracemalloc", str(tmpdir), "sync")
+    data = [bytes(1000) for _ in range(100)]
+    stop_profiling(profiler)
+
+    names = os.listdir(str(tmpdir))
+    assert len(names) == 1 and names[0].startswith("profile_sync_")
+    with open(os.path.join(str(tmpdir), names[0])) as fp:
+        assert "top 50 allocation sites" in fp.read()
+    assert len(data) == 100
+
+
+def work_in_thread() -> None:
+    sum(range(1000))
+
+
+def test_cprofile_covers_worker_threads(tmpdir: str) -> None:
+    profiler = start_profiling("cprofile", str(tmpdir), "sites")
+    thread = threading.Thread(target=profiling.profile_thread(work_in_thread))
+    thread.start()
+    thread.join()
+    stop_profiling(profiler)
+
+    pstats_file = [name for name in os.listdir(str(tmpdir)) if name.endswith(".pstats")][0]
+    stats = pstats.Stats(os.path.join(str(tmpdir), pstats_file))
+    assert "work_in_thread" in [function for _, _, function in stats.stats]  # type: ignore
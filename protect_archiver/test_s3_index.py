@@ -0,0 +1,55 @@
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+
+from .s3_index import S3ObjectIndex
+
+
+class StubPaginator:
+    def __init__(self, pages: Dict[str, List[dict]], calls: List[str]) -> None:
+        self.pages = pages
+        self.calls = calls
+
+    def paginate(self, Bucket: str, Prefix: str) -> Iterator[dict]:
+        self.calls.append(Prefix)
+        for item in self.pages.get(Prefix, []):
+            yield {"Contents": [item]}
+
+
+class StubClient:
+    s3_bucket = "bucket"
+
+    def __init__(self, pages: Dict[str, List[dict]]) -> None:
+        self.calls: List[str] = []
+        self.pages = pages
+
+    @property
+    def s3_client(self) -> Any:
+        return self
+
+    def get_paginator(self, name: str) -> StubPaginator:
+        assert name == "list_objects_v2"
+        return StubPaginator(self.pages, self.calls)
+
+
+def test_lists_each_prefix_once() -> None:
+    client = StubClient(
+        {
+            "p/2024/01/02/Front/": [
+                {"Key": "p/2024/01/02/Front/a.mp4", "Size": 10},
+                {"Key": "p/2024/01/02/Front/b.mp4", "Size": 20},
+            ]
+        }
+    )
+    index = S3ObjectIndex(max_prefixes=1)
+
+    assert index.size(client, "p/2024/01/02/Front/a.mp4") == 10
+    assert index.size(client, "p/2024/01/02/Front/b.mp4") == 20
+    assert index.size(client, "p/2024/01/02/Front/c.mp4") is None
+    assert client.calls == ["p/2024/01/02/Front/"]
+
+    # only the most recent prefix is kept
+    assert index.size(client, "p/2024/01/03/Front/a.mp4") is None
+    assert index.size(client, "p/2024/01/02/Front/a.mp4") == 10
+    assert client.calls == ["p/2024/01/02/Front/", "p/2024/01/03/Front/", "p/2024/01/02/Front/"]
@@ -0,0 +1,33 @@
+import os
+import signal
+import time
+
+import pytest
+
+from . import shutdown
+
+
+def test_sigterm_stops_new_work() -> None:
+    shutdown.install(grace=60)
+    try:
+        shutdown.check()
+        os.kill(os.getpid(), signal.SIGTERM)
+        assert shutdown.requested()
+        with pytest.raises(shutdown.ShutdownRequested):
+            shutdown.check()
+    finally:
+        shutdown.uninstall()
+    assert signal.getitimer(signal.ITIMER_REAL)[0] == 0
+
+
+def test_transfer_is_aborted_after_the_grace_period() -> None:
+    shutdown.install(grace=0.1)
+    try:
+        os.kill(os.getpid(), signal.SIGTERM)
+        started = time.monotonic()
+        with pytest.raises(shutdown.ShutdownRequested, match="did not finish"):
+            # stands in for a transfer that takes too long
+            time.sleep(5)
+        assert time.monotonic() - started < 2
+    finally:
+        shutdown.uninstall()
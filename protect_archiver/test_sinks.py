@@ -0,0 +1,176 @@
+import os
+import tarfile
+
+from typing import Any
+from typing import List
+from typing import Tuple
+
+import pytest
+
+from .cli.base import validate_sinks
+from .config import Config
+from .sinks import LocalSink
+from .sinks import S3Sink
+from .sinks import TarSink
+from .sinks import TeeSink
+
+
+FOOTAGE = "2024/01/02/Front/Front - 2024-01-02 - 03.00.00+0100.mp4"
+
+
+def test_local_sink_removes_aborted_files(tmpdir: Any) -> None:
+    sink = LocalSink()
+    filename = os.path.join(str(tmpdir), FOOTAGE)
+
+    with pytest.raises(RuntimeError):
+        with sink.open(filename) as fp:
+            fp.write(b"partial")
+            raise RuntimeError("connection lost")
+    assert not sink.exists(filename)
+
+    with sink.open(filename) as fp:
+        fp.write(b"complete")
+    assert fp.bytes == 8
+    with open(filename, "rb") as data:
+        assert data.read() == b"complete"
+
+
+def test_tar_sink_appends_to_the_days_archive(tmpdir: Any) -> None:
+    directory = str(tmpdir)
+    sink = TarSink(directory)
+    filename = os.path.join(directory, FOOTAGE)
+
+    with sink.open(filename) as fp:
+        fp.write(b"video")
+    with pytest.raises(RuntimeError):
+        with sink.open(filename.replace("03.00", "04.00")) as fp:
+            fp.write(b"partial")
+            raise RuntimeError("connection lost")
+    sink.close()
+
+    # a new sink (e.g. the next run) finds the member and appends to the same archive
+    sink = TarSink(directory)
+    assert sink.exists(filename)
+    assert not sink.exists(filename.replace("03.00", "04.00"))
+    with sink.open(filename.replace("03.00", "05.00")) as fp:
+        fp.write(b"more video")
+    sink.close()
+
+    with tarfile.open(os.path.join(directory, "2024-01-02.tar")) as archive:
+        assert archive.getnames() == [FOOTAGE, FOOTAGE.replace("03.00", "05.00")]
+        member = archive.extractfile(FOOTAGE)
+        assert member is not None and member.read() == b"video"
+
+
+class StubS3:
+    def __init__(self) -> None:
+        self.calls: List[Tuple[str, Any]] = []
+
+    def create_multipart_upload(self, **kwargs: Any) -> dict:
+        self.calls.append(("create", kwargs["Key"]))
+        return {"UploadId": "upload"}
+
+    def upload_part(self, **kwargs: Any) -> dict:
+        self.calls.append(("part", kwargs["Body"]))
+        return {"ETag": f"etag-{kwargs['PartNumber']}"}
+
+    def complete_multipart_upload(self, **kwargs: Any) -> None:
+        self.calls.append(
+            ("complete", [part["ETag"] for part in kwargs["MultipartUpload"]["Parts"]])
+        )
+
+    def abort_multipart_upload(self, **kwargs: Any) -> None:
+        self.calls.append(("abort", kwargs["UploadId"]))
+
+    def put_object(self, **kwargs: Any) -> None:
+        self.calls.append(("put", kwargs["Body"]))
+
+
+class StubLimiter:
+    def __init__(self) -> None:
+        self.consumed: List[int] = []
+
+    def consume(self, amount: int) -> None:
+        self.consumed.append(amount)
+
+
+class StubClient:
+    s3_bucket = "bucket"
+    s3_prefix = "archive"
+    s3_objects = None
+    destination_path = "/dest"
+    files_uploaded = 0
+
+    def __init__(self) -> None:
+        self.s3_client = StubS3()
+        self.bandwidth_limiter = StubLimiter()
+
+    def count(self, files_uploaded: int) -> None:
+        self.files_uploaded += files_uploaded
+
+
+def test_s3_sink_streams_multipart_uploads(monkeypatch: Any) -> None:
+    monkeypatch.setattr(Config, "S3_PART_SIZE", 4)
+    client = StubClient()
+    sink = S3Sink(client)
+
+    with sink.open(f"/dest/{FOOTAGE}") as fp:
+        for chunk in (b"abc", b"def", b"gh", b"i"):
+            fp.write(chunk)
+    assert client.s3_client.calls == [
+        ("create", f"archive/{FOOTAGE}"),
+        ("part", b"abcdef"),
+        ("part", b"ghi"),
+        ("complete", ["etag-1", "etag-2"]),
+    ]
+
+    # small files take a single request, failed multipart uploads are aborted
+    client.s3_client.calls = []
+    with sink.open("/dest/small.jpg") as fp:
+        fp.write(b"ab")
+    with pytest.raises(RuntimeError):
+        with sink.open("/dest/broken.mp4") as fp:
+            fp.write(b"abcde")
+            raise RuntimeError("connection lost")
+    assert client.s3_client.calls == [
+        ("put", b"ab"),
+        ("create", "archive/broken.mp4"),
+        ("part", b"abcde"),
+        ("abort", "upload"),
+    ]
+    assert client.files_uploaded == 2
+    # every part and single upload goes through '--max-bandwidth'
+    assert client.bandwidth_limiter.consumed == [6, 3, 2, 5]
+
+
+class FailingS3(StubS3):
+    def put_object(self, **kwargs: Any) -> None:
+        raise OSError("bucket unreachable")
+
+
+def test_tee_sink_reports_each_copy(tmpdir: Any) -> None:
+    client, failing = StubClient(), StubClient()
+    failing.s3_client = FailingS3()
+    client.destination_path = failing.destination_path = str(tmpdir)
+    sink = TeeSink(
+        LocalSink(),
+        {"s3://a": S3Sink(client, "a"), "s3://b/p": S3Sink(failing, "b", "p")},
+    )
+
+    filename = os.path.join(str(tmpdir), "small.jpg")
+    with sink.open(filename) as fp:
+        fp.write(b"ab")
+
+    # the failed copy does not fail the local file or the other copy
+    assert fp.copies == {"s3://a": "uploaded", "s3://b/p": "failed"}
+    assert client.s3_client.calls == [("put", b"ab")]
+    with open(filename, "rb") as data:
+        assert data.read() == b"ab"
+
+
+def test_validate_sinks() -> None:
+    assert validate_sinks(None, None, ()) is None
+    sinks = validate_sinks(None, None, ("null", "footage=s3"))
+    assert sinks is not None
+    assert sinks["footage"] == "s3"
+    assert sinks["thumbnails"] == "null"
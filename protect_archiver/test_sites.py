@@ -0,0 +1,57 @@
+import json
+import os
+
+from typing import Any
+
+import pytest
+
+from .sites import load_sites_config
+
+
+def write_config(tmpdir: Any, config: dict) -> str:
+    filepath = os.path.join(str(tmpdir), "sites.json")
+    with open(filepath, "w") as fp:
+        json.dump(config, fp)
+    return filepath
+
+
+def test_load_sites_config(tmpdir: Any, monkeypatch: Any) -> None:
+    monkeypatch.setenv("HQ_PASSWORD", "secret")
+    config, sites = load_sites_config(
+        write_config(
+            tmpdir,
+            {
+                "destination": "/archive",
+                "controllers": [
+                    {"name": "hq", "address": "10.0.0.1", "username": "u", "password": "p"},
+                    {
+                        "name": "branch",
+                        "address": "10.0.0.2",
+                        "username": "u",
+                        "password_env": "HQ_PASSWORD",
+                        "cameras": ["a", "b"],
+                        "concurrency": 3,
+                    },
+                ],
+            },
+        )
+    )
+
+    assert config["destination"] == "/archive"
+    assert [site.name for site in sites] == ["hq", "branch"]
+    assert sites[0].cameras == [] and sites[0].concurrency == 1
+    assert sites[1].password == "secret" and sites[1].cameras == ["a", "b"]
+
+
+@pytest.mark.parametrize(
+    "controller",
+    [
+        {"name": "hq", "address": "10.0.0.1", "username": "u"},
+        {"name": "hq", "address": "10.0.0.1", "username": "u", "password": "p", "typo": 1},
+    ],
+)
+def test_load_sites_config_errors(tmpdir: Any, controller: dict) -> None:
+    with pytest.raises(ValueError):
+        load_sites_config(
+            write_config(tmpdir, {"destination": "/archive", "controllers": [controller]})
+        )
@@ -0,0 +1,218 @@
+import csv
+import os
+import threading
+import time
+
+from datetime import datetime
+
+from .dataclasses import DownloadStats
+from .status import StatusTracker
+from .status import merge_shard_csvs
+from .status import percentile
+
+
+def read_rows(filepath: str) -> list:
+    with open(filepath, newline="") as fp:
+        return list(csv.DictReader(fp))
+
+
+def test_percentile() -> None:
+    assert percentile([], 50) == 0.0
+    assert percentile([1.0], 99) == 1.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.5
+    assert percentile([float(i) for i in range(101)], 95) == 95.0
+
+
+def test_timing_columns(tmpdir: str) -> None:
+    tracker = StatusTracker(str(tmpdir))
+    stats = DownloadStats(bytes=2 * 2**20, ttfb=0.25, transfer_seconds=2.0, retries=1)
+    tracker.add_record(
+        "Front",
+        datetime(2024, 1, 2, 3),
+        datetime(2024, 1, 2, 4),
+        "a.mp4",
+        "downloaded",
+        "n/a",
+        stats,
+    )
+    tracker.add_record(
+        "Front", datetime(2024, 1, 2, 4), datetime(2024, 1, 2, 5), "b.mp4", "failed", "skipped"
+    )
+    tracker.flush_all()
+
+    rows = read_rows(os.path.join(str(tmpdir), "2024_01_02.csv"))
+    assert rows[0]["bytes"] == "2097152"
+    assert rows[0]["ttfb_seconds"] == "0.250"
+    assert rows[0]["throughput_mb_per_second"] == "1.000"
+    assert rows[0]["retries"] == "1"
+    assert rows[1]["ttfb_seconds"] == ""
+
+
+def test_upgrades_old_header(tmpdir: str) -> None:
+    filepath = os.path.join(str(tmpdir), "2024_01_02.csv")
+    with open(filepath, "w", newline="") as fp:
+        fp.write("camera,interval_start,interval_end,filename,download_status,upload_status\n")
+        fp.write("Front,2024-01-02 03:00:00,2024-01-02 04:00:00,a.mp4,downloaded,n/a\n")
+
+    tracker = StatusTracker(str(tmpdir))
+    tracker.add_record(
+        "Front",
+        datetime(2024, 1, 2, 4),
+        datetime(2024, 1, 2, 5),
+        "b.mp4",
+        "downloaded",
+        "n/a",
+        DownloadStats(bytes=1000, transfer_seconds=1.0),
+    )
+    tracker.flush_all()
+
+    rows = read_rows(filepath)
+    assert [row["filename"] for row in rows] == ["a.mp4", "b.mp4"]
+    assert rows[0]["bytes"] == ""
+    assert rows[1]["bytes"] == "1000"
+
+
+def test_copy_status_columns(tmpdir: str) -> None:
+    tracker = StatusTracker(str(tmpdir), destinations=["s3://nas/a"])
+    stats = DownloadStats(bytes=10, copies={"s3://nas/a": "uploaded"})
+    tracker.add_record(
+        "Front",
+        datetime(2024, 1, 2, 3),
+        datetime(2024, 1, 2, 4),
+        "a.mp4",
+        "downloaded",
+        "n/a",
+        stats,
+    )
+    tracker.flush_all()
+
+    # a later run with another destination keeps the first destination's column
+    tracker = StatusTracker(str(tmpdir), destinations=["s3://offsite"])
+    stats = DownloadStats(bytes=10, copies={"s3://offsite": "failed"})
+    tracker.add_record(
+        "Front",
+        datetime(2024, 1, 2, 4),
+        datetime(2024, 1, 2, 5),
+        "b.mp4",
+        "downloaded",
+        "n/a",
+        stats,
+    )
+    tracker.flush_all()
+
+    rows = read_rows(os.path.join(str(tmpdir), "2024_01_02.csv"))
+    assert [row["upload_status:s3://nas/a"] for row in rows] == ["uploaded", ""]
+    assert [row["upload_status:s3://offsite"] for row in rows] == ["", "failed"]
+
+
+def test_write_summary(tmpdir: str) -> None:
+    tracker = StatusTracker(str(tmpdir), summary=True)
+    assert tracker.write_summary() is None
+
+    for hour, ttfb in enumerate([1.0, 2.0, 3.0]):
+        tracker.add_record(
+            "Front",
+            datetime(2024, 1, 2, hour),
+            datetime(2024, 1, 2, hour + 1),
+            f"{hour}.mp4",
+            "downloaded",
+            "n/a",
+            DownloadStats(bytes=2**20, ttfb=ttfb, transfer_seconds=1.0),
+        )
+
+    summary_path = tracker.write_summary()
+    assert summary_path is not None
+    rows = {(row["group"], row["key"]): row for row in read_rows(summary_path)}
+    assert rows[("camera", "Front")]["downloads"] == "3"
+    assert rows[("camera", "Front")]["ttfb_seconds_p50"] == "2.000"
+    assert rows[("hour", "02")]["ttfb_seconds_p99"] == "3.000"
+    assert rows[("hour", "02")]["throughput_mb_per_second_p50"] == "1.000"
+
+    # without '--status-summary' no timings are kept in memory
+    tracker = StatusTracker(str(tmpdir))
+    tracker.add_record(
+        "Front",
+        datetime(2024, 1, 2),
+        datetime(2024, 1, 2, 1),
+        "0.mp4",
+        "downloaded",
+        "n/a",
+        DownloadStats(bytes=2**20, ttfb=1.0, transfer_seconds=1.0),
+    )
+    tracker.flush_all()
+    assert tracker.write_summary() is None
+
+
+def test_rows_are_flushed_without_flush_call(tmpdir: str) -> None:
+    tracker = StatusTracker(str(tmpdir), flush_rows=2, flush_interval=60)
+    for hour in range(3):
+        tracker.add_record(
+            "Front",
+            datetime(2024, 1, 2, hour),
+            datetime(2024, 1, 2, hour + 1),
+            f"{hour}.mp4",
+            "downloaded",
+            "n/a",
+        )
+
+    # every second row flushes the write buffer, the third one is still buffered
+    filepath = os.path.join(str(tmpdir), "2024_01_02.csv")
+    deadline = time.monotonic() + 5
+    while len(read_rows(filepath) if os.path.exists(filepath) else []) < 2:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    tracker.close()
+    assert len(read_rows(filepath)) == 3
+
+
+def test_concurrent_add_record(tmpdir: str) -> None:
+    tracker = StatusTracker(str(tmpdir))
+
+    def add_rows(camera: str) -> None:
+        for hour in range(24):
+            tracker.add_record(
+                camera,
+                datetime(2024, 1, 2 + hour % 2, hour),
+                datetime(2024, 1, 2 + hour % 2, hour, 59),
+                f"{camera}-{hour}.mp4",
+                "downloaded",
+                "n/a",
+            )
+
+    threads = [threading.Thread(target=add_rows, args=(f"camera{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    tracker.flush_all()
+
+    rows = read_rows(os.path.join(str(tmpdir), "2024_01_02.csv")) + read_rows(
+        os.path.join(str(tmpdir), "2024_01_03.csv")
+    )
+    assert len(rows) == 8 * 24
+    assert len({row["filename"] for row in rows}) == 8 * 24
+
+
+def test_merge_shard_csvs(tmpdir: str) -> None:
+    for index, hours in ((1, (1, 3)), (2, (0, 2))):
+        tracker = StatusTracker(str(tmpdir), file_suffix=f".shard-{index}-of-2")
+        for hour in hours:
+            tracker.add_record(
+                "Front",
+                datetime(2024, 1, 2, hour),
+                datetime(2024, 1, 2, hour, 59),
+                f"{hour}.mp4",
+                "downloaded",
+                "n/a",
+            )
+        tracker.close()
+
+    assert sorted(os.listdir(str(tmpdir))) == [
+        "2024_01_02.shard-1-of-2.csv",
+        "2024_01_02.shard-2-of-2.csv",
+    ]
+    assert merge_shard_csvs(str(tmpdir)) == 2
+    assert os.listdir(str(tmpdir)) == ["2024_01_02.csv"]
+    rows = read_rows(os.path.join(str(tmpdir), "2024_01_02.csv"))
+    assert [row["filename"] for row in rows] == ["0.mp4", "1.mp4", "2.mp4", "3.mp4"]
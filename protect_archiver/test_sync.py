@@ -0,0 +1,144 @@
+import os
+
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from typing import Any
+from typing import List
+
+import pytest
+
+from .dataclasses import Camera
+from .downloader import Downloader
+from .shutdown import ShutdownRequested
+from .sync import ProtectSync
+from .sync import Watermark
+from .sync import read_state
+from .sync import write_state
+
+
+class StubSink:
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+
+class StubClient:
+    address = "protect.local"
+    port = 443
+    shard = None
+    stall_tracker = None
+    sink_name = "local"
+
+    def sink(self, kind: str) -> StubSink:
+        return StubSink(self.sink_name)
+
+
+def utc(local: datetime) -> datetime:
+    # naive UTC, like Camera.recording_start
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def test_watermark() -> None:
+    ends = [datetime(2024, 1, 1, hour, 59) for hour in range(4)]
+    watermark = Watermark(ends)
+
+    # intervals finishing out of order only move the watermark once the gap is closed
+    assert watermark.complete(1) is None
+    assert watermark.complete(2) is None
+    assert watermark.complete(0) == ends[2]
+    assert watermark.complete(3) == ends[3]
+
+
+@pytest.mark.parametrize(
+    "schedule,expected",
+    [
+        ("camera", ["a-2", "a-1", "b-3", "b-2", "b-1"]),
+        # the oldest remaining hour of each camera is the next to expire
+        ("expiry", ["a-2", "b-3", "a-1", "b-2", "b-1"]),
+        ("newest", ["a-1", "b-1", "a-2", "b-2", "b-3"]),
+    ],
+)
+def test_run_schedule(tmpdir: Any, monkeypatch: Any, schedule: str, expected: List[str]) -> None:
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    cameras = [
+        Camera(id="a", name="a", recording_start=utc(now - timedelta(hours=2))),
+        Camera(id="b", name="b", recording_start=utc(now - timedelta(hours=3))),
+    ]
+    # a was last synced 4 hours ago, the 2 hours before its recording_start have expired
+    write_state(
+        os.path.join(str(tmpdir), "sync.state"),
+        {"cameras": {"a": {"last": now - timedelta(hours=4), "name": "a"}}},
+    )
+
+    downloaded = []
+
+    def download(client: Any, camera: Camera, start: datetime, end: datetime) -> None:
+        downloaded.append(f"{camera.id}-{(now - start) // timedelta(hours=1)}")
+
+    monkeypatch.setattr(Downloader, "download_footage_interval", download)
+    monkeypatch.setattr(
+        Downloader,
+        "plan_footage_intervals",
+        lambda client, camera, start, end: [
+            (start + timedelta(hours=hour), start + timedelta(hours=hour + 1, milliseconds=-1))
+            for hour in range((end - start) // timedelta(hours=1))
+        ],
+    )
+
+    process = ProtectSync(StubClient(), str(tmpdir), "sync.state")  # type: ignore
+    process.run(cameras, schedule=schedule)
+
+    assert downloaded == expected
+    assert process.expired == {"a": 2}
+    state = read_state(os.path.join(str(tmpdir), "sync.state"))
+    assert state["cameras"]["a"]["last"].startswith(
+        (now - timedelta(milliseconds=1)).isoformat()[:19]
+    )
+
+
+@pytest.mark.parametrize("schedule", ["camera", "expiry"])
+def test_shutdown_keeps_finished_intervals(tmpdir: Any, monkeypatch: Any, schedule: str) -> None:
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    camera = Camera(id="a", name="a", recording_start=utc(now - timedelta(hours=3)))
+    finished: List[datetime] = []
+
+    def download(client: Any, camera: Camera, start: datetime, end: datetime) -> None:
+        if finished:
+            raise ShutdownRequested("SIGTERM received")
+        finished.append(end)
+
+    monkeypatch.setattr(Downloader, "download_footage_interval", download)
+    monkeypatch.setattr(
+        Downloader,
+        "plan_footage_intervals",
+        lambda client, camera, start, end: [
+            (start + timedelta(hours=hour), start + timedelta(hours=hour + 1, milliseconds=-1))
+            for hour in range((end - start) // timedelta(hours=1))
+        ],
+    )
+
+    process = ProtectSync(StubClient(), str(tmpdir), "sync.state")  # type: ignore
+    with pytest.raises(ShutdownRequested):
+        process.run([camera], schedule=schedule)
+
+    state = read_state(os.path.join(str(tmpdir), "sync.state"))
+    assert state["cameras"]["a"]["last"].startswith(finished[0].isoformat()[:19])
+    assert os.listdir(str(tmpdir)) == ["sync.state"]
+
+
+def test_null_sink_keeps_the_state(tmpdir: Any, monkeypatch: Any) -> None:
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    camera = Camera(id="a", name="a", recording_start=utc(now - timedelta(hours=3)))
+    monkeypatch.setattr(Downloader, "download_footage_interval", lambda *args: None)
+    monkeypatch.setattr(
+        Downloader,
+        "plan_footage_intervals",
+        lambda client, camera, start, end: [(start, start + timedelta(hours=1, milliseconds=-1))],
+    )
+
+    # a throughput run discards the footage, the next real sync must still archive it
+    client = StubClient()
+    client.sink_name = "null"
+    ProtectSync(client, str(tmpdir), "sync.state").run([camera])  # type: ignore
+
+    assert os.listdir(str(tmpdir)) == []
@@ -1,8 +1,11 @@
 from datetime import datetime
 
 import dateutil.parser
+import pytest
 
 from .utils import calculate_intervals
+from .utils import in_shard
+from .utils import parse_shard
 
 
 def test_calculate_intervals_multiple_partial_no_alignment_1() -> None:
@@ -127,3 +130,26 @@ def test_calculate_intervals_5h_15m_next_day() -> None:
         (datetime(1970, 1, 2, 1, 0), datetime(1970, 1, 2, 1, 59, 59, 999000)),
         (datetime(1970, 1, 2, 2, 0), datetime(1970, 1, 2, 2, 44, 59, 999000)),
     ]
+
+
+def test_parse_shard() -> None:
+    assert parse_shard("2/4") == (2, 4)
+    for value in ("0/4", "5/4", "1", "a/b"):
+        with pytest.raises(ValueError):
+            parse_shard(value)
+
+
+def test_shards_partition_the_units() -> None:
+    start = datetime(2024, 1, 1)
+    units = [
+        (camera_id, start.replace(hour=hour)) for camera_id in ("a", "b", "c") for hour in range(24)
+    ]
+    owners = [
+        [index for index in range(1, 5) if in_shard((index, 4), camera_id, interval_start)]
+        for camera_id, interval_start in units
+    ]
+
+    # every unit belongs to exactly one shard, and every shard gets some of them
+    assert all(len(owner) == 1 for owner in owners)
+    assert {owner[0] for owner in owners} == {1, 2, 3, 4}
+    assert all(in_shard(None, camera_id, interval_start) for camera_id, interval_start in units)
@@ -0,0 +1,91 @@
+import os
+import struct
+
+from datetime import datetime
+from typing import Any
+
+from .dataclasses import DownloadStats
+from .manifest import record_download
+from .verify import check_mp4
+from .verify import verify_archive
+
+
+def box(box_type: bytes, payload: bytes = b"") -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+MP4 = box(b"ftyp", b"isom") + box(b"moov", b"\0" * 16) + box(b"mdat", b"\0" * 64)
+
+
+def write(filename: str, data: bytes) -> str:
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, "wb") as fp:
+        fp.write(data)
+    return filename
+
+
+def test_check_mp4(tmpdir: Any) -> None:
+    assert check_mp4(write(os.path.join(str(tmpdir), "ok.mp4"), MP4)) is None
+
+    problem = check_mp4(write(os.path.join(str(tmpdir), "cut.mp4"), MP4[:-10]))
+    assert problem is not None and problem.kind == "truncated"
+    problem = check_mp4(write(os.path.join(str(tmpdir), "moov.mp4"), box(b"ftyp", b"isom")))
+    assert problem is not None and problem.kind == "invalid"
+    problem = check_mp4(write(os.path.join(str(tmpdir), "empty.mp4"), b""))
+    assert problem is not None and problem.kind == "zero_byte"
+
+
+def test_verify_archive(tmpdir: Any) -> None:
+    directory = os.path.join(str(tmpdir), "2024", "01", "02", "Front (abcd)")
+    for hour in (0, 1, 4):
+        write(os.path.join(directory, f"Front (abcd) - 2024-01-02 - {hour:02}.00.00.mp4"), MP4)
+    write(os.path.join(directory, "Front (abcd) - 2024-01-02 - 05.00.00.mp4"), b"")
+    # recorded with a different size than the file on disk
+    record_download(
+        os.path.join(directory, "Front (abcd) - 2024-01-02 - 04.00.00.mp4"),
+        datetime(2024, 1, 2, 4),
+        datetime(2024, 1, 2, 4, 59, 59, 999000),
+        "/video/export",
+        DownloadStats(bytes=1),
+    )
+
+    report = verify_archive(str(tmpdir), workers=2)
+
+    assert report.files == 4
+    assert sorted(
+        (problem.kind, os.path.basename(problem.path)) for problem in report.problems
+    ) == [
+        # the day has a manifest, but these files are not in it
+        ("missing_from_manifest", "Front (abcd) - 2024-01-02 - 00.00.00.mp4"),
+        ("missing_from_manifest", "Front (abcd) - 2024-01-02 - 01.00.00.mp4"),
+        ("missing_hours", "Front (abcd)"),
+        ("size_mismatch", "Front (abcd) - 2024-01-02 - 04.00.00.mp4"),
+        ("zero_byte", "Front (abcd) - 2024-01-02 - 05.00.00.mp4"),
+    ]
+    missing = [problem for problem in report.problems if problem.kind == "missing_hours"][0]
+    assert missing.detail == "2024-01-02 02:00 - 2024-01-02 03:59 (2 hour(s))"
+
+
+def test_gaps_of_cameras_recording_on_detections(tmpdir: Any) -> None:
+    directory = os.path.join(str(tmpdir), "2024", "01", "02", "Back (efgh)")
+    for hour in (0, 3):
+        filename = write(
+            os.path.join(directory, f"Back (efgh) - 2024-01-02 - {hour:02}.00.00.mp4"), MP4
+        )
+        record_download(
+            filename,
+            datetime(2024, 1, 2, hour),
+            datetime(2024, 1, 2, hour, 59, 59, 999000),
+            "/video/export",
+            DownloadStats(bytes=len(MP4)),
+            "detections",
+        )
+
+    # hours without events have no footage: reported, but not a failure
+    report = verify_archive(str(tmpdir), workers=1)
+    assert [(problem.kind, problem.detail) for problem in report.problems] == [
+        (
+            "unrecorded_hours",
+            "2024-01-02 01:00 - 2024-01-02 02:59 (2 hour(s)), recording mode 'detections'",
+        )
+    ]
@@ -0,0 +1,152 @@
+import os
+import time
+
+from datetime import datetime
+from typing import Any
+from typing import Iterator
+
+import pytest
+import requests
+
+from .bandwidth import TokenBucket
+from .dataclasses import Camera
+from .downloader.download_file import download_file
+from .sinks import LocalSink
+from .watchdog import DownloadStalled
+from .watchdog import DownloadWatchdog
+from .watchdog import StallTracker
+
+
+class FakeResponse:
+    url = "https://unifi/video/export"
+    raw = None
+    closed = False
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def test_watchdog_aborts_slow_download() -> None:
+    response = FakeResponse()
+    with pytest.raises(DownloadStalled):
+        with DownloadWatchdog(response, "Front", min_throughput=1000, window=0.2) as watchdog:
+            watchdog.progress(10)
+            time.sleep(0.6)
+
+    assert watchdog.tripped == "throughput"
+    assert response.closed
+
+
+def test_watchdog_stall_discards_the_file(tmpdir: Any) -> None:
+    filename = os.path.join(str(tmpdir), "Front - 2024-01-02 - 03.00.00.mp4")
+    # the body read ended without an error after the connection was shut down: the check at
+    # its end aborts the sink writer before it commits the truncated file
+    with pytest.raises(DownloadStalled):
+        with DownloadWatchdog(
+            FakeResponse(), "Front", min_throughput=1000, window=0.2
+        ) as watchdog, LocalSink().open(filename) as fp:
+            fp.write(b"trunc")
+            time.sleep(0.6)
+            watchdog.check()
+
+    assert not os.path.exists(filename)
+
+
+class SlowUnsizedResponse(FakeResponse):
+    status_code = 200
+    reason = "OK"
+    # chunked transfer encoding, no Content-Length
+    headers: dict = {}
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        # 5 kB/s for 0.8s, above the 1 kB/s floor but longer than the 0.2s window
+        for _ in range(8):
+            time.sleep(0.1)
+            yield b"x" * 500
+
+    @property
+    def content(self) -> bytes:
+        return b"".join(self.iter_content(500))
+
+
+class StubSession:
+    authority = "https://unifi"
+    base_path = "/proxy/protect/api"
+
+    def get_api_token(self, force: bool = False) -> str:
+        return "token"
+
+
+class StubClient:
+    download_wait = 0
+    max_retries = 1
+    skip_existing_files = False
+    verify_ssl = False
+    download_timeout = 10
+    ignore_failed_downloads = True
+    min_throughput = 1000.0
+    stall_window = 0.2
+    stall_tracker = None
+    bandwidth_limiter = TokenBucket()
+    session = StubSession()
+
+    def count(self, **counters: int) -> None:
+        pass
+
+
+def test_watchdog_follows_unsized_download(tmpdir: Any, monkeypatch: Any) -> None:
+    monkeypatch.setattr(requests, "get", lambda *args, **kwargs: SlowUnsizedResponse())
+    filename = os.path.join(str(tmpdir), "Front - 2024-01-02 - 03.00.00.mp4")
+
+    status = download_file(StubClient(), "/video/export", filename, "Front", sink=LocalSink())
+
+    assert status == "downloaded"
+    assert os.path.getsize(filename) == 4000
+
+
+def test_watchdog_deadline() -> None:
+    # 1 kB at 10 kB/s plus the 0.1 s window: the deadline is 0.2 s
+    watchdog = DownloadWatchdog(
+        FakeResponse(), "Front", min_throughput=10_000, window=0.1, expected_bytes=1000
+    )
+    with pytest.raises(DownloadStalled):
+        with watchdog:
+            for _ in range(20):
+                # fast enough for the throughput floor, but never finishing
+                watchdog.progress(10_000)
+                time.sleep(0.05)
+
+    assert watchdog.tripped == "deadline"
+
+
+def test_watchdog_leaves_fast_download_alone() -> None:
+    with DownloadWatchdog(FakeResponse(), "Front", min_throughput=1000, window=0.1) as watchdog:
+        for _ in range(6):
+            watchdog.progress(1000)
+            time.sleep(0.05)
+
+    assert watchdog.tripped is None
+
+
+def test_stall_tracker(tmpdir: Any) -> None:
+    filepath = os.path.join(str(tmpdir), "stalls.json")
+    cameras = [Camera(id=name, name=name, recording_start=datetime.min) for name in "abc"]
+
+    tracker = StallTracker(filepath)
+    tracker.record("a", stalled=True)
+    tracker.record("b", stalled=False)
+    assert [camera.name for camera in tracker.prioritize(cameras)] == ["b", "c", "a"]
+
+    # scores are kept across runs and decay with every finished download
+    tracker = StallTracker(filepath)
+    assert tracker.is_slow("a")
+    for _ in range(4):
+        tracker.record("a", stalled=False)
+    assert not tracker.is_slow("a")
+
+    # processes sharing the destination ('--shard') keep each other's updates
+    other = StallTracker(filepath)
+    tracker.record("c", stalled=True)
+    other.record("b", stalled=True)
+    assert StallTracker(filepath).scores.keys() == {"a", "b", "c"}
+    assert not [name for name in os.listdir(str(tmpdir)) if name.endswith(".tmp")]
@@ -1,16 +1,29 @@
+import hashlib
 import logging
 import os
+import re
+import tempfile
 
+from contextlib import contextmanager
 from datetime import datetime
 from datetime import timedelta
 from datetime import timezone
 from typing import Any
 from typing import Iterable
+from typing import Iterator
+from typing import Optional
 from typing import Tuple
 
 from protect_archiver.dataclasses import Camera
 
 
+# footage file names: "<camera> - YYYY-MM-DD - HH.MM.SS[+zzzz].mp4", see footage_filename
+FOOTAGE_FILENAME_PATTERN = re.compile(
+    r"^(?P<camera>.+) - (?P<day>\d{4}-\d{2}-\d{2}) - (?P<hour>\d{2})\.\d{2}\.\d{2}"
+    r"(?:[+-]\d{4})?\.mp4$"
+)
+
+
 def json_encode(obj: Any) -> Any:
     if isinstance(obj, datetime):
         return obj.isoformat()
@@ -112,6 +125,34 @@ def calculate_day_intervals(
         cursor = next_day
 
 
+# parse a '--shard' value "i/N" into (i, N) with 1 <= i <= N
+def parse_shard(value: str) -> Tuple[int, int]:
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"'{value}' is not of the form i/N, e.g. '1/4'")
+    if not 1 <= index <= count:
+        raise ValueError(f"shard index must be between 1 and {count}, got {index}")
+    return index, count
+
+
+# return True if the camera x interval unit belongs to the given (i, N) shard (or no shard).
+# Units are assigned by hashing the camera ID and the interval start (in epoch ms), so every
+# node running the same command computes the same split without talking to the others.
+def in_shard(shard: Optional[Tuple[int, int]], camera_id: str, interval_start: datetime) -> bool:
+    if shard is None:
+        return True
+    index, count = shard
+    unit = f"{camera_id}/{int(interval_start.timestamp() * 1e3)}".encode("utf-8")
+    digest = hashlib.sha1(unit).digest()
+    return int.from_bytes(digest[:8], "big") % count == index - 1
+
+
+# suffix for the per-shard status CSV and state files, e.g. 'shard-1-of-4'
+def shard_suffix(shard: Tuple[int, int]) -> str:
+    return f"shard-{shard[0]}-of-{shard[1]}"
+
+
 def format_bytes(size: int) -> str:
     # 2**10 = 1024
     power = 2**10
@@ -123,6 +164,13 @@ def format_bytes(size: int) -> str:
     return f"{int(size * 100) / 100} {power_labels[n]}b"
 
 
+def format_duration(seconds: float) -> str:
+    days, remainder = divmod(int(seconds), 86400)
+    hours, remainder = divmod(remainder, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{f'{days}d ' if days else ''}{hours:02}:{minutes:02}:{seconds:02}"
+
+
 def make_camera_name_fs_safe(camera: Camera) -> str:
     return (
         "".join([c for c in camera.name if c.isalpha() or c.isdigit() or c == " "]).rstrip()
@@ -139,7 +187,7 @@ def print_download_stats(client: Any) -> None:
         f"{files_total} files total"
     )
 
-    if getattr(client, "s3_bucket", None) is not None:
+    if getattr(client, "s3_bucket", None) is not None or getattr(client, "copy_to", None):
         msg += (
             f"\n{client.files_uploaded} files uploaded to S3, "
             f"{client.files_upload_failed} uploads failed"
@@ -148,6 +196,7 @@ def print_download_stats(client: Any) -> None:
     print(msg)
 
 
+# return the directory of a download; it is created by the storage sink the file is written to
 def build_download_dir(
     use_subfolders: bool,
     destination_path: str,
@@ -161,14 +210,64 @@ def build_download_dir(
         folder_day = interval_start_tz.strftime("%d")
 
         dir_by_date_and_name = f"{folder_year}/{folder_month}/{folder_day}/{camera_name_fs_safe}"
-        target_with_date_and_name = f"{destination_path}/{dir_by_date_and_name}"
-
-        download_dir = target_with_date_and_name
-        if not os.path.isdir(target_with_date_and_name):
-            os.makedirs(target_with_date_and_name, exist_ok=True)
-            logging.info(f"Created path {target_with_date_and_name}")
-            download_dir = target_with_date_and_name
+        download_dir = f"{destination_path}/{dir_by_date_and_name}"
     else:
         download_dir = destination_path
 
     return download_dir
+
+
+# create an empty placeholder file ('--touch-files')
+def touch_file(filename: str) -> None:
+    logging.debug(f"Argument '--touch-files' is present. Creating file at {filename}")
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    open(filename, "a").close()
+
+
+# hold an exclusive lock on "<filepath>.lock" while the block runs, so that processes sharing
+# a destination ('--shard') rewrite the file one at a time; without fcntl (Windows) only the
+# callers' in-process locks apply. The lock file is removed on release, so no lock files are
+# left in the archive: a waiter that locked the removed file retries with the new one.
+@contextmanager
+def file_lock(filepath: str) -> Iterator[None]:
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+
+    lock_filepath = f"{filepath}.lock"
+    while True:
+        fp = open(lock_filepath, "a")
+        fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+        try:
+            if os.path.samestat(os.fstat(fp.fileno()), os.stat(lock_filepath)):
+                break
+        except FileNotFoundError:
+            pass
+        fp.close()
+
+    try:
+        yield
+    finally:
+        # removed while still locked, closing the file releases the lock
+        os.remove(lock_filepath)
+        fp.close()
+
+
+# replace a file with `data`, written to a uniquely named temporary file in the same
+# directory first, so that readers and concurrent writers never see a partial file
+def write_file_atomic(filepath: str, data: bytes) -> None:
+    directory, basename = os.path.split(filepath)
+    fd, tmp_filepath = tempfile.mkstemp(dir=directory or ".", prefix=f".{basename}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(data)
+            fp.flush()
+            os.fsync(fp.fileno())
+        # mkstemp creates the file readable by its owner only
+        os.chmod(tmp_filepath, 0o644)
+        os.replace(tmp_filepath, filepath)
+    except BaseException:
+        os.remove(tmp_filepath)
+        raise
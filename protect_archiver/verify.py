@@ -0,0 +1,254 @@
+# archive verification ('verify')
+#
+# Walks the YYYY/MM/DD/<camera> directories written by build_download_dir (or a flat
+# destination without subfolders) and checks every footage file without decoding it:
+#   - zero-byte files (left by '--touch-files' or an interrupted download),
+#   - the mp4 structure: the top-level box headers are followed through an mmap of the
+#     file, so only the pages holding the headers are read. A box that runs past the end
+#     of the file means the file is truncated; 'ftyp' and 'moov' boxes must be present,
+#   - size (and with `checksums` the SHA-256) against the file's manifest entry, files
+#     missing from their (existing) manifest, and manifest entries whose file is neither on
+#     disk nor uploaded to S3,
+#   - hours missing between a camera's first and last footage file. Cameras that only
+#     record on motion or detections (their manifests' recording_mode) have no footage for
+#     hours without events, their gaps are reported as unrecorded_hours, a notice rather
+#     than a problem.
+# The directories are checked by a process pool, the hour coverage is merged afterwards.
+import mmap
+import os
+import re
+import struct
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from dataclasses import field
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from protect_archiver.manifest import MANIFEST_SUFFIX
+from protect_archiver.manifest import file_sha256
+from protect_archiver.manifest import manifest_filename
+from protect_archiver.manifest import read_manifest
+from protect_archiver.utils import FOOTAGE_FILENAME_PATTERN
+
+
+# kinds of Problem that are reported, but don't make the archive fail verification
+NOTICE_KINDS = ("unrecorded_hours",)
+
+
+@dataclass
+class Problem:
+    # zero_byte, truncated, invalid, size_mismatch, checksum_mismatch, missing_from_manifest,
+    # missing_file, missing_hours or unrecorded_hours
+    kind: str
+    path: str
+    detail: str = ""
+
+
+@dataclass
+class DirectoryReport:
+    files: int = 0
+    bytes: int = 0
+    problems: List[Problem] = field(default_factory=list)
+    # (camera, day) -> bit mask of the hours with footage
+    hours: Dict[Tuple[str, date], int] = field(default_factory=dict)
+    # camera -> recording mode, as far as the manifests know it
+    recording_modes: Dict[str, str] = field(default_factory=dict)
+
+
+# return the problem of an mp4 file's top-level box structure, None if it looks complete
+def check_mp4(filename: str) -> Optional[Problem]:
+    with open(filename, "rb") as fp:
+        size = os.fstat(fp.fileno()).st_size
+        if size == 0:
+            return Problem("zero_byte", filename)
+
+        boxes = set()
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = 0
+            while offset < size:
+                if offset + 8 > size:
+                    return Problem("truncated", filename, f"box header cut off at {offset}")
+                box_size, box_type = struct.unpack_from(">I4s", data, offset)
+                header_size = 8
+                if box_size == 1:
+                    if offset + 16 > size:
+                        return Problem("truncated", filename, f"box header cut off at {offset}")
+                    (box_size,) = struct.unpack_from(">Q", data, offset + 8)
+                    header_size = 16
+                elif box_size == 0:
+                    # the last box extends to the end of the file
+                    box_size = size - offset
+                if box_size < header_size:
+                    return Problem("invalid", filename, f"box size {box_size} at {offset}")
+                if offset + box_size > size:
+                    return Problem(
+                        "truncated",
+                        filename,
+                        f"'{box_type.decode('latin-1')}' box at {offset} ends at"
+                        f" {offset + box_size}, the file has {size} bytes",
+                    )
+                boxes.add(box_type)
+                offset += box_size
+
+    for box_type in (b"ftyp", b"moov"):
+        if box_type not in boxes:
+            return Problem("invalid", filename, f"no '{box_type.decode()}' box")
+    return None
+
+
+# check the footage files and manifests of one directory
+def verify_directory(directory: str, checksums: bool = False) -> DirectoryReport:
+    report = DirectoryReport()
+    names = sorted(os.listdir(directory))
+
+    manifest_files: Dict[str, dict] = {}
+    for name in names:
+        if name.endswith(MANIFEST_SUFFIX):
+            try:
+                manifest = read_manifest(os.path.join(directory, name))
+            except (OSError, ValueError) as e:
+                report.problems.append(Problem("invalid", os.path.join(directory, name), str(e)))
+                continue
+            manifest_files.update(manifest["files"])
+            recording_mode = manifest.get("camera", {}).get("recording_mode")
+            if recording_mode:
+                # "<camera> - <day>.manifest.json"
+                camera = name[: -len(MANIFEST_SUFFIX)].rsplit(" - ", 1)[0]
+                report.recording_modes[camera] = recording_mode
+
+    def add_hour(name: str) -> None:
+        match = FOOTAGE_FILENAME_PATTERN.match(name)
+        if match:
+            key = (match["camera"], datetime.strptime(match["day"], "%Y-%m-%d").date())
+            report.hours[key] = report.hours.get(key, 0) | 1 << int(match["hour"])
+
+    for name in names:
+        if not FOOTAGE_FILENAME_PATTERN.match(name):
+            continue
+        filename = os.path.join(directory, name)
+        add_hour(name)
+        report.files += 1
+        report.bytes += os.path.getsize(filename)
+
+        problem = check_mp4(filename)
+        entry = manifest_files.get(name)
+        if problem is None and entry is not None:
+            if entry.get("size") != os.path.getsize(filename):
+                problem = Problem(
+                    "size_mismatch",
+                    filename,
+                    f"{os.path.getsize(filename)} bytes, the manifest has {entry.get('size')}",
+                )
+            elif checksums and entry.get("sha256") and file_sha256(filename) != entry["sha256"]:
+                problem = Problem("checksum_mismatch", filename)
+        elif problem is None and manifest_filename(name) in names:
+            # e.g. lost by a manifest update
+            problem = Problem("missing_from_manifest", filename)
+        if problem is not None:
+            report.problems.append(problem)
+
+    # files that were archived but are gone, unless they were moved to S3
+    for name, entry in manifest_files.items():
+        if name in names:
+            continue
+        if entry.get("s3_key"):
+            add_hour(name)
+        else:
+            report.problems.append(Problem("missing_file", os.path.join(directory, name)))
+
+    return report
+
+
+# return the directories holding footage: DEST/YYYY/MM/DD/<camera>, or DEST itself
+def find_footage_directories(destination: str) -> Iterator[str]:
+    if any(
+        FOOTAGE_FILENAME_PATTERN.match(name) or name.endswith(MANIFEST_SUFFIX)
+        for name in os.listdir(destination)
+    ):
+        yield destination
+
+    def subdirectories(directory: str, pattern: str) -> List[str]:
+        return sorted(
+            entry.path
+            for entry in os.scandir(directory)
+            if entry.is_dir() and re.match(pattern, entry.name)
+        )
+
+    for year in subdirectories(destination, r"^\d{4}$"):
+        for month in subdirectories(year, r"^\d{2}$"):
+            for day in subdirectories(month, r"^\d{2}$"):
+                yield from subdirectories(day, r".")
+
+
+# report the hours missing between each camera's first and last hour with footage, as
+# ranges of consecutive hours; unrecorded_hours for cameras that don't record all the time
+def find_missing_hours(
+    hours: Dict[Tuple[str, date], int], recording_modes: Optional[Dict[str, str]] = None
+) -> List[Problem]:
+    problems = []
+    camera_days: Dict[str, List[date]] = {}
+    for camera, day in hours:
+        camera_days.setdefault(camera, []).append(day)
+
+    for camera, days in sorted(camera_days.items()):
+        days.sort()
+        present = [
+            datetime(day.year, day.month, day.day, hour)
+            for day in days
+            for hour in range(24)
+            if hours[(camera, day)] & 1 << hour
+        ]
+
+        for previous, current in zip(present, present[1:]):
+            if current - previous > timedelta(hours=1):
+                first = previous + timedelta(hours=1)
+                count = (current - first) // timedelta(hours=1)
+                recording_mode = (recording_modes or {}).get(camera, "always")
+                detail = (
+                    f"{first:%Y-%m-%d %H:00} - {current - timedelta(hours=1):%Y-%m-%d %H:59}"
+                    f" ({count} hour(s))"
+                )
+                if recording_mode == "always":
+                    problems.append(Problem("missing_hours", camera, detail))
+                else:
+                    problems.append(
+                        Problem(
+                            "unrecorded_hours",
+                            camera,
+                            f"{detail}, recording mode '{recording_mode}'",
+                        )
+                    )
+    return problems
+
+
+def verify_archive(
+    destination: str, workers: Optional[int] = None, checksums: bool = False
+) -> DirectoryReport:
+    """Check all footage below `destination` and return the merged report."""
+    directories = list(find_footage_directories(destination))
+    total = DirectoryReport()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        reports = executor.map(
+            verify_directory,
+            directories,
+            [checksums] * len(directories),
+            chunksize=max(1, len(directories) // (4 * (workers or os.cpu_count() or 1))),
+        )
+        for report in reports:
+            total.files += report.files
+            total.bytes += report.bytes
+            total.problems += report.problems
+            for key, mask in report.hours.items():
+                total.hours[key] = total.hours.get(key, 0) | mask
+            total.recording_modes.update(report.recording_modes)
+
+    total.problems += find_missing_hours(total.hours, total.recording_modes)
+    return total
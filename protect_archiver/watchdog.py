@@ -0,0 +1,185 @@
+# stall watchdog for footage exports ('--min-throughput')
+#
+# The socket read timeout ('--download-request-timeout') only fires if the controller sends
+# nothing at all; an export that trickles a few bytes per minute (NVR rebuilding, busy disk)
+# would tie up the download for hours. While a download streams, a DownloadWatchdog thread
+# checks its progress and aborts it by shutting down the connection if
+#   - fewer than min_throughput bytes per second arrived during a whole window, or
+#   - it takes longer than the window plus the time the expected size needs at
+#     min_throughput (the total deadline).
+# The aborted download fails like any other broken connection and is retried.
+#
+# Stalls are remembered per camera in a StallTracker, so that cameras that keep stalling
+# are downloaded after the others in later runs.
+import logging
+import os
+import socket
+import threading
+import time
+
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from protect_archiver import json_codec
+from protect_archiver import metrics
+from protect_archiver.config import Config
+from protect_archiver.errors import DownloadFailed
+from protect_archiver.utils import file_lock
+from protect_archiver.utils import write_file_atomic
+
+
+class DownloadStalled(DownloadFailed):
+    pass
+
+
+class DownloadWatchdog:
+    def __init__(
+        self,
+        response: Any,
+        camera_name: str,
+        min_throughput: float,
+        window: float,
+        expected_bytes: int = 0,
+        tracker: Optional["StallTracker"] = None,
+    ) -> None:
+        self.response = response
+        self.camera_name = camera_name
+        self.tracker = tracker
+        # bytes per second
+        self.min_throughput = min_throughput
+        self.window = window
+        self.deadline = window + expected_bytes / min_throughput if expected_bytes else None
+        self.bytes = 0
+        # "throughput" or "deadline" once the download has been aborted
+        self.tripped: Optional[str] = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="download-watchdog", daemon=True)
+
+    def __enter__(self) -> "DownloadWatchdog":
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type: Any, *exc: Any) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+        if self.tripped:
+            metrics.DOWNLOAD_STALLS.inc(camera=self.camera_name, reason=self.tripped)
+        # failures for other reasons say nothing about the camera being slow
+        if self.tracker is not None and (self.tripped or exc_type is None):
+            self.tracker.record(self.camera_name, stalled=bool(self.tripped))
+
+        # the connection was shut down, but the body read ended without an error
+        if exc_type is None:
+            self.check()
+
+    def progress(self, amount: int) -> None:
+        self.bytes += amount
+
+    # raise DownloadStalled if the download was aborted; called at the end of the body read,
+    # so that a truncated file is discarded by its sink writer instead of being committed
+    def check(self) -> None:
+        if self.tripped:
+            raise DownloadStalled(f"Download of {self.response.url} stalled ({self.tripped})")
+
+    def _run(self) -> None:
+        started = window_start = time.monotonic()
+        window_bytes = 0
+        check_interval = min(1.0, self.window / 4)
+
+        while not self._stopped.wait(check_interval):
+            now = time.monotonic()
+            if self.deadline is not None and now - started > self.deadline:
+                self._abort("deadline", f"not finished after {self.deadline:.0f}s")
+                return
+            if now - window_start >= self.window:
+                throughput = (self.bytes - window_bytes) / (now - window_start)
+                if throughput < self.min_throughput:
+                    self._abort(
+                        "throughput",
+                        f"{throughput / 2**10:.1f} kB/s during the last {now - window_start:.0f}s",
+                    )
+                    return
+                window_start, window_bytes = now, self.bytes
+
+    def _abort(self, reason: str, detail: str) -> None:
+        self.tripped = reason
+        logging.warning(f"Download of {self.response.url} stalled ({detail}) - aborting")
+        # unblocks the read in the downloading thread, which then fails with a RequestException
+        sock = getattr(getattr(self.response.raw, "connection", None), "sock", None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.response.close()
+
+
+class _NoWatchdog:
+    def __enter__(self) -> "_NoWatchdog":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        pass
+
+    def progress(self, amount: int) -> None:
+        pass
+
+    def check(self) -> None:
+        pass
+
+
+# return the watchdog for a download, a no-op unless '--min-throughput' is set
+def watch_download(client: Any, response: Any, camera_name: str, expected_bytes: int) -> Any:
+    if client.min_throughput is None:
+        return _NoWatchdog()
+    return DownloadWatchdog(
+        response,
+        camera_name,
+        client.min_throughput,
+        client.stall_window,
+        expected_bytes,
+        client.stall_tracker,
+    )
+
+
+class StallTracker:
+    """Per-camera stall score, kept in a JSON file across runs.
+
+    Every stall adds 1 to the camera's score, every download that finishes decays it by
+    Config.STALL_SCORE_DECAY. Cameras whose score is above Config.STALL_SCORE_THRESHOLD are
+    moved to the end of the download order by prioritize().
+    """
+
+    def __init__(self, filepath: str) -> None:
+        self.filepath = filepath
+        self._lock = threading.Lock()
+        self.scores: Dict[str, float] = {}
+        self._read()
+
+    def _read(self) -> None:
+        if os.path.isfile(self.filepath):
+            with open(self.filepath, "rb") as fp:
+                self.scores = json_codec.load(fp).get("cameras", {})
+
+    def record(self, camera_name: str, stalled: bool) -> None:
+        with self._lock, file_lock(self.filepath):
+            # start from the file, which other processes sharing the destination ('--shard')
+            # update as well
+            self._read()
+            score = self.scores.get(camera_name, 0.0)
+            self.scores[camera_name] = score + 1 if stalled else score * Config.STALL_SCORE_DECAY
+            write_file_atomic(self.filepath, json_codec.dumps({"cameras": self.scores}))
+
+    def is_slow(self, camera_name: str) -> bool:
+        return self.scores.get(camera_name, 0.0) > Config.STALL_SCORE_THRESHOLD
+
+    def prioritize(self, camera_list: List[Any]) -> List[Any]:
+        """Return the cameras with the chronically slow ones last (otherwise in order)."""
+        ordered = sorted(camera_list, key=lambda camera: self.is_slow(camera.name))
+        slow = [camera.name for camera in ordered if self.is_slow(camera.name)]
+        if slow:
+            logging.info(f"Downloading slow camera(s) last: {', '.join(slow)}")
+        return ordered